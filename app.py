@@ -1,18 +1,35 @@
-from flask import Flask, request, jsonify, send_file, render_template
+from flask import Flask, Response, g, request, jsonify, send_file, render_template, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from faker import Faker
-import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import JSONB
 import json
-import uuid
-import random
-import requests
+import hashlib
+import itertools
+import threading
+import time
 import os
-from datetime import datetime
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+from urllib.parse import urlencode
 import io
-import zipfile
+import tempfile
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
+import metrics
+from columnar_engine import FAKER_PROVIDERS, SEEDED_REFERENCE_TIME, ColumnarEngine, columns_to_rows, compile_schema
+from serializers import iter_csv, iter_ndjson
+from parallel_generation import PARALLEL_MIN_ROWS, generate_columns_sharded, iter_sharded, plan_shards, resolve_workers
+from job_queue import JOB_FORMATS, GenerationJob, JobQueue
+from columnar_export import COLUMNAR_FORMATS, write_columnar
+from bundle_export import (BUNDLE_FORMATS, BUNDLE_MEMBERS, check_archive_format, iter_json_array, iter_spool,
+                           iter_sql_script, spool_chunk_sets, write_bundle)
+from postgres_loader import table_columns
+from ollama_service import OllamaService
+from sample_models import fit_sample_model
+from relational import RELATIONAL_FORMATS, compile_relational, generate_keys, iter_relational, quote_identifier
+from schema_index import SCHEMA_INDEX_FALLBACK_SCORE, SCHEMA_INDEX_MATCH_SCORE, SchemaIndex
 
 load_dotenv()
 
@@ -26,146 +43,171 @@ app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
 db = SQLAlchemy(app)
-fake = Faker()
 
 # Ollama configuration
 OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
+OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama2')
+
+# LLM samples requested to fit the column models of /api/expand-data
+EXPAND_SAMPLE_COUNT = int(os.getenv('EXPAND_SAMPLE_COUNT', '20'))
+
+# Largest number of requests accepted by /api/generate-schemas
+SCHEMA_BATCH_MAX_REQUESTS = int(os.getenv('SCHEMA_BATCH_MAX_REQUESTS', '100'))
+
+# Streaming configuration
+STREAM_CHUNK_ROWS = int(os.getenv('STREAM_CHUNK_ROWS', '10000'))
+
+# Background job configuration
+JOB_CHUNK_ROWS = int(os.getenv('JOB_CHUNK_ROWS', '50000'))
+
+# Rows per Parquet row group / Arrow record batch
+COLUMNAR_BATCH_ROWS = int(os.getenv('COLUMNAR_BATCH_ROWS', '100000'))
+
+# Saved schema listing: page size limits and number of cached pages
+SCHEMA_PAGE_SIZE = int(os.getenv('SCHEMA_PAGE_SIZE', '50'))
+SCHEMA_PAGE_MAX = int(os.getenv('SCHEMA_PAGE_MAX', '500'))
+SCHEMA_LIST_CACHE_SIZE = int(os.getenv('SCHEMA_LIST_CACHE_SIZE', '128'))
+
+# Build the shared Faker value pools during warmup() instead of on first use in each worker
+WARMUP_VALUE_POOLS = os.getenv('WARMUP_VALUE_POOLS', 'false').lower() == 'true'
+
+# Direct loading into caller-supplied PostgreSQL databases. Off by default: the server connects
+# to whatever host the caller's DSN names, so only enable it for trusted clients.
+POSTGRES_LOAD_ENABLED = os.getenv('POSTGRES_LOAD_ENABLED', 'false').lower() == 'true'
+POSTGRES_LOAD_BATCH_ROWS = int(os.getenv('POSTGRES_LOAD_BATCH_ROWS', '50000'))
+
+# Largest dataset accepted by /api/export-bundle
+BUNDLE_MAX_ROWS = int(os.getenv('BUNDLE_MAX_ROWS', '10000000'))
 
 class DataSchema(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    schema_data = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Native JSONB on PostgreSQL, so rows come back already parsed
+    schema_data = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     user_request = db.Column(db.Text)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'schema_data': self.schema_data,
+            'created_at': self.created_at.isoformat(),
+            'user_request': self.user_request
+        }
+
+class DataRequest(db.Model):
+    """Large dataset request, processed as a background generation job"""
+    __tablename__ = 'data_requests'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(255), nullable=False, default='')
+    topic = db.Column(db.Text)
+    field_count = db.Column(db.Integer)
+    requested_record_count = db.Column(db.Integer, nullable=False)
+    schema_details = db.Column(db.Text)
+    additional_notes = db.Column(db.Text)
+    status = db.Column(db.String(50), default='pending')
+    admin_notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    output_format = db.Column(db.String(20))
+    rows_generated = db.Column(db.Integer, default=0)
+    artifact_path = db.Column(db.Text)
+    error_message = db.Column(db.Text)
+    seed = db.Column(db.BigInteger)
+    workers = db.Column(db.Integer)
+
+# Initialize database on first use rather than at import, so importing the app stays cheap
+db_initialized = False
+db_init_lock = threading.Lock()
 
-# Initialize database
-with app.app_context():
-    db.create_all()
+def init_db():
+    """Create missing tables once per process"""
+    global db_initialized
+    with db_init_lock:
+        if not db_initialized:
+            with app.app_context():
+                db.create_all()
+            init_rollup_tables()
+            db_initialized = True
+
+def init_rollup_tables():
+    """Create the analytics rollup tables in the chat log database, when one is configured"""
+    # Checked before importing the chat log modules, which need psycopg2
+    if not os.getenv('CHAT_LOG_DATABASE_URL'):
+        return
+    import psycopg2
+    from chat_log_writer import CHAT_LOG_DATABASE_URL
+    from rollups import ensure_tables
+    try:
+        ensure_tables(CHAT_LOG_DATABASE_URL)
+    except psycopg2.Error as e:
+        # Rollup reads create them on first use instead
+        print(f"Could not create the analytics rollup tables: {e}")
 
 class DataGenerator:
     def __init__(self):
-        self.fake = Faker()
-        self.field_generators = {
-            'first_name': lambda: self.fake.first_name(),
-            'last_name': lambda: self.fake.last_name(),
-            'email': lambda: self.fake.email(),
-            'phone': lambda: self.fake.phone_number(),
-            'address': lambda: self.fake.address(),
-            'company': lambda: self.fake.company(),
-            'job_title': lambda: self.fake.job(),
-            'credit_card': lambda: self.fake.credit_card_number(),
-            'date': lambda: self.fake.date(),
-            'datetime': lambda: self.fake.date_time(),
-            'uuid': lambda: str(uuid.uuid4()),
-            'number': lambda: random.randint(1, 1000),
-            'decimal': lambda: round(random.uniform(1.0, 1000.0), 2),
-            'boolean': lambda: random.choice([True, False]),
-            'country': lambda: self.fake.country(),
-            'city': lambda: self.fake.city(),
-            'state': lambda: self.fake.state(),
-            'zip_code': lambda: self.fake.zipcode(),
-            'url': lambda: self.fake.url(),
-            'text': lambda: self.fake.text(max_nb_chars=200),
-            'sentence': lambda: self.fake.sentence(),
-            'word': lambda: self.fake.word(),
-            'color': lambda: self.fake.color_name(),
-            'currency': lambda: self.fake.currency_code(),
-            'language': lambda: self.fake.language_name(),
-            'ip_address': lambda: self.fake.ipv4(),
-            'mac_address': lambda: self.fake.mac_address(),
-            'user_agent': lambda: self.fake.user_agent(),
-            'password': lambda: self.fake.password(),
-            'ssn': lambda: self.fake.ssn(),
-            'vin': lambda: self.fake.vin(),
-            'license_plate': lambda: self.fake.license_plate(),
-            'iban': lambda: self.fake.iban(),
-            'bic': lambda: self.fake.swift(),
-        }
+        pools = {}
+        self.engine = ColumnarEngine(pools=pools)
+        # Seeded datasets use a fixed reference time so their dates never drift
+        self.seeded_engine = ColumnarEngine(pools=pools, reference_time=SEEDED_REFERENCE_TIME)
+    
+    def generate_columns(self, schema, num_rows, seed=None, offset=0):
+        """Generate data based on schema as a mapping of field name to column"""
+        if seed is not None:
+            return self.seeded_engine.generate_range(schema, seed, offset, num_rows)
+        return self.engine.generate_columns(schema, num_rows)
 
-    def generate_data(self, schema, num_rows):
+    def check_unique(self, schema, num_rows, seed=None):
+        """Raise ValueError when a unique field cannot hold num_rows distinct values"""
+        engine = self.engine if seed is None else self.seeded_engine
+        engine.check_unique(schema, num_rows)
+    
+    def generate_data(self, schema, num_rows, seed=None, offset=0):
         """Generate data based on schema"""
-        data = []
-        
-        for _ in range(num_rows):
-            row = {}
-            for field in schema:
-                field_name = field['name']
-                field_type = field['type']
-                
-                if field_type in self.field_generators:
-                    row[field_name] = self.field_generators[field_type]()
-                else:
-                    # Fallback for custom types
-                    row[field_name] = f"custom_{field_type}_{random.randint(1, 100)}"
-            
-            data.append(row)
-        
-        return data
+        return columns_to_rows(self.generate_columns(schema, num_rows, seed, offset))
+
+    def iter_batches(self, schema, num_rows, batch_rows, seed=None, offset=0):
+        """Generate data based on schema as column batches of at most batch_rows rows"""
+        if seed is not None:
+            return self.seeded_engine.iter_range_batches(schema, seed, offset, num_rows, batch_rows)
+        return self.engine.iter_batches(schema, num_rows, batch_rows)
 
 class OllamaIntegration:
-    def __init__(self, host=OLLAMA_HOST):
-        self.host = host
+    def __init__(self, service, schema_index=None):
+        # Requests go through the service's pooled session, cache and token-stream parser
+        self.service = service
+        self.host = service.host
+        self.model = service.model
+        self.cache = service.cache
+        self.schema_index = schema_index
+        self.health = service.health
     
     def generate_schema_from_request(self, user_request):
         """Use Ollama to generate a data schema from user request"""
-        prompt = f"""
-        Based on the following user request for synthetic data generation, create a JSON schema with appropriate field types.
-        
-        User Request: "{user_request}"
-        
-        Please respond with a JSON array of fields, where each field has:
-        - name: field name (string)
-        - type: data type from this list: {list(DataGenerator().field_generators.keys())}
-        - description: brief description of the field
-        
-        Example response:
-        [
-            {{"name": "customer_id", "type": "uuid", "description": "Unique customer identifier"}},
-            {{"name": "first_name", "type": "first_name", "description": "Customer's first name"}},
-            {{"name": "email", "type": "email", "description": "Customer's email address"}},
-            {{"name": "registration_date", "type": "datetime", "description": "When customer registered"}}
-        ]
-        
-        Only respond with the JSON array, no additional text.
-        """
-        
-        try:
-            response = requests.post(
-                f"{self.host}/api/generate",
-                json={
-                    "model": "llama2",  # Adjust model as needed
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                schema_text = result.get('response', '')
-                
-                # Try to extract JSON from response
-                try:
-                    # Find JSON array in response
-                    start_idx = schema_text.find('[')
-                    end_idx = schema_text.rfind(']') + 1
-                    if start_idx != -1 and end_idx != 0:
-                        json_text = schema_text[start_idx:end_idx]
-                        schema = json.loads(json_text)
-                        return schema
-                except json.JSONDecodeError:
-                    pass
-                
-                # Fallback: generate basic schema
-                return self._generate_fallback_schema(user_request)
-            
-        except Exception as e:
-            print(f"Ollama integration error: {e}")
+        # A near-identical known-good schema is returned without calling the LLM
+        if self.schema_index is not None:
+            match = self.schema_index.best_match(user_request, SCHEMA_INDEX_MATCH_SCORE)
+            metrics.record_cache('schema_index', match is not None)
+            if match:
+                return match['schema']
         
-        return self._generate_fallback_schema(user_request)
+        # The response is parsed from the token stream as it arrives. A stream that ends before
+        # its JSON array is complete gives no schema, and the default schema is used instead
+        # of the fields received so far.
+        schema, _ = self.service._request_schema(user_request)
+        if schema is None:
+            return self._generate_fallback_schema(user_request)
+        return schema
     
     def _generate_fallback_schema(self, user_request):
         """Generate a basic schema when Ollama is not available"""
+        if self.schema_index is not None:
+            match = self.schema_index.best_match(user_request, SCHEMA_INDEX_FALLBACK_SCORE)
+            if match:
+                return match['schema']
+        
         return [
             {"name": "id", "type": "uuid", "description": "Unique identifier"},
             {"name": "name", "type": "first_name", "description": "Name field"},
@@ -173,9 +215,182 @@ class OllamaIntegration:
             {"name": "created_at", "type": "datetime", "description": "Creation timestamp"}
         ]
 
+def update_job_status(job_id, **fields):
+    """Persist status and progress of a background job in data_requests"""
+    with app.app_context():
+        job = db.session.get(DataRequest, job_id)
+        for key, value in fields.items():
+            setattr(job, key, value)
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+
+def iter_job_chunks(job):
+    """Render a background job as (text, row count) chunks"""
+    # Chunks are generated in the process pool, so a job never holds the web worker's GIL
+    sizes = plan_shards(job.num_rows, job.workers, JOB_CHUNK_ROWS)
+    shards = iter_sharded(job.schema, job.num_rows, job.format, job.workers,
+                          shard_rows=JOB_CHUNK_ROWS, seed=job.seed)
+    yield from zip(shards, sizes)
+
+def touch_jobs(job_ids):
+    """Refresh updated_at of the jobs this worker still holds"""
+    with app.app_context():
+        DataRequest.query.filter(DataRequest.id.in_(job_ids)).update(
+            {'updated_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+def claim_stale_jobs(stale_seconds):
+    """Take over background jobs that no worker has updated for stale_seconds"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    jobs = []
+    with app.app_context():
+        # Only rows with an output format are generation jobs; the others are handled by admins
+        stale = DataRequest.query.filter(
+            DataRequest.output_format.isnot(None),
+            DataRequest.status.in_(['pending', 'in_progress']),
+            DataRequest.updated_at < cutoff
+        ).all()
+        for record in stale:
+            # The updated_at check lets exactly one worker claim each job
+            claimed = DataRequest.query.filter_by(id=record.id, updated_at=record.updated_at).update(
+                {'status': 'pending', 'rows_generated': 0, 'updated_at': datetime.utcnow()},
+                synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                jobs.append(GenerationJob(
+                    id=record.id,
+                    schema=json.loads(record.schema_details),
+                    num_rows=record.requested_record_count,
+                    format=record.output_format,
+                    seed=record.seed,
+                    workers=record.workers or 1
+                ))
+    return jobs
+
+def load_saved_schemas(after_id):
+    """Saved schemas with an id above after_id, for the similarity index"""
+    with app.app_context():
+        query = DataSchema.query.filter(DataSchema.id > after_id).order_by(DataSchema.id)
+        for record in query.yield_per(500):
+            yield record.id, record.name, record.user_request, record.schema_data
+
 # Initialize services
 data_generator = DataGenerator()
-ollama = OllamaIntegration()
+FIELD_TYPES = data_generator.engine.field_types
+schema_index = SchemaIndex(saved_loader=load_saved_schemas)
+ollama_service = OllamaService(OLLAMA_HOST, OLLAMA_MODEL, schema_index=schema_index)
+ollama = OllamaIntegration(ollama_service, schema_index=schema_index)
+job_queue = JobQueue(iter_job_chunks, update_job_status, touch=touch_jobs, claim_stale=claim_stale_jobs)
+
+# Field types with descriptions and examples, built once per process (or before forking)
+field_type_catalog = None
+field_type_catalog_lock = threading.Lock()
+
+def build_field_type_catalog():
+    """Describe every field type with a reproducible example value"""
+    # Faker examples come straight from the providers, so listing the types never builds the
+    # full value pools used for generation
+    from faker import Faker
+    fake = Faker()
+    engine = ColumnarEngine(fake, np.random.default_rng(0), pools={}, reference_time=SEEDED_REFERENCE_TIME)
+    native_schema = [{'name': field_type, 'type': field_type} for field_type in FIELD_TYPES
+                     if field_type not in FAKER_PROVIDERS]
+    examples = engine.generate_rows(native_schema, 1)[0]
+    
+    catalog = []
+    for field_type in FIELD_TYPES:
+        if field_type in FAKER_PROVIDERS:
+            fake.seed_instance(0)
+            example = FAKER_PROVIDERS[field_type](fake)
+        else:
+            example = examples[field_type]
+        catalog.append({
+            'type': field_type,
+            'description': f'Generate {field_type.replace("_", " ")} data',
+            'example': str(example)
+        })
+    return catalog
+
+def get_field_type_catalog():
+    global field_type_catalog
+    with field_type_catalog_lock:
+        if field_type_catalog is None:
+            field_type_catalog = build_field_type_catalog()
+    return field_type_catalog
+
+def warmup():
+    """
+    Build shared state once before a pre-fork server starts its workers
+    
+    Forked workers inherit the tables check, the field-type catalog, the loaded schema index, the
+    metrics run directory and, with WARMUP_VALUE_POOLS, the mapped value pools. Database
+    connections opened here are closed again so no worker shares a socket with the master.
+    """
+    started = time.perf_counter()
+    metrics.remove_stale_runs()
+    metrics.run_directory()
+    init_db()
+    get_field_type_catalog()
+    len(schema_index)
+    if WARMUP_VALUE_POOLS:
+        for field_type in FAKER_PROVIDERS:
+            data_generator.engine.generate_column(field_type, 1)
+    with app.app_context():
+        db.engine.dispose()
+    print(f"Warmup finished in {time.perf_counter() - started:.2f}s")
+
+@app.before_request
+def ensure_db():
+    if not db_initialized:
+        init_db()
+    job_queue.start()
+
+@app.before_request
+def start_request_metrics():
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.request_timer = metrics.start_request(endpoint)
+    if request.content_length is not None:
+        metrics.HTTP_REQUEST_BYTES.observe(request.content_length, endpoint=endpoint)
+    # Requests carrying the profiling token are sampled until their response is complete
+    g.profiler = metrics.start_profile() if metrics.profiling_requested(request.headers.get('X-Profile')) else None
+
+@app.after_request
+def finish_request_metrics(response):
+    timer = g.pop('request_timer', None)
+    if timer is None:
+        return response
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        response.headers['X-Profile-Id'] = profiler.id
+    method = request.method
+    status = response.status_code
+    
+    def finish(size):
+        metrics.end_request(timer, method, status, size)
+        if profiler is not None:
+            metrics.finish_profile(profiler)
+    
+    if response.is_streamed:
+        # Streamed bodies are generated while they are sent, so timing ends when the body is closed
+        response.response = metrics.CountedStream(response.response, finish)
+    else:
+        if timer.phases:
+            response.headers['Server-Timing'] = timer.server_timing()
+        finish(response.content_length)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Service metrics of all worker processes in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Folded stacks sampled from a request sent with the X-Profile header"""
+    folded = metrics.get_profile(profile_id)
+    if folded is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(folded, mimetype='text/plain')
 
 @app.route('/')
 def index():
@@ -191,6 +406,13 @@ def generate_schema():
         if not user_request:
             return jsonify({'error': 'User request is required'}), 400
         
+        if data.get('stream'):
+            # One NDJSON line per field, sent as soon as the model has written it
+            fields = ollama_service.stream_schema_from_request(user_request, data.get('context'))
+            lines = (json.dumps(field) + '\n' for field in fields)
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson',
+                            headers={'X-Accel-Buffering': 'no'})
+        
         schema = ollama.generate_schema_from_request(user_request)
         
         return jsonify({
@@ -201,6 +423,30 @@ def generate_schema():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/generate-schemas', methods=['POST'])
+def generate_schemas():
+    """Generate schemas for many requests concurrently, streamed as NDJSON as each one finishes"""
+    try:
+        data = request.get_json()
+        user_requests = data.get('requests', [])
+        concurrency = data.get('concurrency')
+        
+        if not user_requests or not all(isinstance(item, str) and item.strip() for item in user_requests):
+            return jsonify({'error': 'requests must be a non-empty list of strings'}), 400
+        
+        if len(user_requests) > SCHEMA_BATCH_MAX_REQUESTS:
+            return jsonify({'error': f'At most {SCHEMA_BATCH_MAX_REQUESTS} requests per batch'}), 400
+        
+        results = ollama_service.generate_schemas_batch(
+            user_requests, data.get('context'), None if concurrency is None else int(concurrency)
+        )
+        lines = (json.dumps(result) + '\n' for result in results)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson',
+                        headers={'X-Accel-Buffering': 'no'})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/generate-data', methods=['POST'])
 def generate_data():
     """Generate data based on schema"""
@@ -213,44 +459,612 @@ def generate_data():
         if not schema:
             return jsonify({'error': 'Schema is required'}), 400
         
-        # Generate data
-        generated_data = data_generator.generate_data(schema, num_rows)
+        # With a seed, (schema, seed) defines a virtual dataset and this request returns
+        # rows [offset, offset + num_rows) of it
+        seed = data.get('seed')
+        offset = int(data.get('offset', 0))
+        if seed is not None:
+            seed = int(seed)
+        elif offset:
+            return jsonify({'error': 'offset requires a seed'}), 400
+        if offset < 0:
+            return jsonify({'error': 'offset must not be negative'}), 400
         
-        # Convert to requested format
-        if format_type == 'csv':
-            df = pd.DataFrame(generated_data)
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_content = csv_buffer.getvalue()
-            
-            return jsonify({
-                'data': csv_content,
-                'format': 'csv',
-                'filename': f'synthetic_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            })
+        # Unique fields with too small a value space are rejected before any rows are generated
+        try:
+            data_generator.check_unique(schema, offset + num_rows, seed)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        elif format_type == 'json':
-            return jsonify({
-                'data': generated_data,
-                'format': 'json',
-                'filename': f'synthetic_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-            })
+        # Large requests are split into shards across the generation process pool
+        workers = resolve_workers(data.get('workers'))
+        if num_rows < PARALLEL_MIN_ROWS:
+            workers = 1
         
-        elif format_type == 'python':
-            # Generate Python code similar to your provided script
-            python_code = generate_python_code(schema, generated_data)
+        if format_type in COLUMNAR_FORMATS:
+            return columnar_file(schema, num_rows, format_type, workers, seed, offset)
+        
+        if format_type == 'python':
+            # The script generates its own rows, so none are generated here
+            with metrics.phase('serialize'):
+                python_code = generate_python_code(schema)
             return jsonify({
                 'data': python_code,
                 'format': 'python',
                 'filename': f'data_generator_{datetime.now().strftime("%Y%m%d_%H%M%S")}.py'
             })
         
+        if data.get('stream') or format_type == 'ndjson':
+            chunk_rows = int(data.get('chunk_rows', STREAM_CHUNK_ROWS))
+            if chunk_rows < 1:
+                return jsonify({'error': 'chunk_rows must be positive'}), 400
+            header = data.get('header', offset == 0)
+            return stream_data(schema, num_rows, format_type, chunk_rows, workers, seed, offset, header)
+        
+        with metrics.phase('generate'):
+            if format_type == 'csv' and workers > 1:
+                # Shards render their own CSV; concatenating them in order gives the full file
+                csv_content = ''.join(iter_sharded(schema, num_rows, 'csv', workers, seed=seed, offset=offset))
+                columns = None
+            elif workers > 1:
+                columns = generate_columns_sharded(schema, num_rows, workers, seed, offset)
+            else:
+                # Generate data column by column; rows are only assembled when a format needs them
+                columns = data_generator.generate_columns(schema, num_rows, seed, offset)
+        
+        # Seeded responses say where the next page of the dataset starts
+        range_info = {} if seed is None else {'seed': seed, 'offset': offset, 'next_offset': offset + num_rows}
+        
+        # Convert to requested format
+        with metrics.phase('serialize'):
+            if format_type == 'csv':
+                if columns is not None:
+                    import pandas as pd
+                    df = pd.DataFrame(columns)
+                    csv_buffer = io.StringIO()
+                    df.to_csv(csv_buffer, index=False)
+                    csv_content = csv_buffer.getvalue()
+                
+                return jsonify({
+                    'data': csv_content,
+                    'format': 'csv',
+                    'filename': f'synthetic_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+                    **range_info
+                })
+            
+            elif format_type == 'json':
+                return jsonify({
+                    'data': columns_to_rows(columns),
+                    'format': 'json',
+                    'filename': f'synthetic_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json',
+                    **range_info
+                })
+            
+            else:
+                return jsonify({'error': 'Unsupported format'}), 400
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Streaming serializers: format -> (serializer, mimetype, file extension)
+STREAM_FORMATS = {
+    'csv': (iter_csv, 'text/csv', 'csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson', 'ndjson'),
+}
+
+def iter_dataset(schema, num_rows, format_type, chunk_rows, workers=1, seed=None, offset=0, header=True):
+    """Render a dataset as csv or ndjson text chunks of at most chunk_rows rows"""
+    serializer = STREAM_FORMATS[format_type][0]
+    if workers > 1:
+        # Each chunk is a shard rendered by the process pool, yielded in order
+        chunks = iter_sharded(schema, num_rows, format_type, workers, shard_rows=chunk_rows,
+                              seed=seed, offset=offset, header=header)
+        return metrics.timed_iter(chunks, 'generate')
+    
+    # Batches are generated as the serializer pulls them; the timer keeps the two phases apart
+    batches = metrics.timed_iter(data_generator.iter_batches(schema, num_rows, chunk_rows, seed, offset), 'generate')
+    chunks = serializer(batches, header=header) if format_type == 'csv' else serializer(batches)
+    return metrics.timed_iter(chunks, 'serialize')
+
+def iter_dataset_formats(schema, num_rows, formats, chunk_rows, workers=1, seed=None):
+    """Generate a dataset once as tuples holding each chunk of rows in every format, without CSV header"""
+    if workers > 1:
+        chunks = iter_sharded(schema, num_rows, formats, workers, shard_rows=chunk_rows, seed=seed, header=False)
+        return metrics.timed_iter(chunks, 'generate')
+    
+    batches = metrics.timed_iter(data_generator.iter_batches(schema, num_rows, chunk_rows, seed), 'generate')
+    renderers = {'csv': lambda batch: ''.join(iter_csv([batch], header=False)),
+                 'ndjson': lambda batch: ''.join(iter_ndjson([batch]))}
+    chunks = (tuple(renderers[format_type](batch) for format_type in formats) for batch in batches)
+    return metrics.timed_iter(chunks, 'serialize')
+
+def stream_data(schema, num_rows, format_type, chunk_rows, workers=1, seed=None, offset=0, header=True):
+    """Stream generated data in fixed-size row chunks with chunked transfer encoding"""
+    if format_type not in STREAM_FORMATS:
+        return jsonify({'error': 'Streaming supports csv and ndjson formats'}), 400
+    
+    _, mimetype, extension = STREAM_FORMATS[format_type]
+    chunks = iter_dataset(schema, num_rows, format_type, chunk_rows, workers, seed, offset, header)
+    filename = f'synthetic_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    
+    headers = {
+        'Content-Disposition': f'attachment; filename={filename}',
+        'X-Accel-Buffering': 'no'  # Disable proxy buffering so chunks reach the client immediately
+    }
+    if seed is not None:
+        headers['X-Dataset-Seed'] = str(seed)
+        headers['X-Next-Offset'] = str(offset + num_rows)
+    
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+@app.route('/api/expand-data', methods=['POST'])
+def expand_data():
+    """Generate rows locally from column models fitted to a few LLM-written samples"""
+    try:
+        data = request.get_json()
+        schema = data.get('schema', [])
+        num_rows = int(data.get('num_rows', 100))
+        format_type = data.get('format', 'csv')
+        seed = data.get('seed')
+        
+        if not schema:
+            return jsonify({'error': 'Schema is required'}), 400
+        
+        if format_type not in STREAM_FORMATS and format_type != 'json':
+            return jsonify({'error': 'Expansion supports csv, ndjson and json formats'}), 400
+        
+        # Caller-supplied samples skip the LLM round-trip
+        samples = data.get('samples')
+        if not samples:
+            samples = ollama_service.generate_data_samples(schema, int(data.get('num_samples', EXPAND_SAMPLE_COUNT)))
+        model = fit_sample_model(schema, samples, data_generator.engine)
+        rng = np.random.default_rng(None if seed is None else int(seed))
+        
+        if format_type == 'json':
+            return jsonify({
+                'data': columns_to_rows(model.generate_columns(num_rows, rng)),
+                'format': 'json',
+                'sample_count': model.sample_count,
+                'models': model.describe()
+            })
+        
+        chunk_rows = int(data.get('chunk_rows', STREAM_CHUNK_ROWS))
+        if chunk_rows < 1:
+            return jsonify({'error': 'chunk_rows must be positive'}), 400
+        
+        serializer, mimetype, extension = STREAM_FORMATS[format_type]
+        batches = model.iter_batches(num_rows, chunk_rows, rng)
+        chunks = serializer(batches) if format_type == 'ndjson' else serializer(batches, header=True)
+        filename = f'synthetic_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+        
+        headers = {
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no',
+            'X-Sample-Count': str(model.sample_count)
+        }
+        return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/generate-relational', methods=['POST'])
+def generate_relational():
+    """Stream linked tables, parents first, with foreign keys drawn from the parent keys"""
+    try:
+        data = request.get_json()
+        format_type = data.get('format', 'ndjson')
+        if format_type not in RELATIONAL_FORMATS:
+            return jsonify({'error': f'Relational output supports {", ".join(RELATIONAL_FORMATS)}'}), 400
+        
+        chunk_rows = int(data.get('chunk_rows', STREAM_CHUNK_ROWS))
+        if chunk_rows < 1:
+            return jsonify({'error': 'chunk_rows must be positive'}), 400
+        
+        # Every relational dataset is seeded; the seed is returned so it can be regenerated
+        seed = data.get('seed')
+        seed = int(np.random.SeedSequence().generate_state(1)[0]) if seed is None else int(seed)
+        
+        try:
+            plan = compile_relational(data)
+            # Key columns are built up front, so row counts are known before streaming starts
+            keys = generate_keys(plan, seed, data_generator.seeded_engine)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        total_rows = sum(table_keys.rows for table_keys in keys.values())
+        workers = resolve_workers(data.get('workers'))
+        if total_rows < PARALLEL_MIN_ROWS:
+            workers = 1
+        
+        chunks = iter_relational(plan, keys, seed, format_type, workers, chunk_rows, data_generator.seeded_engine)
+        extension = 'sql' if format_type == 'sql' else 'ndjson'
+        filename = f'synthetic_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+        
+        headers = {
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no',
+            'X-Dataset-Seed': str(seed),
+            'X-Table-Rows': ','.join(f'{table.name}={keys[table.name].rows}' for table in plan.tables)
+        }
+        mimetype = 'application/sql' if format_type == 'sql' else 'application/x-ndjson'
+        return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def columnar_file(schema, num_rows, format_type, workers=1, seed=None, offset=0):
+    """Write the dataset to a Parquet/Arrow file straight from column buffers and send it"""
+    if workers > 1:
+        batches = iter_sharded(schema, num_rows, 'columns', workers, shard_rows=COLUMNAR_BATCH_ROWS,
+                               seed=seed, offset=offset)
+    else:
+        batches = data_generator.iter_batches(schema, num_rows, COLUMNAR_BATCH_ROWS, seed, offset)
+    plan = compile_schema(schema)
+    mimetype, extension, _ = COLUMNAR_FORMATS[format_type]
+    
+    # Anonymous temporary file: removed by the OS once the download closes it
+    output = tempfile.TemporaryFile()
+    try:
+        write_columnar(batches, dict(zip(plan.names, plan.types)), output, format_type)
+        output.seek(0)
+    except Exception:
+        output.close()
+        raise
+    
+    response = send_file(
+        output,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=f'synthetic_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    )
+    if seed is not None:
+        response.headers['X-Dataset-Seed'] = str(seed)
+        response.headers['X-Next-Offset'] = str(offset + num_rows)
+    return response
+
+@app.route('/api/export-bundle', methods=['POST'])
+def export_bundle():
+    """Write one dataset as CSV, JSON, SQL and a generator script into a single archive download"""
+    try:
+        data = request.get_json()
+        schema = data.get('schema', [])
+        num_rows = int(data.get('num_rows', 100))
+        archive_format = data.get('archive', 'zip')
+        members = data.get('members', list(BUNDLE_MEMBERS))
+        table = data.get('table', 'synthetic_data')
+        
+        if not schema:
+            return jsonify({'error': 'Schema is required'}), 400
+        
+        if not members or any(member not in BUNDLE_MEMBERS for member in members):
+            return jsonify({'error': f'members must be a non-empty list of {", ".join(BUNDLE_MEMBERS)}'}), 400
+        
+        if num_rows > BUNDLE_MAX_ROWS:
+            return jsonify({'error': f'At most {BUNDLE_MAX_ROWS} rows per bundle'}), 400
+        
+        try:
+            check_archive_format(archive_format)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Bundles are always seeded so the response can name the seed that reproduces them
+        seed = data.get('seed')
+        seed = int(np.random.SeedSequence().generate_state(1)[0]) if seed is None else int(seed)
+        try:
+            data_generator.check_unique(schema, num_rows, seed)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        workers = resolve_workers(data.get('workers'))
+        if num_rows < PARALLEL_MIN_ROWS:
+            workers = 1
+        
+        # The rows are generated once, as headerless CSV and/or NDJSON, and every member is
+        # rendered from the spooled text of the format it needs
+        formats = tuple(format_type for format_type, needed_by in (('csv', {'csv', 'sql'}), ('ndjson', {'json'}))
+                        if needed_by & set(members))
+        spools = {}
+        if formats:
+            spools = dict(zip(formats, spool_chunk_sets(
+                iter_dataset_formats(schema, num_rows, formats, STREAM_CHUNK_ROWS, workers, seed), len(formats))))
+        
+        csv_header = ''.join(iter_csv([{field['name']: [] for field in schema}]))
+        factories = {
+            'csv': ('data.csv', lambda: itertools.chain([csv_header], iter_spool(spools['csv']))),
+            'json': ('data.json', lambda: iter_json_array(iter_spool(spools['ndjson']))),
+            'sql': ('data.sql', lambda: iter_sql_script(table, schema, iter_spool(spools['csv']))),
+            'python': ('generate_data.py', lambda: [generate_python_code(schema, table)]),
+        }
+        
+        # Anonymous temporary file: removed by the OS once the download closes it
+        output = tempfile.TemporaryFile()
+        try:
+            sizes = write_bundle([factories[member] for member in members], archive_format, output)
+            output.seek(0)
+        except Exception:
+            output.close()
+            raise
+        finally:
+            for spool in spools.values():
+                spool.close()
+        
+        mimetype, extension = BUNDLE_FORMATS[archive_format]
+        response = send_file(
+            output,
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=f'synthetic_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+        )
+        response.headers['X-Dataset-Seed'] = str(seed)
+        response.headers['X-Uncompressed-Bytes'] = str(sum(sizes.values()))
+        return response
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/load-postgres', methods=['POST'])
+def load_postgres():
+    """Generate data and bulk load it into a caller-supplied PostgreSQL database with COPY"""
+    if not POSTGRES_LOAD_ENABLED:
+        return jsonify({'error': 'Direct PostgreSQL loading is disabled (set POSTGRES_LOAD_ENABLED=true)'}), 403
+    
+    import psycopg2
+    from postgres_loader import copy_batches
+    
+    try:
+        data = request.get_json()
+        dsn = data.get('dsn', '')
+        table = data.get('table', 'synthetic_data')
+        schema = data.get('schema', [])
+        num_rows = int(data.get('num_rows', 100))
+        batch_size = int(data.get('batch_size', POSTGRES_LOAD_BATCH_ROWS))
+        seed = data.get('seed')
+        seed = None if seed is None else int(seed)
+        
+        if not dsn or not schema:
+            return jsonify({'error': 'dsn and schema are required'}), 400
+        
+        if batch_size < 1:
+            return jsonify({'error': 'batch_size must be positive'}), 400
+        
+        try:
+            data_generator.check_unique(schema, num_rows, seed)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        workers = resolve_workers(data.get('workers'))
+        if workers > 1 and num_rows >= PARALLEL_MIN_ROWS:
+            # Shards are generated ahead in the process pool while earlier batches are copied
+            batches = iter_sharded(schema, num_rows, 'columns', workers, shard_rows=batch_size, seed=seed)
         else:
-            return jsonify({'error': 'Unsupported format'}), 400
+            batches = data_generator.iter_batches(schema, num_rows, batch_size, seed)
+        
+        stats = copy_batches(dsn, table, schema, batches, create_table=data.get('create_table', True))
+        return jsonify(stats)
+    
+    except psycopg2.Error as e:
+        return jsonify({'error': f'Database error: {e}'}), 502
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queue a large dataset for background generation"""
+    try:
+        data = request.get_json()
+        schema = data.get('schema', [])
+        num_rows = int(data.get('num_rows', 0))
+        format_type = data.get('format', 'csv')
+        seed = data.get('seed')
+        
+        if not schema or num_rows < 1:
+            return jsonify({'error': 'Schema and a positive num_rows are required'}), 400
+        
+        if format_type not in JOB_FORMATS:
+            return jsonify({'error': f'Jobs support these formats: {", ".join(JOB_FORMATS)}'}), 400
+        
+        try:
+            data_generator.check_unique(schema, num_rows, seed)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        record = DataRequest(
+            email=data.get('email', ''),
+            topic=data.get('topic'),
+            field_count=len(schema),
+            requested_record_count=num_rows,
+            schema_details=json.dumps(schema),
+            additional_notes=data.get('notes'),
+            status='pending',
+            output_format=format_type,
+            rows_generated=0,
+            seed=None if seed is None else int(seed),
+            workers=resolve_workers(data.get('workers'))
+        )
+        db.session.add(record)
+        db.session.commit()
+        
+        job_queue.submit(GenerationJob(
+            id=record.id,
+            schema=schema,
+            num_rows=num_rows,
+            format=format_type,
+            seed=record.seed,
+            workers=record.workers
+        ))
+        
+        return jsonify({
+            'job_id': record.id,
+            'status': record.status,
+            'status_url': f'/api/jobs/{record.id}'
+        }), 202
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report status and progress of a background job"""
+    record = db.session.get(DataRequest, job_id)
+    if record is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    result = {
+        'job_id': record.id,
+        'status': record.status,
+        'format': record.output_format,
+        'rows_generated': record.rows_generated or 0,
+        'requested_record_count': record.requested_record_count,
+        'progress': round((record.rows_generated or 0) / record.requested_record_count, 4),
+        'created_at': record.created_at.isoformat(),
+        'updated_at': record.updated_at.isoformat()
+    }
+    if record.status == 'completed':
+        result['download_url'] = f'/api/jobs/{record.id}/download'
+    if record.error_message:
+        result['error'] = record.error_message
+    
+    return jsonify(result)
+
+@app.route('/api/jobs/<int:job_id>/download', methods=['GET'])
+def download_job(job_id):
+    """Download the output file of a completed background job"""
+    record = db.session.get(DataRequest, job_id)
+    if record is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if record.status != 'completed' or not record.artifact_path or not os.path.exists(record.artifact_path):
+        return jsonify({'error': 'Job output is not available'}), 409
+    
+    return send_file(
+        os.path.abspath(record.artifact_path),
+        as_attachment=True,
+        download_name=f'synthetic_data_job_{record.id}.{JOB_FORMATS[record.output_format]}'
+    )
+
+@app.route('/api/ollama/health', methods=['GET'])
+def ollama_health():
+    """Cached Ollama availability and circuit breaker state"""
+    status = ollama.health.status()
+    status['available'] = status['state'] == 'closed'
+    return jsonify(status)
+
+@app.route('/api/llm-cache', methods=['GET'])
+def llm_cache_stats():
+    """Hit/miss counters and size of the LLM schema cache"""
+    return jsonify(ollama.cache.stats())
+
+@app.route('/api/llm-cache', methods=['DELETE'])
+def clear_llm_cache():
+    """Drop every cached LLM response"""
+    ollama.cache.clear()
+    return jsonify({'message': 'LLM cache cleared'})
+
+def chat_log_writer_or_error():
+    from chat_log_writer import get_default_writer
+    writer = get_default_writer()
+    if writer is None:
+        return None, (jsonify({'error': 'Chat log ingestion is not configured (CHAT_LOG_DATABASE_URL)'}), 503)
+    return writer, None
+
+def queue_full_response():
+    response = jsonify({'error': 'Chat log queue is full, row dropped'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.route('/api/chat-logs', methods=['POST'])
+def log_chat():
+    """Queue one chat_logs row for the batched writer; returns its id without waiting for the write"""
+    import psycopg2
+    writer, error = chat_log_writer_or_error()
+    if error:
+        return error
+    
+    try:
+        row_id = writer.log_chat(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except psycopg2.Error as e:
+        return jsonify({'error': f'Database error: {e}'}), 502
+    
+    if row_id is None:
+        return queue_full_response()
+    return jsonify({'id': row_id}), 202
+
+@app.route('/api/ai-ratings', methods=['POST'])
+def log_rating():
+    """Queue one ai_ratings row for the batched writer"""
+    writer, error = chat_log_writer_or_error()
+    if error:
+        return error
+    
+    try:
+        accepted = writer.log_rating(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not accepted:
+        return queue_full_response()
+    return jsonify({'message': 'Rating queued'}), 202
+
+@app.route('/api/chat-logs/writer', methods=['GET'])
+def chat_log_writer_stats():
+    """Queue depth, written and dropped rows of this worker's chat log writer"""
+    writer, error = chat_log_writer_or_error()
+    if error:
+        return error
+    return jsonify(writer.stats())
+
+def parse_rollup_time(value, default):
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+@app.route('/api/analytics/rollups', methods=['GET'])
+def analytics_rollups():
+    """Hourly or daily chat and rating aggregates for the admin dashboard, read from the rollup tables"""
+    import psycopg2
+    from chat_log_writer import CHAT_LOG_DATABASE_URL
+    from rollups import DEFAULT_RANGES, GRANULARITIES, load_rollups, refresh_in_background
+    if not CHAT_LOG_DATABASE_URL:
+        return jsonify({'error': 'Analytics rollups are not configured (CHAT_LOG_DATABASE_URL)'}), 503
+    
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'granularity must be one of {", ".join(GRANULARITIES)}'}), 400
+    try:
+        end = parse_rollup_time(request.args.get('end'), datetime.utcnow())
+        start = parse_rollup_time(request.args.get('start'), end - DEFAULT_RANGES[granularity])
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO 8601 timestamps'}), 400
+    
+    try:
+        rollups = load_rollups(CHAT_LOG_DATABASE_URL, granularity, start, end)
+        rollups['refreshing'] = (request.args.get('refresh', 'true').lower() != 'false'
+                                 and refresh_in_background(CHAT_LOG_DATABASE_URL))
+        return jsonify(rollups)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except psycopg2.Error as e:
+        return jsonify({'error': f'Database error: {e}'}), 502
+
+@app.route('/api/analytics/rollups/refresh', methods=['POST'])
+def refresh_analytics_rollups():
+    """Roll up every chat log and rating older than the rollup lag now; rebuild recomputes from all rows"""
+    import psycopg2
+    from chat_log_writer import CHAT_LOG_DATABASE_URL
+    from rollups import refresh_rollups
+    if not CHAT_LOG_DATABASE_URL:
+        return jsonify({'error': 'Analytics rollups are not configured (CHAT_LOG_DATABASE_URL)'}), 503
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(refresh_rollups(CHAT_LOG_DATABASE_URL, rebuild=bool(data.get('rebuild'))))
+    except psycopg2.Error as e:
+        return jsonify({'error': f'Database error: {e}'}), 502
+
 @app.route('/api/save-schema', methods=['POST'])
 def save_schema():
     """Save schema to database"""
@@ -265,35 +1079,138 @@ def save_schema():
         
         schema_record = DataSchema(
             name=name,
-            schema_data=json.dumps(schema_data),
+            schema_data=schema_data,
             user_request=user_request
         )
         
         db.session.add(schema_record)
         db.session.commit()
+        clear_schema_list_cache()
+        
+        try:
+            schema_index.add(user_request or name, schema_data, 'saved', schema_record.id, name)
+        except Exception as e:
+            print(f"Could not index saved schema {schema_record.id}: {e}")
         
         return jsonify({'message': 'Schema saved successfully', 'id': schema_record.id})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Rendered /api/schemas pages keyed by query and the newest schema id; saved schemas are
+# never modified, so a new id is the only way a page can change
+schema_list_cache = OrderedDict()
+schema_list_lock = threading.Lock()
+
+def clear_schema_list_cache():
+    """Drop cached schema pages after a save in this process"""
+    with schema_list_lock:
+        schema_list_cache.clear()
+
+def parse_schema_filters(args):
+    """Validated listing parameters from the query string"""
+    limit = int(args.get('limit', SCHEMA_PAGE_SIZE))
+    if not 1 <= limit <= SCHEMA_PAGE_MAX:
+        raise ValueError(f'limit must be between 1 and {SCHEMA_PAGE_MAX}')
+    
+    filters = {
+        'name': args.get('name', '').strip(),
+        'created_after': args.get('created_after'),
+        'created_before': args.get('created_before'),
+        'cursor': args.get('cursor'),
+        'limit': limit
+    }
+    for key in ('created_after', 'created_before'):
+        if filters[key]:
+            datetime.fromisoformat(filters[key])
+    if filters['cursor']:
+        filters['cursor'] = int(filters['cursor'])
+    return filters
+
+def query_schema_page(filters):
+    """One page of saved schemas, newest first, and the cursor for the next page"""
+    query = DataSchema.query
+    if filters['name']:
+        # Match the name literally: % and _ would otherwise act as LIKE wildcards
+        name = filters['name'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(DataSchema.name.ilike(f"%{name}%", escape='\\'))
+    if filters['created_after']:
+        query = query.filter(DataSchema.created_at >= datetime.fromisoformat(filters['created_after']))
+    if filters['created_before']:
+        query = query.filter(DataSchema.created_at < datetime.fromisoformat(filters['created_before']))
+    if filters['cursor']:
+        # Keyset pagination: continue below the last id of the previous page
+        query = query.filter(DataSchema.id < filters['cursor'])
+    
+    records = query.order_by(DataSchema.id.desc()).limit(filters['limit'] + 1).all()
+    next_cursor = records[filters['limit'] - 1].id if len(records) > filters['limit'] else None
+    return [record.to_dict() for record in records[:filters['limit']]], next_cursor
+
 @app.route('/api/schemas', methods=['GET'])
 def get_schemas():
-    """Get all saved schemas"""
+    """Get saved schemas, newest first, one page at a time"""
     try:
-        schemas = DataSchema.query.all()
-        result = []
-        
-        for schema in schemas:
-            result.append({
-                'id': schema.id,
-                'name': schema.name,
-                'schema_data': json.loads(schema.schema_data),
-                'created_at': schema.created_at.isoformat(),
-                'user_request': schema.user_request
-            })
+        filters = parse_schema_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        latest_id = db.session.query(func.max(DataSchema.id)).scalar() or 0
+        key = json.dumps([filters, latest_id], sort_keys=True)
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+        
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            with schema_list_lock:
+                cached = schema_list_cache.get(key)
+                if cached is not None:
+                    schema_list_cache.move_to_end(key)
+            metrics.record_cache('schema_list', cached is not None)
+            
+            if cached is None:
+                page, next_cursor = query_schema_page(filters)
+                cached = (json.dumps(page), next_cursor)
+                with schema_list_lock:
+                    schema_list_cache[key] = cached
+                    while len(schema_list_cache) > SCHEMA_LIST_CACHE_SIZE:
+                        schema_list_cache.popitem(last=False)
+            
+            body, next_cursor = cached
+            response = Response(body, mimetype='application/json')
+            if next_cursor is not None:
+                next_args = {k: v for k, v in request.args.items() if k != 'cursor'}
+                next_args['cursor'] = next_cursor
+                response.headers['X-Next-Cursor'] = str(next_cursor)
+                response.headers['Link'] = f'<{request.path}?{urlencode(next_args)}>; rel="next"'
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/schemas/<int:schema_id>', methods=['GET'])
+def get_schema(schema_id):
+    """Get one saved schema"""
+    schema = db.session.get(DataSchema, schema_id)
+    if schema is None:
+        return jsonify({'error': 'Schema not found'}), 404
+    return jsonify(schema.to_dict())
+
+@app.route('/api/similar-schemas', methods=['POST'])
+def similar_schemas():
+    """Find the known-good and saved schemas closest to a request, without calling the LLM"""
+    try:
+        data = request.get_json()
+        user_request = data.get('request', '')
+        limit = int(data.get('limit', 3))
         
-        return jsonify(result)
+        if not user_request:
+            return jsonify({'error': 'User request is required'}), 400
+        
+        return jsonify({'matches': schema_index.search(user_request, max(1, min(limit, 20)))})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -301,133 +1218,232 @@ def get_schemas():
 @app.route('/api/field-types', methods=['GET'])
 def get_field_types():
     """Get available field types"""
-    field_types = []
-    for field_type, generator in data_generator.field_generators.items():
-        field_types.append({
-            'type': field_type,
-            'description': f'Generate {field_type.replace("_", " ")} data',
-            'example': str(generator())
-        })
-    
-    return jsonify(field_types)
+    response = jsonify(get_field_type_catalog())
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
 
-def generate_python_code(schema, sample_data):
-    """Generate Python code for data generation"""
-    code = '''import psycopg2
-from faker import Faker
-import uuid
-import json
-import random
-from datetime import datetime
+# Faker calls for pooled types whose method name differs from the field type
+SCRIPT_FAKER_CALLS = {
+    'phone': 'fake.phone_number()',
+    'job_title': 'fake.job()',
+    'credit_card': 'fake.credit_card_number()',
+    'zip_code': 'fake.zipcode()',
+    'text': 'fake.text(max_nb_chars=200)',
+    'color': 'fake.color_name()',
+    'currency': 'fake.currency_code()',
+    'language': 'fake.language_name()',
+    'bic': 'fake.swift()',
+}
+
+# Column expressions for types the script generates directly with NumPy
+SCRIPT_NATIVE_COLUMNS = {
+    'number': 'rng.integers(1, 1001, n)',
+    'decimal': 'np.round(rng.uniform(1.0, 1000.0, n), 2)',
+    'boolean': 'rng.random(n) < 0.5',
+    'uuid': 'uuids(rng, n)',
+    'date': '(rng.integers(0, NOW // 86400 + 1, n)).astype("datetime64[D]").astype(str)',
+    'datetime': 'rng.integers(0, NOW + 1, n).astype("datetime64[s]")',
+    'ip_address': 'ip_addresses(rng, n)',
+    'mac_address': 'mac_addresses(rng, n)',
+}
+
+PYTHON_SCRIPT_TEMPLATE = '''"""
+Synthetic data loader
+Generates data in column batches and loads it into PostgreSQL with COPY
+
+Usage:
+    python data_generator.py --rows 10000000 --workers 8 --seed 42
+
+Each batch is committed on its own, so an interrupted run keeps the batches already loaded.
+Batches are seeded by (seed, batch number), so the same seed reproduces the same data for
+any number of workers.
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import time
 
-# Initialize Faker
-fake = Faker()
+import numpy as np
+import psycopg2
+from faker import Faker
 
-# Database connection details
+# Database connection details (or pass --dsn)
 DB_HOST = 'localhost'
 DB_PORT = '5432'
 DB_NAME = 'your_database'
 DB_USER = 'your_username'
 DB_PASS = 'your_password'
 
-def generate_data(num_records):
-    """Generate synthetic data based on schema"""
-    data = []
-    
-    for _ in range(num_records):
-        record = {}'''
-    
-    # Add field generation logic
-    for field in schema:
-        field_name = field['name']
-        field_type = field['type']
-        
-        if field_type == 'uuid':
-            code += f'\n        record["{field_name}"] = str(uuid.uuid4())'
-        elif field_type == 'first_name':
-            code += f'\n        record["{field_name}"] = fake.first_name()'
-        elif field_type == 'last_name':
-            code += f'\n        record["{field_name}"] = fake.last_name()'
-        elif field_type == 'email':
-            code += f'\n        record["{field_name}"] = fake.email()'
-        elif field_type == 'datetime':
-            code += f'\n        record["{field_name}"] = fake.date_time()'
-        elif field_type == 'number':
-            code += f'\n        record["{field_name}"] = random.randint(1, 1000)'
-        elif field_type == 'decimal':
-            code += f'\n        record["{field_name}"] = round(random.uniform(1.0, 1000.0), 2)'
-        elif field_type == 'boolean':
-            code += f'\n        record["{field_name}"] = random.choice([True, False])'
-        else:
-            code += f'\n        record["{field_name}"] = fake.{field_type}()'
-    
-    code += '''
-        
-        data.append(record)
-    
-    return data
+# Quoted name of the table the script creates and loads
+TABLE = %%TABLE%%
+BATCH_SIZE = 50000
+POOL_SIZE = 10000
+# Dates and datetimes fall between the epoch and the time this script was exported
+NOW = %%NOW%%
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS """ + TABLE + """ (
+    %%TABLE_COLUMNS%%
+)
+"""
+
+COPY_SQL = 'COPY ' + TABLE + ' (%%COPY_COLUMNS%%) FROM STDIN WITH (FORMAT csv)'
+
+# Faker values are generated once per process and sampled with NumPy
+FAKER_POOLS = {%%FAKER_POOLS%%
+}
+
+# Per-process state set up by init_worker
+POOLS = {}
+CONN = None
+
+
+def build_pools(seed):
+    """Pre-generate the Faker value pools"""
+    fake = Faker()
+    pools = {}
+    for field_type, provider in FAKER_POOLS.items():
+        fake.seed_instance(seed)
+        pool = np.empty(POOL_SIZE, dtype=object)
+        pool[:] = [provider(fake) for _ in range(POOL_SIZE)]
+        pools[field_type] = pool
+    return pools
+
+
+def sample(rng, field_type, n):
+    return POOLS[field_type][rng.integers(0, POOL_SIZE, n)]
+
+
+def uuids(rng, n):
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    h = raw.tobytes().hex()
+    return [f"{h[i:i + 8]}-{h[i + 8:i + 12]}-{h[i + 12:i + 16]}-{h[i + 16:i + 20]}-{h[i + 20:i + 32]}"
+            for i in range(0, 32 * n, 32)]
+
+
+def ip_addresses(rng, n):
+    return ['%d.%d.%d.%d' % tuple(row) for row in rng.integers(0, 256, size=(n, 4)).tolist()]
+
+
+def mac_addresses(rng, n):
+    h = rng.integers(0, 256, size=(n, 6), dtype=np.uint8).tobytes().hex(':')
+    return [h[i:i + 17] for i in range(0, 18 * n, 18)]
+
+
+def generate_batch(rng, n):
+    """Generate one batch of n rows as a list of columns"""
+    return [%%BATCH_COLUMNS%%
+    ]
+
+
+def connect(dsn=None):
+    if dsn:
+        return psycopg2.connect(dsn)
+    return psycopg2.connect(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASS)
+
+
+def init_worker(seed, dsn):
+    global POOLS, CONN
+    POOLS = build_pools(seed)
+    CONN = connect(dsn)
+
+
+def load_batch(task):
+    """Generate one batch and COPY it into the table"""
+    seed, index, n = task
+    rng = np.random.default_rng([seed, index])
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\\n').writerows(zip(*generate_batch(rng, n)))
+    buffer.seek(0)
+    with CONN, CONN.cursor() as cursor:
+        cursor.copy_expert(COPY_SQL, buffer)
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic data and load it into PostgreSQL')
+    parser.add_argument('--rows', type=int, default=1000, help='number of rows to load')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows per COPY batch')
+    parser.add_argument('--workers', type=int, default=1, help='generator processes')
+    parser.add_argument('--seed', type=int, default=None, help='seed for reproducible data')
+    parser.add_argument('--dsn', default=None, help='PostgreSQL connection string')
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else int(np.random.SeedSequence().entropy % 2 ** 32)
+    print(f"Loading {args.rows:,} rows into {TABLE} with {args.workers} worker(s), seed {seed}")
+
+    conn = connect(args.dsn)
+    with conn, conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+    conn.close()
+
+    tasks = [(seed, index, min(args.batch_size, args.rows - start))
+             for index, start in enumerate(range(0, args.rows, args.batch_size))]
+
+    started = time.time()
+    loaded = 0
+    pool = None
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(seed, args.dsn))
+        results = pool.imap_unordered(load_batch, tasks)
+    else:
+        init_worker(seed, args.dsn)
+        results = map(load_batch, tasks)
 
-def insert_to_database(data):
-    """Insert generated data to database"""
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASS
-        )
-        cursor = conn.cursor()
-        
-        # Create table if not exists
-        create_table_sql = """
-        CREATE TABLE IF NOT EXISTS synthetic_data (
-            id SERIAL PRIMARY KEY,'''
+        for n in results:
+            loaded += n
+            elapsed = time.time() - started
+            print(f"\\r{loaded:,}/{args.rows:,} rows ({loaded / args.rows:.0%}), "
+                  f"{loaded / elapsed:,.0f} rows/sec", end='', flush=True)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.time() - started
+    print(f"\\nLoaded {loaded:,} rows in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+def generate_python_code(schema, table='synthetic_data'):
+    """Generate a standalone Python script that bulk loads the schema's data into PostgreSQL table"""
+    faker_pools = []
+    batch_columns = []
     
     for field in schema:
         field_name = field['name']
-        if field['type'] in ['number', 'decimal']:
-            code += f'\n            {field_name} NUMERIC,'
-        elif field['type'] == 'boolean':
-            code += f'\n            {field_name} BOOLEAN,'
-        elif field['type'] == 'datetime':
-            code += f'\n            {field_name} TIMESTAMP,'
-        else:
-            code += f'\n            {field_name} TEXT,'
-    
-    code += '''
-        );
-        """
-        cursor.execute(create_table_sql)
-        
-        # Insert data
-        for record in data:
-            placeholders = ', '.join(['%s'] * len(record))
-            columns = ', '.join(record.keys())
-            insert_sql = f"INSERT INTO synthetic_data ({columns}) VALUES ({placeholders})"
-            cursor.execute(insert_sql, list(record.values()))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        print(f"Successfully inserted {len(data)} records")
+        field_type = field['type']
         
-    except Exception as e:
-        print(f"Database error: {e}")
-
-if __name__ == "__main__":
-    # Generate data
-    num_records = 1000
-    data = generate_data(num_records)
-    
-    # Insert to database
-    insert_to_database(data)
-    
-    print("Data generation completed!")
-'''
+        if field_type in SCRIPT_NATIVE_COLUMNS:
+            expression = SCRIPT_NATIVE_COLUMNS[field_type]
+        else:
+            if field_type in SCRIPT_FAKER_CALLS:
+                call = SCRIPT_FAKER_CALLS[field_type]
+            elif field_type in FAKER_PROVIDERS:
+                call = f'fake.{field_type}()'
+            else:
+                call = f"{'custom_' + field_type + '_'!r} + str(fake.random_int(1, 100))"
+            pool_entry = f'\n    {field_type!r}: lambda fake: {call},'
+            if pool_entry not in faker_pools:
+                faker_pools.append(pool_entry)
+            expression = f'sample(rng, {field_type!r}, n)'
+        batch_columns.append(f'\n        {expression},  # {field_name}')
     
-    return code
+    return (PYTHON_SCRIPT_TEMPLATE
+            .replace('%%TABLE%%', repr(quote_identifier(table)))
+            .replace('%%TABLE_COLUMNS%%', ',\n    '.join(f'"{name}" {definition}' for name, definition in table_columns(schema)))
+            .replace('%%COPY_COLUMNS%%', ', '.join(f'"{field["name"]}"' for field in schema))
+            .replace('%%FAKER_POOLS%%', ''.join(faker_pools))
+            .replace('%%BATCH_COLUMNS%%', ''.join(batch_columns))
+            .replace('%%NOW%%', str(int((datetime.now() - datetime(1970, 1, 1)).total_seconds()))))
 
 if __name__ == '__main__':
+    init_db()
     app.run(host='0.0.0.0', port=8080, debug=True)
@@ -0,0 +1,4 @@
+"""
+Performance Benchmarks
+Run with "python -m benchmarks" from the repository root
+"""
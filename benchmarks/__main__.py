@@ -0,0 +1,79 @@
+"""
+Benchmark Runner
+Runs the benchmark suite, appends the results to the history and exits non-zero on a regression
+"""
+
+import argparse
+import sys
+
+from benchmarks import harness
+
+
+def format_rate(result):
+    if result['rows_per_second'] is None:
+        return ' ' * 21
+    return f"{result['rows_per_second']:>14,} rows/s"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Run the synthetic data generator benchmarks')
+    parser.add_argument('-k', '--filter', action='append', metavar='GLOB',
+                        help='only run benchmarks whose name matches (repeatable), e.g. "field.*"')
+    parser.add_argument('--repeat', type=int, default=5, help='timed samples per benchmark')
+    parser.add_argument('--min-time', type=float, default=0.05, help='minimum seconds per sample')
+    parser.add_argument('--history', default=harness.BENCHMARK_HISTORY, help='JSON-lines history file')
+    parser.add_argument('--thresholds', default=harness.BENCHMARK_THRESHOLDS, help='regression thresholds file')
+    parser.add_argument('--no-save', action='store_true', help='do not append this run to the history')
+    parser.add_argument('--no-fail', action='store_true', help='exit 0 even when a regression is found')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    # Importing the suites registers the benchmarks (and imports the app)
+    from benchmarks import suites  # noqa: F401
+
+    selected = harness.select(args.filter)
+    if args.list:
+        for bench in selected:
+            print(f'{bench.group:<14} {bench.name}')
+        return 0
+    if not selected:
+        print('No benchmarks match the filter')
+        return 1
+
+    history = harness.load_history(args.history)
+    thresholds = harness.load_thresholds(args.thresholds)
+    metadata = harness.run_metadata()
+    print(f"Run {metadata['run_id']} on {metadata['machine']} at commit {metadata['commit'] or 'unknown'}")
+
+    results = []
+    for bench in selected:
+        result = harness.measure(bench, args.repeat, args.min_time)
+        if result is None:
+            print(f'{bench.name:<36} skipped')
+            continue
+        result.update(metadata)
+        results.append(result)
+
+        comparison = harness.compare([result], history, thresholds)[0]
+        change = ''
+        if comparison['time_ratio'] is not None:
+            change = f"{(comparison['time_ratio'] - 1) * 100:+6.1f}%"
+        flag = '  REGRESSION (' + ', '.join(comparison['regression']) + ')' if comparison['regression'] else ''
+        print(f"{bench.name:<36} {result['seconds'] * 1000:>10.3f} ms {format_rate(result)} "
+              f"{result['peak_bytes'] / 1024:>10,.0f} KiB {change}{flag}")
+
+    comparisons = harness.compare(results, history, thresholds)
+    regressions = [entry for entry in comparisons if entry['regression']]
+
+    if not args.no_save:
+        harness.append_history(results, args.history)
+        print(f'Appended {len(results)} results to {args.history}')
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(entry['name'] for entry in regressions)}")
+        return 0 if args.no_fail else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
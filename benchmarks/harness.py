@@ -0,0 +1,191 @@
+"""
+Benchmark Harness
+Times registered benchmarks, records peak allocations, and compares results against a JSON-lines history
+"""
+
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_HISTORY = os.getenv('BENCHMARK_HISTORY', os.path.join(BENCHMARK_DIR, 'history.jsonl'))
+BENCHMARK_THRESHOLDS = os.path.join(BENCHMARK_DIR, 'thresholds.json')
+
+# Number of earlier runs on the same machine whose median is the baseline
+BASELINE_RUNS = int(os.getenv('BENCHMARK_BASELINE_RUNS', '5'))
+
+
+@dataclass
+class Benchmark:
+    """
+    A named measurement
+
+    make() does any setup and returns the zero-argument callable that is timed, or None when
+    the benchmark cannot run here (for example, an optional dependency is missing). rows is the
+    number of rows one call produces, used for rows/sec; 0 means the benchmark has no row count.
+    """
+    name: str
+    group: str
+    make: Callable[[], Optional[Callable[[], Any]]]
+    rows: int = 0
+
+
+REGISTRY: List[Benchmark] = []
+
+
+def register(name: str, group: str, rows: int = 0):
+    """Decorator registering a benchmark factory"""
+    def decorator(make: Callable[[], Optional[Callable[[], Any]]]):
+        REGISTRY.append(Benchmark(name, group, make, rows))
+        return make
+    return decorator
+
+
+def select(patterns: Optional[List[str]] = None) -> List[Benchmark]:
+    """Registered benchmarks whose name matches any of the glob patterns"""
+    if not patterns:
+        return list(REGISTRY)
+    return [bench for bench in REGISTRY if any(fnmatch.fnmatch(bench.name, pattern) for pattern in patterns)]
+
+
+def measure(bench: Benchmark, repeat: int = 5, min_time: float = 0.05) -> Optional[Dict[str, Any]]:
+    """
+    Time a benchmark and record the peak memory allocated by one call
+
+    Each of repeat samples runs the callable enough times to last at least min_time seconds;
+    the reported time is the fastest sample per call, which is the least affected by other load.
+    Allocation is measured in a separate call under tracemalloc so it does not skew the timings.
+    """
+    func = bench.make()
+    if func is None:
+        return None
+
+    started = time.perf_counter()
+    func()
+    first = time.perf_counter() - started
+    number = max(1, int(min_time / first)) if first > 0 else 1000
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    seconds = min(samples)
+    return {
+        'name': bench.name,
+        'group': bench.group,
+        'rows': bench.rows,
+        'seconds': seconds,
+        'median_seconds': statistics.median(samples),
+        'rows_per_second': round(bench.rows / seconds) if bench.rows and seconds > 0 else None,
+        'peak_bytes': peak_bytes,
+        'calls': number * repeat
+    }
+
+
+def machine_fingerprint() -> str:
+    """Identifies results that are comparable: same interpreter and hardware class"""
+    return f"{platform.python_implementation()}-{platform.python_version()}-{platform.machine()}-{os.cpu_count()}cpu"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_metadata() -> Dict[str, Any]:
+    return {
+        'run_id': uuid.uuid4().hex[:12],
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'machine': machine_fingerprint()
+    }
+
+
+def load_history(path: str = BENCHMARK_HISTORY) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def append_history(results: List[Dict[str, Any]], path: str = BENCHMARK_HISTORY):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps(result) + '\n')
+
+
+def load_thresholds(path: str = BENCHMARK_THRESHOLDS) -> Dict[str, Any]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def tolerance(name: str, thresholds: Dict[str, Any]) -> Dict[str, float]:
+    """Allowed relative slowdown ("time") and allocation growth ("memory") for a benchmark"""
+    allowed = dict(thresholds['default'])
+    for pattern, override in thresholds.get('overrides', {}).items():
+        if fnmatch.fnmatch(name, pattern):
+            allowed.update(override)
+    return allowed
+
+
+def compare(results: List[Dict[str, Any]], history: List[Dict[str, Any]],
+            thresholds: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Compare results with the median of the last BASELINE_RUNS runs on the same machine
+
+    Returns:
+        One entry per result with its baseline (None without history), the time and memory
+        ratios against it, and whether either exceeds the benchmark's tolerance
+    """
+    comparisons = []
+    for result in results:
+        earlier = [record for record in history
+                   if record['name'] == result['name'] and record.get('machine') == result['machine']]
+        earlier = earlier[-BASELINE_RUNS:]
+        entry = {'name': result['name'], 'baseline_seconds': None, 'time_ratio': None,
+                 'memory_ratio': None, 'regression': []}
+        if earlier:
+            allowed = tolerance(result['name'], thresholds)
+            baseline_seconds = statistics.median(record['seconds'] for record in earlier)
+            baseline_bytes = statistics.median(record['peak_bytes'] for record in earlier)
+            entry['baseline_seconds'] = baseline_seconds
+            entry['time_ratio'] = result['seconds'] / baseline_seconds if baseline_seconds else None
+            # Tiny allocations are dominated by noise; growth below the floor is not a regression
+            floor = allowed.get('memory_floor_bytes', 0)
+            if baseline_bytes and result['peak_bytes'] > floor:
+                entry['memory_ratio'] = result['peak_bytes'] / baseline_bytes
+            if entry['time_ratio'] and entry['time_ratio'] > 1 + allowed['time']:
+                entry['regression'].append('time')
+            if entry['memory_ratio'] and entry['memory_ratio'] > 1 + allowed['memory']:
+                entry['regression'].append('memory')
+        comparisons.append(entry)
+    return comparisons
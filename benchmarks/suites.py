@@ -0,0 +1,243 @@
+"""
+Benchmark Definitions
+Field type generators, dataset generation, export paths, Ollama response parsing and HTTP endpoints
+"""
+
+import io
+import json
+import os
+
+# Benchmarks run against a throwaway in-memory database and a memory-only LLM cache
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('LLM_CACHE_PATH', '')
+
+import app
+from benchmarks.harness import REGISTRY, Benchmark, register
+from columnar_engine import columns_to_rows
+from json_stream import JSONArrayParser
+from llm_cache import LLMCache
+from ollama_service import OllamaService
+from serializers import iter_csv, iter_ndjson
+
+FIELD_TYPE_ROWS = 100000
+SCHEMA_WIDTHS = (5, 20, 50)
+ROW_COUNTS = (1000, 100000)
+EXPORT_WIDTH = 20
+EXPORT_ROWS = 20000
+
+# Size of the simulated LLM responses and the length of the text fragments they stream in
+LLM_RESPONSE_RECORDS = 2000
+LLM_FRAGMENT_CHARS = 16
+
+
+def schema_of_width(width: int):
+    """Schema cycling through every field type"""
+    return [{'name': f'{field_type}_{i}', 'type': field_type}
+            for i, field_type in ((i, app.FIELD_TYPES[i % len(app.FIELD_TYPES)]) for i in range(width))]
+
+
+def export_columns():
+    return app.data_generator.generate_columns(schema_of_width(EXPORT_WIDTH), EXPORT_ROWS, seed=1)
+
+
+def fragments(text: str, size: int = LLM_FRAGMENT_CHARS):
+    """Split a response into token-sized pieces, as they arrive from a streaming request"""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def llm_records(count: int):
+    schema = schema_of_width(10)
+    columns = app.data_generator.generate_columns(schema, count, seed=2)
+    return schema, json.loads(json.dumps(columns_to_rows(columns), default=str))
+
+
+# Field type generators: one column of FIELD_TYPE_ROWS values per type
+
+def _field_type_benchmark(field_type: str):
+    def make():
+        engine = app.data_generator.engine
+        # Value pools are built (or mapped) once, outside the timing
+        engine.generate_column(field_type, 1)
+        return lambda: engine.generate_column(field_type, FIELD_TYPE_ROWS)
+    return make
+
+
+for _field_type in app.FIELD_TYPES:
+    REGISTRY.append(Benchmark(f'field.{_field_type}', 'field_types', _field_type_benchmark(_field_type), FIELD_TYPE_ROWS))
+
+
+# Dataset generation across schema widths and row counts
+
+def _generation_benchmark(width: int, rows: int, seeded: bool):
+    def make():
+        schema = schema_of_width(width)
+        seed = 1 if seeded else None
+        app.data_generator.generate_columns(schema, 1, seed)
+        return lambda: app.data_generator.generate_columns(schema, rows, seed)
+    return make
+
+
+for _width in SCHEMA_WIDTHS:
+    for _rows in ROW_COUNTS:
+        REGISTRY.append(Benchmark(f'generate.w{_width}.r{_rows}', 'generate_data',
+                                  _generation_benchmark(_width, _rows, False), _rows))
+        REGISTRY.append(Benchmark(f'generate.seeded.w{_width}.r{_rows}', 'generate_data',
+                                  _generation_benchmark(_width, _rows, True), _rows))
+
+
+# Export paths for an EXPORT_WIDTH x EXPORT_ROWS dataset
+
+@register('export.csv_pandas', 'export', EXPORT_ROWS)
+def csv_pandas():
+    import pandas as pd
+    columns = export_columns()
+
+    def run():
+        buffer = io.StringIO()
+        pd.DataFrame(columns).to_csv(buffer, index=False)
+        return buffer.getvalue()
+    return run
+
+
+@register('export.csv_stream', 'export', EXPORT_ROWS)
+def csv_stream():
+    columns = export_columns()
+    return lambda: ''.join(iter_csv([columns]))
+
+
+@register('export.ndjson_stream', 'export', EXPORT_ROWS)
+def ndjson_stream():
+    columns = export_columns()
+    return lambda: ''.join(iter_ndjson([columns]))
+
+
+@register('export.json', 'export', EXPORT_ROWS)
+def json_export():
+    columns = export_columns()
+    # Same encoder as the jsonify() response of /api/generate-data
+    return lambda: app.app.json.dumps({'data': columns_to_rows(columns), 'format': 'json'})
+
+
+@register('export.parquet', 'export', EXPORT_ROWS)
+def parquet_export():
+    try:
+        from columnar_export import write_columnar
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    schema = schema_of_width(EXPORT_WIDTH)
+    columns = export_columns()
+    types = {field['name']: field['type'] for field in schema}
+    return lambda: write_columnar([columns], types, io.BytesIO(), 'parquet')
+
+
+@register('export.python_codegen', 'export')
+def python_codegen():
+    schema = schema_of_width(EXPORT_WIDTH)
+    return lambda: app.generate_python_code(schema)
+
+
+# Ollama response parsing, with the HTTP stream replaced by an in-memory response
+
+def _offline_service(response_text: str) -> OllamaService:
+    pieces = fragments(response_text)
+
+    def stream_generate(payload, timeout=60):
+        yield from pieces
+
+    service = OllamaService(cache=LLMCache(path='', memory_entries=0))
+    service.is_available = lambda: True
+    service._stream_generate = stream_generate
+    return service
+
+
+@register('ollama.json_array_parser', 'ollama', LLM_RESPONSE_RECORDS)
+def json_array_parser():
+    _, records = llm_records(LLM_RESPONSE_RECORDS)
+    pieces = fragments('Here are the records:\n' + json.dumps(records, indent=2))
+
+    def run():
+        parser = JSONArrayParser()
+        items = []
+        for piece in pieces:
+            items.extend(parser.feed(piece))
+        return items
+    return run
+
+
+@register('ollama.stream_samples', 'ollama', LLM_RESPONSE_RECORDS)
+def stream_samples():
+    schema, records = llm_records(LLM_RESPONSE_RECORDS)
+    service = _offline_service(json.dumps(records, indent=2))
+    return lambda: service.generate_data_samples(schema, LLM_RESPONSE_RECORDS)
+
+
+@register('ollama.stream_schema', 'ollama', 200)
+def stream_schema():
+    fields = [{'name': f'field_{i}', 'type': app.FIELD_TYPES[i % len(app.FIELD_TYPES)],
+               'description': f'Field number {i} of the generated schema'} for i in range(200)]
+    service = _offline_service('Sure! Here is the schema:\n```json\n' + json.dumps(fields, indent=2) + '\n```')
+    return lambda: service._request_schema('customer orders with payments and shipping')
+
+
+@register('ollama.parse_validation', 'ollama')
+def parse_validation():
+    validation = {
+        'is_valid': True,
+        'score': 87,
+        'issues': [f'Issue {i}: field_{i} may be ambiguous' for i in range(2000)],
+        'suggestions': [f'Suggestion {i}: add constraints to field_{i}' for i in range(2000)]
+    }
+    text = 'Here is my assessment of the schema:\n' + json.dumps(validation, indent=2) + '\nLet me know if you need more.'
+    service = OllamaService(cache=LLMCache(path='', memory_entries=0))
+    return lambda: service._parse_validation_response(text)
+
+
+# HTTP endpoints through the Flask test client
+
+def _client():
+    app.init_db()
+    return app.app.test_client()
+
+
+@register('endpoint.field_types', 'endpoint')
+def field_types_endpoint():
+    client = _client()
+    return lambda: client.get('/api/field-types').get_data()
+
+
+@register('endpoint.generate_data_json', 'endpoint', 1000)
+def generate_data_json():
+    client = _client()
+    body = {'schema': schema_of_width(10), 'num_rows': 1000, 'format': 'json'}
+    return lambda: client.post('/api/generate-data', json=body).get_data()
+
+
+@register('endpoint.generate_data_csv', 'endpoint', 10000)
+def generate_data_csv():
+    client = _client()
+    body = {'schema': schema_of_width(10), 'num_rows': 10000, 'format': 'csv'}
+    return lambda: client.post('/api/generate-data', json=body).get_data()
+
+
+@register('endpoint.stream_ndjson', 'endpoint', 50000)
+def stream_ndjson():
+    client = _client()
+    body = {'schema': schema_of_width(10), 'num_rows': 50000, 'format': 'ndjson', 'seed': 3}
+    return lambda: client.post('/api/generate-data', json=body).get_data()
+
+
+@register('endpoint.generate_relational', 'endpoint')
+def generate_relational():
+    client = _client()
+    body = {
+        'seed': 4,
+        'tables': [
+            {'name': 'customers', 'rows': 5000, 'primary_key': 'id',
+             'fields': [{'name': 'name', 'type': 'first_name'}, {'name': 'email', 'type': 'email'}]},
+            {'name': 'orders', 'primary_key': 'id', 'fields': [{'name': 'total', 'type': 'decimal'}],
+             'foreign_keys': [{'field': 'customer_id', 'references': 'customers',
+                               'cardinality': {'distribution': 'poisson', 'mean': 3}}]}
+        ]
+    }
+    return lambda: client.post('/api/generate-relational', json=body).get_data()
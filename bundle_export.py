@@ -0,0 +1,217 @@
+"""
+Bundle Export
+Writes one dataset in several formats (CSV, JSON, SQL, generator script) into a zip, tar.gz or tar.zst archive
+"""
+
+import gzip
+import logging
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from postgres_loader import table_columns
+from relational import quote_identifier
+
+logger = logging.getLogger(__name__)
+
+# Archive format -> (mimetype, file extension)
+BUNDLE_FORMATS = {
+    'zip': ('application/zip', 'zip'),
+    'tar.gz': ('application/gzip', 'tar.gz'),
+    'tar.zst': ('application/zstd', 'tar.zst'),
+}
+
+# Dataset formats that can be put in a bundle, in archive order
+BUNDLE_MEMBERS = ('csv', 'json', 'sql', 'python')
+
+BUNDLE_GZIP_LEVEL = int(os.getenv('BUNDLE_GZIP_LEVEL', '6'))
+BUNDLE_ZSTD_LEVEL = int(os.getenv('BUNDLE_ZSTD_LEVEL', '3'))
+
+# Compression threads for tar.gz and tar.zst; 0 uses one per CPU
+BUNDLE_COMPRESS_THREADS = int(os.getenv('BUNDLE_COMPRESS_THREADS', '0'))
+
+# Uncompressed bytes per independently compressed gzip member of a tar.gz
+BUNDLE_GZIP_BLOCK_BYTES = 1024 * 1024
+
+# Approximate size of the line-aligned chunks read back from a dataset spool
+SPOOL_READ_BYTES = 1024 * 1024
+
+# A member is a file name and a factory for its text chunks
+Member = Tuple[str, Callable[[], Iterable[str]]]
+
+
+def compress_threads() -> int:
+    return BUNDLE_COMPRESS_THREADS or os.cpu_count() or 1
+
+
+def check_archive_format(archive_format: str):
+    """
+    Raises:
+        ValueError: For an unknown format, or tar.zst without the optional zstandard package
+    """
+    if archive_format not in BUNDLE_FORMATS:
+        raise ValueError(f'Unsupported archive format; use one of {", ".join(BUNDLE_FORMATS)}')
+    if archive_format == 'tar.zst':
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise ValueError('tar.zst bundles require the zstandard package')
+
+
+class ParallelGzipWriter:
+    """
+    Writable stream compressed into a multi-member gzip file on a thread pool
+
+    Input is cut into blocks of BUNDLE_GZIP_BLOCK_BYTES that are compressed independently
+    (zlib releases the GIL) and written to the sink in order. Concatenated gzip members are a
+    valid gzip file, which gunzip and tar read as one stream.
+    """
+
+    def __init__(self, sink: BinaryIO, threads: int, level: int = BUNDLE_GZIP_LEVEL):
+        self.sink = sink
+        self.level = level
+        self.threads = threads
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='bundle-gzip')
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        while len(self._buffer) >= BUNDLE_GZIP_BLOCK_BYTES:
+            self._submit(bytes(self._buffer[:BUNDLE_GZIP_BLOCK_BYTES]))
+            del self._buffer[:BUNDLE_GZIP_BLOCK_BYTES]
+        return len(data)
+
+    def _submit(self, block: bytes):
+        # At most two blocks per thread in flight bounds memory to a few megabytes
+        while len(self._pending) >= 2 * self.threads:
+            self.sink.write(self._pending.popleft().result())
+        self._pending.append(self._executor.submit(gzip.compress, block, self.level, mtime=0))
+
+    def close(self):
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self.sink.write(self._pending.popleft().result())
+        finally:
+            self._executor.shutdown(cancel_futures=True)
+
+
+def _tar_stream(archive_format: str, sink: BinaryIO, threads: int):
+    if archive_format == 'tar.gz':
+        return ParallelGzipWriter(sink, threads)
+    import zstandard
+    compressor = zstandard.ZstdCompressor(level=BUNDLE_ZSTD_LEVEL, threads=threads)
+    return compressor.stream_writer(sink, closefd=False)
+
+
+def write_bundle(members: List[Member], archive_format: str, sink: BinaryIO) -> Dict[str, int]:
+    """
+    Write members into an archive
+
+    zip members are deflated straight into the archive as their chunks are produced. A tar
+    header needs the member size up front, so tar members are first spooled uncompressed to an
+    anonymous temporary file, then streamed through the parallel compressor. Only one chunk of
+    each member is held in memory at a time.
+
+    Returns:
+        Uncompressed size in bytes of each member
+    """
+    check_archive_format(archive_format)
+    sizes = {}
+
+    if archive_format == 'zip':
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED, compresslevel=BUNDLE_GZIP_LEVEL) as archive:
+            for name, chunks in members:
+                with archive.open(name, 'w', force_zip64=True) as member:
+                    sizes[name] = _write_chunks(chunks(), member)
+        return sizes
+
+    stream = _tar_stream(archive_format, sink, compress_threads())
+    try:
+        with tarfile.open(fileobj=stream, mode='w|', format=tarfile.PAX_FORMAT) as archive:
+            for name, chunks in members:
+                with tempfile.TemporaryFile() as spool:
+                    sizes[name] = _write_chunks(chunks(), spool)
+                    spool.seek(0)
+                    info = tarfile.TarInfo(name)
+                    info.size = sizes[name]
+                    info.mtime = int(time.time())
+                    info.mode = 0o644
+                    archive.addfile(info, spool)
+    finally:
+        stream.close()
+    return sizes
+
+
+def spool_chunk_sets(chunk_sets: Iterable[Tuple[str, ...]], count: int) -> List[IO[str]]:
+    """
+    Write each position of a stream of chunk tuples to its own anonymous temporary file
+
+    The dataset is generated once as tuples holding the same rows in several formats; every
+    member is then rendered from the spool of the format it needs.
+    """
+    spools = [tempfile.TemporaryFile('w+', encoding='utf-8', newline='') for _ in range(count)]
+    try:
+        for chunks in chunk_sets:
+            for spool, chunk in zip(spools, chunks):
+                spool.write(chunk)
+    except Exception:
+        for spool in spools:
+            spool.close()
+        raise
+    return spools
+
+
+def iter_spool(spool: IO[str]) -> Iterator[str]:
+    """Text of a spool from the start, in chunks that end on line boundaries"""
+    spool.seek(0)
+    while True:
+        lines = spool.readlines(SPOOL_READ_BYTES)
+        if not lines:
+            return
+        yield ''.join(lines)
+
+
+def _write_chunks(chunks: Iterable[str], output: Any) -> int:
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        output.write(data)
+        size += len(data)
+    return size
+
+
+def iter_json_array(ndjson_chunks: Iterable[str]) -> Iterator[str]:
+    """Turn NDJSON chunks into one JSON array, without holding more than a chunk of rows"""
+    separator = '[\n'
+    for chunk in ndjson_chunks:
+        lines = chunk.rstrip('\n')
+        if not lines:
+            continue
+        # Encoded JSON values contain no raw newlines, so every newline separates two rows
+        yield separator + lines.replace('\n', ',\n')
+        separator = ',\n'
+    yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
+def iter_sql_script(table: str, schema: List[Dict], csv_chunks: Iterable[str]) -> Iterator[str]:
+    """
+    psql script creating the table and loading it with COPY ... FROM stdin
+
+    The table has the same columns as the one created by the generated Python script.
+    csv_chunks are the CSV rows without a header line.
+    """
+    columns = [f'    {quote_identifier(name)} {definition}' for name, definition in table_columns(schema)]
+    yield (f'BEGIN;\n\nCREATE TABLE IF NOT EXISTS {quote_identifier(table)} (\n' + ',\n'.join(columns) + '\n);\n\n'
+           f'COPY {quote_identifier(table)} ({", ".join(quote_identifier(field["name"]) for field in schema)}) '
+           'FROM stdin WITH (FORMAT csv);\n')
+    yield from csv_chunks
+    yield '\\.\n\nCOMMIT;\n'
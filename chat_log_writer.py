@@ -0,0 +1,360 @@
+"""
+Chat Log Writer
+Buffers chat_logs and ai_ratings rows in a bounded queue and writes them to PostgreSQL in batches with COPY
+"""
+
+import atexit
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Database holding chat_logs and ai_ratings (database/schema.sql); ingestion is off when unset
+CHAT_LOG_DATABASE_URL = os.getenv('CHAT_LOG_DATABASE_URL', '')
+CHAT_LOG_QUEUE_SIZE = int(os.getenv('CHAT_LOG_QUEUE_SIZE', '10000'))
+
+# A batch is flushed once it holds CHAT_LOG_BATCH_ROWS rows or its oldest row is
+# CHAT_LOG_FLUSH_INTERVAL seconds old, whichever comes first
+CHAT_LOG_BATCH_ROWS = int(os.getenv('CHAT_LOG_BATCH_ROWS', '500'))
+CHAT_LOG_FLUSH_INTERVAL = float(os.getenv('CHAT_LOG_FLUSH_INTERVAL', '1.0'))
+
+# Longest a caller waits for queue space before its row is dropped
+CHAT_LOG_ENQUEUE_TIMEOUT = float(os.getenv('CHAT_LOG_ENQUEUE_TIMEOUT_MS', '50')) / 1000
+
+# Attempts per batch before it is dropped while the database is unavailable
+CHAT_LOG_MAX_ATTEMPTS = int(os.getenv('CHAT_LOG_MAX_ATTEMPTS', '5'))
+
+# chat_logs ids reserved from chat_logs_id_seq per round trip
+CHAT_LOG_ID_BLOCK = int(os.getenv('CHAT_LOG_ID_BLOCK', '1000'))
+
+# Columns written per table, in COPY order
+TABLE_COLUMNS = {
+    'chat_logs': ('id', 'session_id', 'user_prompt', 'ai_message', 'generated_schema', 'generated_data_sample',
+                  'record_count', 'success', 'error_message', 'response_time_ms', 'timestamp', 'user_agent'),
+    'ai_ratings': ('session_id', 'chat_log_id', 'rating', 'feedback_comment', 'timestamp'),
+}
+REQUIRED_COLUMNS = {
+    'chat_logs': ('session_id', 'user_prompt'),
+    'ai_ratings': ('session_id', 'rating'),
+}
+JSON_COLUMNS = {'generated_schema', 'generated_data_sample'}
+INTEGER_COLUMNS = {'id', 'chat_log_id', 'record_count', 'response_time_ms'}
+RATINGS = ('thumbs_up', 'thumbs_down')
+
+Row = Tuple[Any, ...]
+
+
+def _csv_value(value: Any) -> str:
+    """One COPY CSV field; unquoted empty is NULL, so every non-NULL value is quoted"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def render_copy(rows: List[Row]) -> str:
+    return ''.join(','.join(_csv_value(value) for value in row) + '\n' for row in rows)
+
+
+def validate_record(table: str, record: Dict[str, Any]):
+    """
+    Raises:
+        ValueError: For a missing required column or an invalid rating
+    """
+    missing = [column for column in REQUIRED_COLUMNS[table] if record.get(column) in (None, '')]
+    if missing:
+        raise ValueError(f'{", ".join(missing)} required')
+    if table == 'ai_ratings' and record['rating'] not in RATINGS:
+        raise ValueError(f'rating must be one of {", ".join(RATINGS)}')
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """
+    Naive UTC datetime for a timestamp given as a datetime or an ISO 8601 string
+
+    Raises:
+        ValueError: For anything else
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError('timestamp must be an ISO 8601 timestamp')
+    elif not isinstance(value, datetime):
+        raise ValueError('timestamp must be an ISO 8601 timestamp')
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def prepare_row(table: str, record: Dict[str, Any]) -> Row:
+    """
+    Validate a record and order its values as TABLE_COLUMNS
+
+    Values are checked here, in the request, because one value COPY rejects would fail the
+    whole batch it is written with.
+
+    Raises:
+        ValueError: For a missing required column, an invalid rating, or a value of the wrong type
+    """
+    validate_record(table, record)
+    values = dict(record)
+    values['timestamp'] = parse_timestamp(values['timestamp']) if values.get('timestamp') else datetime.utcnow()
+    for column in INTEGER_COLUMNS.intersection(TABLE_COLUMNS[table]):
+        value = values.get(column)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+            raise ValueError(f'{column} must be an integer')
+    if values.get('success') is not None and not isinstance(values['success'], bool):
+        raise ValueError('success must be a boolean')
+    if table == 'chat_logs' and values.get('success') is None:
+        values['success'] = True
+    for column in JSON_COLUMNS:
+        if values.get(column) is not None and not isinstance(values[column], str):
+            values[column] = json.dumps(values[column])
+    return tuple(values.get(column) for column in TABLE_COLUMNS[table])
+
+
+class ChatLogWriter:
+    """
+    Asynchronous batched writer for chat_logs and ai_ratings
+
+    Callers only enqueue; a background thread drains the queue and writes each table's rows
+    with one COPY per batch, in a single transaction. When the queue is full a caller waits at
+    most CHAT_LOG_ENQUEUE_TIMEOUT for space, then the row is dropped and counted. A batch that
+    cannot be written is retried with backoff, then dropped and counted, so a database outage
+    never blocks request threads.
+
+    chat_logs ids are reserved from the table's sequence in blocks, so a caller gets the id of
+    its row immediately (to attach a rating to it) without waiting for the write.
+    """
+
+    def __init__(self, dsn: str, queue_size: int = CHAT_LOG_QUEUE_SIZE, batch_rows: int = CHAT_LOG_BATCH_ROWS,
+                 flush_interval: float = CHAT_LOG_FLUSH_INTERVAL, enqueue_timeout: float = CHAT_LOG_ENQUEUE_TIMEOUT,
+                 max_attempts: int = CHAT_LOG_MAX_ATTEMPTS):
+        self.dsn = dsn
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_attempts = max_attempts
+        self.queue: 'queue.Queue[Tuple[str, Row]]' = queue.Queue(maxsize=queue_size)
+        self.written = {table: 0 for table in TABLE_COLUMNS}
+        self.dropped = {table: 0 for table in TABLE_COLUMNS}
+        self.last_error: Optional[str] = None
+        self.last_flush: Optional[float] = None
+        self._ids = deque()
+        self._ids_lock = threading.Lock()
+        self._id_conn = None
+        self._conn = None
+        # First days of the months whose chat_logs partition is known to exist
+        self._partitions = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def start(self):
+        """Start the flush thread if it is not running in this process"""
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                if self._pid is not None and self._pid != os.getpid():
+                    # Connections and ids inherited from a pre-fork master are not usable here
+                    self._conn = self._id_conn = None
+                    self._ids.clear()
+                self._stop.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='chat-log-writer', daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 10.0):
+        """Stop the flush thread after it has written everything already queued"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+
+    def log_chat(self, record: Dict[str, Any]) -> Optional[int]:
+        """
+        Queue a chat_logs row
+
+        Returns:
+            The row's id, or None when the queue is saturated and the row was dropped
+        """
+        row = prepare_row('chat_logs', record)
+        row_id = row[0]
+        if row_id is None:
+            row_id = self._next_id()
+            row = (row_id,) + row[1:]
+        return row_id if self.submit('chat_logs', row) else None
+
+    def log_rating(self, record: Dict[str, Any]) -> bool:
+        """Queue an ai_ratings row; False when it was dropped"""
+        return self.submit('ai_ratings', prepare_row('ai_ratings', record))
+
+    def submit(self, table: str, row: Row) -> bool:
+        if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+            self.start()
+        try:
+            self.queue.put((table, row), timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._drop(table, 1, 'dropped_full')
+            return False
+        return True
+
+    def _next_id(self) -> int:
+        with self._ids_lock:
+            if not self._ids:
+                if self._id_conn is None or self._id_conn.closed:
+                    self._id_conn = psycopg2.connect(self.dsn)
+                    self._id_conn.autocommit = True
+                try:
+                    with self._id_conn.cursor() as cursor:
+                        cursor.execute("SELECT nextval('chat_logs_id_seq') FROM generate_series(1, %s)",
+                                       (CHAT_LOG_ID_BLOCK,))
+                        self._ids.extend(row[0] for row in cursor.fetchall())
+                except psycopg2.Error:
+                    self._id_conn.close()
+                    raise
+            return self._ids.popleft()
+
+    def _run(self):
+        batch: List[Tuple[str, Row]] = []
+        deadline = None
+        while True:
+            timeout = self.flush_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=min(timeout, 0.5))
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            stopping = self._stop.is_set()
+            if batch and (len(batch) >= self.batch_rows or time.monotonic() >= deadline or stopping):
+                if stopping:
+                    # Drain whatever is still queued into the final batch
+                    while True:
+                        try:
+                            batch.append(self.queue.get_nowait())
+                        except queue.Empty:
+                            break
+                try:
+                    self._flush(batch)
+                except Exception as e:
+                    # Never let one batch stop the writer; its rows are dropped and counted
+                    logger.exception(f"Chat log flush of {len(batch)} rows failed")
+                    self.last_error = str(e)
+                    for table in TABLE_COLUMNS:
+                        self._drop(table, sum(1 for item in batch if item[0] == table), 'dropped_error')
+                batch, deadline = [], None
+            elif stopping and self.queue.empty():
+                break
+
+        if self._conn is not None:
+            self._conn.close()
+
+    def _flush(self, batch: List[Tuple[str, Row]]):
+        rows = {table: [] for table in TABLE_COLUMNS}
+        for table, row in batch:
+            rows[table].append(row)
+
+        started = time.perf_counter()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._write(rows)
+                break
+            except psycopg2.Error as e:
+                self.last_error = str(e)
+                logger.warning(f"Chat log flush of {len(batch)} rows failed (attempt {attempt}): {e}")
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                if attempt == self.max_attempts:
+                    for table, table_rows in rows.items():
+                        self._drop(table, len(table_rows), 'dropped_error')
+                    return
+                # Back off, but never past shutdown
+                self._stop.wait(min(0.5 * 2 ** attempt, 10.0))
+
+        metrics.CHAT_LOG_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        metrics.CHAT_LOG_BATCH_ROWS.observe(len(batch))
+        self.last_flush = time.time()
+        for table, table_rows in rows.items():
+            if table_rows:
+                self.written[table] += len(table_rows)
+                metrics.CHAT_LOG_ROWS.inc(len(table_rows), table=table, outcome='written')
+
+    def _write(self, rows: Dict[str, List[Row]]):
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(self.dsn)
+        with self._conn:
+            with self._conn.cursor() as cursor:
+                timestamp_index = TABLE_COLUMNS['chat_logs'].index('timestamp')
+                months = {_month(row[timestamp_index]) for row in rows['chat_logs']} - self._partitions
+                for month in sorted(months):
+                    cursor.execute('SELECT create_chat_logs_partition(%s)', (month,))
+                for table, table_rows in rows.items():
+                    if table_rows:
+                        columns = ', '.join(TABLE_COLUMNS[table])
+                        cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                                           io.StringIO(render_copy(table_rows)))
+        self._partitions |= months
+
+    def _drop(self, table: str, count: int, reason: str):
+        if not count:
+            return
+        with self._lock:
+            self.dropped[table] += count
+        metrics.CHAT_LOG_ROWS.inc(count, table=table, outcome=reason)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'written': dict(self.written),
+            'dropped': dict(self.dropped),
+            'last_flush': self.last_flush,
+            'last_error': self.last_error
+        }
+
+
+def _month(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+_default_writer: Optional[ChatLogWriter] = None
+_default_lock = threading.Lock()
+
+
+def get_default_writer() -> Optional[ChatLogWriter]:
+    """Shared writer for CHAT_LOG_DATABASE_URL, or None when ingestion is not configured"""
+    global _default_writer
+    if not CHAT_LOG_DATABASE_URL:
+        return None
+    with _default_lock:
+        if _default_writer is None:
+            _default_writer = ChatLogWriter(CHAT_LOG_DATABASE_URL)
+            atexit.register(_default_writer.close)
+    return _default_writer
+
+
+def _queue_depth() -> Dict[Tuple[str, ...], float]:
+    return {} if _default_writer is None else {(): _default_writer.queue.qsize()}
+
+
+metrics.REGISTRY.register(metrics.Gauge('sdg_chat_log_queue_depth', 'Rows waiting in the chat log writer queue',
+                                        (), _queue_depth))
@@ -0,0 +1,553 @@
+"""
+Columnar Data Generation Engine
+Generates synthetic data a whole column at a time instead of cell by cell
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+import metrics
+from value_pools import PoolStore, get_default_store
+
+if TYPE_CHECKING:
+    # Importing Faker loads its providers; it waits until a pool actually has to be built
+    from faker import Faker
+
+logger = logging.getLogger(__name__)
+
+# Number of pre-generated values kept per Faker-backed field type. Pools are seeded, so
+# changing the size changes every seeded dataset.
+DEFAULT_POOL_SIZE = int(os.getenv('VALUE_POOL_SIZE', '16384'))
+
+# Rows generated per batch when iterating over a large dataset
+DEFAULT_BATCH_ROWS = 50000
+
+# Faker-backed string types; values are drawn from precomputed pools
+FAKER_PROVIDERS: Dict[str, Callable[['Faker'], Any]] = {
+    'first_name': lambda fake: fake.first_name(),
+    'last_name': lambda fake: fake.last_name(),
+    'email': lambda fake: fake.email(),
+    'phone': lambda fake: fake.phone_number(),
+    'address': lambda fake: fake.address(),
+    'company': lambda fake: fake.company(),
+    'job_title': lambda fake: fake.job(),
+    'credit_card': lambda fake: fake.credit_card_number(),
+    'country': lambda fake: fake.country(),
+    'city': lambda fake: fake.city(),
+    'state': lambda fake: fake.state(),
+    'zip_code': lambda fake: fake.zipcode(),
+    'url': lambda fake: fake.url(),
+    'text': lambda fake: fake.text(max_nb_chars=200),
+    'sentence': lambda fake: fake.sentence(),
+    'word': lambda fake: fake.word(),
+    'color': lambda fake: fake.color_name(),
+    'currency': lambda fake: fake.currency_code(),
+    'language': lambda fake: fake.language_name(),
+    'user_agent': lambda fake: fake.user_agent(),
+    'password': lambda fake: fake.password(),
+    'ssn': lambda fake: fake.ssn(),
+    'vin': lambda fake: fake.vin(),
+    'license_plate': lambda fake: fake.license_plate(),
+    'iban': lambda fake: fake.iban(),
+    'bic': lambda fake: fake.swift(),
+}
+
+# Number of distinct values used by the custom type fallback
+CUSTOM_TYPE_VALUES = 100
+
+# Compiled schema plans kept in the LRU cache
+SCHEMA_PLAN_CACHE_SIZE = int(os.getenv('SCHEMA_PLAN_CACHE_SIZE', '256'))
+
+# Seeded datasets are generated in fixed blocks of rows, each with its own counter-based
+# random stream. Changing either constant changes every seeded dataset.
+SEEDED_BLOCK_ROWS = 4096
+SEEDED_REFERENCE_TIME = datetime(2025, 1, 1)
+
+_EPOCH_DAY = np.datetime64('1970-01-01', 'D')
+
+# Rounds of the keyed Feistel network that permutes the value space of a unique column
+FEISTEL_ROUNDS = 4
+
+# Stream id mixed into unique column keys, keeping them apart from the value streams
+_UNIQUE_STREAM = 0x756E69
+
+# Types whose values are already unique without a permutation (random 122-bit uuids)
+UNIQUE_BY_CONSTRUCTION = {'uuid'}
+
+
+def stable_seed(value: str) -> int:
+    """Seed derived from a string that is identical across processes and restarts"""
+    return zlib.crc32(value.encode('utf-8'))
+
+
+class ColumnarEngine:
+    """Generate columns of synthetic values in bulk using NumPy"""
+
+    def __init__(self, fake: Optional['Faker'] = None, rng: Optional[np.random.Generator] = None,
+                 pool_size: int = DEFAULT_POOL_SIZE, pools: Optional[Dict[str, Any]] = None,
+                 reference_time: Optional[datetime] = None, locale: str = 'en_US',
+                 pool_store: Optional[PoolStore] = None):
+        self.locale = locale
+        # Loading Faker's locale providers is slow; it waits until a pool has to be built
+        self._fake = fake
+        self.rng = rng or np.random.default_rng()
+        self.pool_size = pool_size
+        # Upper bound for date/datetime values; None means the current time
+        self.reference_time = reference_time
+        # Faker pools live in memory-mapped files shared by all workers when a store is available
+        self.pool_store = pool_store if pool_store is not None else get_default_store()
+        # Value pools may be shared between engines that only differ in their random state
+        self._pools: Dict[str, Any] = {} if pools is None else pools
+        self._pool_lock = threading.Lock()
+
+    @property
+    def fake(self) -> 'Faker':
+        if self._fake is None:
+            from faker import Faker
+            self._fake = Faker(self.locale)
+        return self._fake
+
+    @property
+    def field_types(self) -> List[str]:
+        """All field types the engine can generate natively"""
+        return list(NATIVE_GENERATORS) + list(FAKER_PROVIDERS)
+
+    def generate_column(self, field_type: str, num_rows: int, rng: Optional[np.random.Generator] = None):
+        """
+        Generate a single column of values
+
+        Args:
+            field_type: Field type name
+            num_rows: Number of values
+            rng: Random generator to draw from (defaults to the engine's own)
+
+        Returns:
+            NumPy array (or list of strings) with num_rows values
+        """
+        return resolve_generator(field_type)(self, rng or self.rng, num_rows)
+
+    def generate_columns(self, schema: Union[List[Dict], 'CompiledSchema'], num_rows: int,
+                         rng: Optional[np.random.Generator] = None) -> Dict[str, Any]:
+        """
+        Generate every column of a schema
+
+        Args:
+            schema: Field definitions with 'name' and 'type', or a compiled plan
+            num_rows: Number of values per column
+            rng: Random generator to draw from (defaults to the engine's own)
+
+        Returns:
+            Mapping of field name to column values, in schema order
+        """
+        plan = compile_schema(schema)
+        rng = rng or self.rng
+        unique_seed = int(rng.integers(0, 2 ** 63)) if any(plan.unique) else None
+        return self._generate(plan, num_rows, rng, unique_seed)
+
+    def _generate(self, plan: 'CompiledSchema', num_rows: int, rng: np.random.Generator,
+                  unique_seed: Optional[int], offset: int = 0) -> Dict[str, Any]:
+        # Unique columns are positions [offset, offset + num_rows) of a permutation keyed by unique_seed
+        if unique_seed is not None:
+            self.check_unique(plan, offset + num_rows)
+        columns = {}
+        for name, field_type, generator, field_seed, unique in zip(
+                plan.names, plan.types, plan.generators, plan.field_seeds, plan.unique):
+            started = time.perf_counter()
+            if unique and unique_seed is not None:
+                columns[name] = self.unique_column(field_type, unique_round_keys(unique_seed, field_seed), offset, num_rows)
+            else:
+                columns[name] = generator(self, rng, num_rows)
+            metrics.record_field(field_type, time.perf_counter() - started, num_rows)
+        return columns
+
+    def generate_rows(self, schema: Union[List[Dict], 'CompiledSchema'], num_rows: int) -> List[Dict]:
+        """Generate num_rows rows of a schema as dictionaries"""
+        return columns_to_rows(self.generate_columns(schema, num_rows))
+
+    def iter_batches(self, schema: Union[List[Dict], 'CompiledSchema'], num_rows: int,
+                     batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator[Dict[str, Any]]:
+        """Yield column batches of at most batch_rows rows until num_rows are produced"""
+        plan = compile_schema(schema)
+        # Unique columns share one permutation across batches, so values never repeat between them
+        unique_seed = int(self.rng.integers(0, 2 ** 63)) if any(plan.unique) else None
+        if unique_seed is not None:
+            self.check_unique(plan, num_rows)
+        offset = 0
+        while offset < num_rows:
+            size = min(batch_rows, num_rows - offset)
+            yield self._generate(plan, size, self.rng, unique_seed, offset)
+            offset += size
+
+    def generate_range(self, schema: Union[List[Dict], 'CompiledSchema'], seed: int,
+                       offset: int, limit: int) -> Dict[str, Any]:
+        """
+        Generate rows [offset, offset + limit) of the seeded dataset defined by (schema, seed)
+
+        Every block of SEEDED_BLOCK_ROWS rows of a column draws from a Philox stream keyed by
+        the seed and the field, with the block index as its counter. Any range can therefore be
+        computed without generating the rows before it, and the same range always yields the
+        same values regardless of how the dataset is split into requests.
+        """
+        plan = compile_schema(schema)
+        if limit <= 0:
+            return {name: [] for name in plan.names}
+        if any(plan.unique):
+            self.check_unique(plan, offset + limit)
+
+        first_block = offset // SEEDED_BLOCK_ROWS
+        last_block = (offset + limit - 1) // SEEDED_BLOCK_ROWS
+        start = offset - first_block * SEEDED_BLOCK_ROWS
+
+        columns = {}
+        for name, field_type, generator, field_seed, unique in zip(
+                plan.names, plan.types, plan.generators, plan.field_seeds, plan.unique):
+            started = time.perf_counter()
+            if unique:
+                columns[name] = self.unique_column(field_type, unique_round_keys(seed, field_seed), offset, limit)
+            else:
+                key = np.random.SeedSequence([seed, field_seed]).generate_state(2, np.uint64)
+                blocks = [
+                    generator(self, np.random.Generator(np.random.Philox(key=key, counter=block << 128)), SEEDED_BLOCK_ROWS)
+                    for block in range(first_block, last_block + 1)
+                ]
+                if isinstance(blocks[0], np.ndarray):
+                    column = np.concatenate(blocks)
+                else:
+                    column = [value for values in blocks for value in values]
+                columns[name] = column[start:start + limit]
+            metrics.record_field(field_type, time.perf_counter() - started, limit)
+        return columns
+
+    def iter_range_batches(self, schema: Union[List[Dict], 'CompiledSchema'], seed: int, offset: int,
+                           limit: int, batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator[Dict[str, Any]]:
+        """Yield column batches covering rows [offset, offset + limit) of a seeded dataset"""
+        plan = compile_schema(schema)
+        end = offset + limit
+        while offset < end:
+            size = min(batch_rows, end - offset)
+            yield self.generate_range(plan, seed, offset, size)
+            offset += size
+
+    def unique_capacity(self, field_type: str) -> Optional[int]:
+        """Number of distinct values a unique column of this type can hold, or None if unbounded"""
+        if field_type == 'number':
+            return 1000
+        if field_type == 'decimal':
+            return 99901
+        if field_type == 'boolean':
+            return 2
+        if field_type == 'date':
+            return int((np.datetime64(self._now().date(), 'D') - _EPOCH_DAY).astype(np.int64)) + 1
+        if field_type == 'datetime':
+            return int((self._now() - datetime(1970, 1, 1)).total_seconds()) + 1
+        if field_type == 'ip_address':
+            return 2 ** 32
+        if field_type == 'mac_address':
+            return 2 ** 48
+        # Pooled strings get a suffix once their distinct values are used up
+        return None
+
+    def check_unique(self, schema: Union[List[Dict], 'CompiledSchema'], num_rows: int):
+        """
+        Fail fast when a unique column cannot hold num_rows distinct values
+
+        Raises:
+            ValueError: Naming the first field whose value space is too small
+        """
+        plan = compile_schema(schema)
+        for name, field_type, unique in zip(plan.names, plan.types, plan.unique):
+            capacity = self.unique_capacity(field_type) if unique else None
+            if capacity is not None and num_rows > capacity:
+                raise ValueError(f"Field '{name}' ({field_type}) has only {capacity} distinct values, "
+                                 f"too few for {num_rows} unique rows")
+
+    def unique_column(self, field_type: str, round_keys: np.ndarray, offset: int, num_rows: int):
+        """
+        Values of a unique column at positions [offset, offset + num_rows)
+
+        Each position is mapped through a keyed permutation of the type's value space, so values
+        are distinct across any split into batches, shards or seeded ranges without tracking the
+        values already produced. Pooled string types permute the distinct pool values once per
+        round of len(pool) rows and mark rounds after the first with a deterministic suffix.
+        """
+        positions = np.arange(offset, offset + num_rows, dtype=np.uint64)
+        capacity = self.unique_capacity(field_type)
+        if capacity is None:
+            return self._unique_pooled(field_type, round_keys, positions)
+
+        values = permute(positions, capacity, round_keys)
+        if field_type == 'number':
+            return (values + 1).astype(np.int64)
+        if field_type == 'decimal':
+            return (values.astype(np.int64) + 100) / 100
+        if field_type == 'boolean':
+            return values.astype(bool)
+        if field_type == 'date':
+            return (_EPOCH_DAY + values.astype(np.int64)).astype(str)
+        if field_type == 'datetime':
+            return values.astype(np.int64).astype('datetime64[s]').astype('datetime64[us]')
+        if field_type == 'ip_address':
+            octets = values.astype('>u4').view(np.uint8).reshape(-1, 4)
+            return ['%d.%d.%d.%d' % tuple(row) for row in octets.tolist()]
+        h = values.astype('>u8').tobytes().hex()
+        return [':'.join(h[i + j:i + j + 2] for j in range(4, 16, 2)) for i in range(0, 16 * num_rows, 16)]
+
+    def _unique_pooled(self, field_type: str, round_keys: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        pool = self._pool(field_type)
+        distinct = self._distinct_indices(field_type)
+        size = np.uint64(len(distinct))
+        rounds = positions // size
+        values = pool.take(distinct[permute(positions % size, len(distinct), round_keys, tweak=rounds).astype(np.int64)])
+        suffixed = np.flatnonzero(rounds)
+        if len(suffixed):
+            values[suffixed] = [_suffix(value, int(r)) for value, r in zip(values[suffixed], rounds[suffixed].tolist())]
+        return values
+
+    def _distinct_indices(self, field_type: str) -> np.ndarray:
+        """Pool index of the first occurrence of each distinct value, in pool order, found once per pool"""
+        key = f'{field_type}:distinct'
+        distinct = self._pools.get(key)
+        if distinct is None:
+            pool = self._pool(field_type)
+            _, first = np.unique(pool.take(np.arange(len(pool))), return_index=True)
+            distinct = self._pools[key] = np.sort(first)
+        return distinct
+
+    def _pool(self, field_type: str):
+        """Return (building on first use) the value pool for a string type"""
+        pool = self._pools.get(field_type)
+        if pool is None:
+            with self._pool_lock:
+                pool = self._pools.get(field_type)
+                if pool is None:
+                    pool = self._load_pool(field_type)
+                    self._pools[field_type] = pool
+        return pool
+
+    def _load_pool(self, field_type: str):
+        """Map the shared pool for a Faker type, or build an in-memory pool"""
+        if self.pool_store is not None and field_type in FAKER_PROVIDERS:
+            try:
+                return self.pool_store.get(field_type, self.locale, self.pool_size,
+                                           lambda: self._pool_values(field_type))
+            except OSError as e:
+                logger.warning(f"Shared value pool unavailable for {field_type}, using memory: {e}")
+
+        values = self._pool_values(field_type)
+        pool = np.empty(len(values), dtype=object)
+        pool[:] = values
+        return pool
+
+    def _pool_values(self, field_type: str) -> List[str]:
+        """Pre-generate the values for a string type"""
+        provider = FAKER_PROVIDERS.get(field_type)
+        if provider is None:
+            # Fallback for custom types
+            return [f"custom_{field_type}_{i}" for i in range(1, CUSTOM_TYPE_VALUES + 1)]
+
+        # Pools are seeded per type so their contents are reproducible for seeded datasets
+        self.fake.seed_instance(stable_seed(field_type))
+        values = [provider(self.fake) for _ in range(self.pool_size)]
+        logger.debug(f"Built value pool for {field_type} ({len(values)} values)")
+        return values
+
+    def _now(self) -> datetime:
+        return self.reference_time or datetime.now()
+
+    def _numbers(self, rng: np.random.Generator, num_rows: int) -> np.ndarray:
+        return rng.integers(1, 1001, size=num_rows)
+
+    def _decimals(self, rng: np.random.Generator, num_rows: int) -> np.ndarray:
+        return np.round(rng.uniform(1.0, 1000.0, size=num_rows), 2)
+
+    def _booleans(self, rng: np.random.Generator, num_rows: int) -> np.ndarray:
+        return rng.random(num_rows) < 0.5
+
+    def _uuids(self, rng: np.random.Generator, num_rows: int) -> List[str]:
+        raw = rng.integers(0, 256, size=(num_rows, 16), dtype=np.uint8)
+        raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+        raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+        h = raw.tobytes().hex()
+        return [
+            f"{h[i:i + 8]}-{h[i + 8:i + 12]}-{h[i + 12:i + 16]}-{h[i + 16:i + 20]}-{h[i + 20:i + 32]}"
+            for i in range(0, 32 * num_rows, 32)
+        ]
+
+    def _dates(self, rng: np.random.Generator, num_rows: int) -> np.ndarray:
+        # Same range as Faker's date(): epoch to today, as 'YYYY-MM-DD' strings
+        today = (np.datetime64(self._now().date(), 'D') - _EPOCH_DAY).astype(np.int64)
+        days = rng.integers(0, today + 1, size=num_rows)
+        return (_EPOCH_DAY + days).astype(str)
+
+    def _datetimes(self, rng: np.random.Generator, num_rows: int) -> np.ndarray:
+        # Same range as Faker's date_time(): epoch to now, as naive datetimes
+        now = int((self._now() - datetime(1970, 1, 1)).total_seconds())
+        seconds = rng.integers(0, now + 1, size=num_rows)
+        return seconds.astype('datetime64[s]').astype('datetime64[us]')
+
+    def _ip_addresses(self, rng: np.random.Generator, num_rows: int) -> List[str]:
+        octets = rng.integers(0, 256, size=(num_rows, 4), dtype=np.uint8)
+        return ['%d.%d.%d.%d' % tuple(row) for row in octets.tolist()]
+
+    def _mac_addresses(self, rng: np.random.Generator, num_rows: int) -> List[str]:
+        raw = rng.integers(0, 256, size=(num_rows, 6), dtype=np.uint8)
+        h = raw.tobytes().hex(':')
+        return [h[i:i + 17] for i in range(0, 18 * num_rows, 18)]
+
+
+# Column generators implemented directly in NumPy, called as generator(engine, rng, num_rows)
+NATIVE_GENERATORS: Dict[str, Callable[[ColumnarEngine, np.random.Generator, int], Any]] = {
+    'number': ColumnarEngine._numbers,
+    'decimal': ColumnarEngine._decimals,
+    'boolean': ColumnarEngine._booleans,
+    'uuid': ColumnarEngine._uuids,
+    'date': ColumnarEngine._dates,
+    'datetime': ColumnarEngine._datetimes,
+    'ip_address': ColumnarEngine._ip_addresses,
+    'mac_address': ColumnarEngine._mac_addresses,
+}
+
+
+def _pool_sampler(field_type: str) -> Callable[[ColumnarEngine, np.random.Generator, int], Any]:
+    """Column generator drawing a Faker-backed or custom type from its value pool"""
+    def sample(engine: ColumnarEngine, rng: np.random.Generator, num_rows: int):
+        pool = engine._pool(field_type)
+        return pool.take(rng.integers(0, len(pool), size=num_rows))
+    return sample
+
+
+def resolve_generator(field_type: str) -> Callable[[ColumnarEngine, np.random.Generator, int], Any]:
+    """Column generator for a field type; unknown types fall back to custom values"""
+    return NATIVE_GENERATORS.get(field_type) or _pool_sampler(field_type)
+
+
+class CompiledSchema:
+    """Generator plan for a schema, with every field bound to its column generator up front"""
+
+    __slots__ = ('key', 'names', 'types', 'generators', 'field_seeds', 'unique')
+
+    def __init__(self, key: str, fields: Tuple[Tuple[str, ...], ...]):
+        self.key = key
+        self.names = tuple(field[0] for field in fields)
+        self.types = tuple(field[1] for field in fields)
+        self.generators = tuple(resolve_generator(field_type) for field_type in self.types)
+        # Per-field component of the seeded stream keys
+        self.field_seeds = tuple(stable_seed(f"{name}:{field_type}") for name, field_type in zip(self.names, self.types))
+        # Fields declared with constraints.unique that need a permuted value space
+        self.unique = tuple(len(field) > 2 and field[1] not in UNIQUE_BY_CONSTRUCTION for field in fields)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+_plan_cache: 'OrderedDict[str, CompiledSchema]' = OrderedDict()
+_plan_lock = threading.Lock()
+
+
+def schema_key(fields: Tuple[Tuple[str, ...], ...]) -> str:
+    """Hash of the canonical form of a schema"""
+    canonical = json.dumps(fields, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def compile_schema(schema: Union[List[Dict], CompiledSchema]) -> CompiledSchema:
+    """
+    Compile a schema into a generator plan
+
+    Plans are cached in an LRU keyed by the canonical schema hash, so repeated requests for
+    the same schema skip type resolution entirely.
+    """
+    if isinstance(schema, CompiledSchema):
+        return schema
+
+    # Unique fields carry a marker, so their plan (and key) differs from the unconstrained schema
+    fields = tuple(
+        (field['name'], field['type']) + (('unique',) if (field.get('constraints') or {}).get('unique') else ())
+        for field in schema
+    )
+    key = schema_key(fields)
+    with _plan_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+    metrics.record_cache('schema_plan', plan is not None)
+    if plan is not None:
+        return plan
+
+    plan = CompiledSchema(key, fields)
+    with _plan_lock:
+        _plan_cache[key] = plan
+        while len(_plan_cache) > SCHEMA_PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+def unique_round_keys(seed: int, field_seed: int) -> np.ndarray:
+    """Feistel round keys of a unique column, derived from the dataset seed and the field"""
+    return np.random.SeedSequence([seed, field_seed, _UNIQUE_STREAM]).generate_state(FEISTEL_ROUNDS, np.uint64)
+
+
+def permute(positions: np.ndarray, size: int, round_keys: np.ndarray, tweak: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Keyed pseudo-random permutation of [0, size), applied to positions
+
+    A balanced Feistel network permutes [0, 2**bits) for the smallest even bits covering size;
+    results outside [0, size) are encrypted again (cycle walking), which keeps the mapping a
+    bijection on [0, size). A per-position tweak selects a different permutation.
+    """
+    half = max(1, (max(size - 1, 1).bit_length() + 1) // 2)
+    mask = np.uint64((1 << half) - 1)
+    shift = np.uint64(half)
+    tweak = np.zeros(len(positions), dtype=np.uint64) if tweak is None else tweak.astype(np.uint64)
+
+    values = positions.astype(np.uint64)
+    pending = np.arange(len(values))
+    while len(pending):
+        left = values[pending] >> shift
+        right = values[pending] & mask
+        for round_key in round_keys:
+            left, right = right, left ^ (_mix(right ^ round_key ^ tweak[pending]) & mask)
+        values[pending] = (left << shift) | right
+        pending = pending[values[pending] >= size]
+    return values
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer, used as the Feistel round function"""
+    with np.errstate(over='ignore'):
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _suffix(value: str, round_number: int) -> str:
+    """Mark a repeated pool value as the copy from a later round"""
+    local, at, domain = value.partition('@')
+    if at:
+        # Plus addressing keeps email addresses valid
+        return f'{local}+{round_number}@{domain}'
+    return f'{value}-{round_number}'
+
+
+def column_to_list(column) -> list:
+    """Convert a column to a list of native Python values"""
+    if isinstance(column, np.ndarray):
+        return column.tolist()
+    return list(column)
+
+
+def columns_to_rows(columns: Dict[str, Any]) -> List[Dict]:
+    """Assemble a column mapping into a list of row dictionaries"""
+    names = list(columns)
+    values = [column_to_list(column) for column in columns.values()]
+    return [dict(zip(names, row)) for row in zip(*values)]
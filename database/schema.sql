@@ -2,8 +2,26 @@
 -- Created for feedback analysis and reinforcement learning
 
 -- Chat Logs Table: Store all A.I. Mode interactions
+-- Partitioned by month on timestamp, so retention drops whole partitions and time-range
+-- queries only scan the months they cover. A partitioned table's primary key must include
+-- the partition key; ids still come from one sequence and stay unique on their own.
+
+-- Databases created before partitioning: move the old table aside, it is copied over below
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('chat_logs')) = 'r' THEN
+        ALTER TABLE IF EXISTS ai_ratings DROP CONSTRAINT IF EXISTS ai_ratings_chat_log_id_fkey;
+        ALTER TABLE chat_logs RENAME TO chat_logs_unpartitioned;
+        ALTER TABLE chat_logs_unpartitioned RENAME CONSTRAINT chat_logs_pkey TO chat_logs_unpartitioned_pkey;
+        ALTER SEQUENCE chat_logs_id_seq OWNED BY NONE;
+        DROP INDEX IF EXISTS idx_chat_logs_session, idx_chat_logs_timestamp, idx_chat_logs_qdrant_indexed;
+    END IF;
+END $$;
+
+CREATE SEQUENCE IF NOT EXISTS chat_logs_id_seq;
+
 CREATE TABLE IF NOT EXISTS chat_logs (
-    id SERIAL PRIMARY KEY,
+    id BIGINT NOT NULL DEFAULT nextval('chat_logs_id_seq'),
     session_id VARCHAR(255) NOT NULL,
     user_prompt TEXT NOT NULL,
     ai_message TEXT,
@@ -13,26 +31,99 @@ CREATE TABLE IF NOT EXISTS chat_logs (
     success BOOLEAN DEFAULT TRUE,
     error_message TEXT,
     response_time_ms INTEGER,
-    timestamp TIMESTAMP DEFAULT NOW(),
+    timestamp TIMESTAMP NOT NULL DEFAULT NOW(),
     user_agent TEXT,
-    qdrant_indexed BOOLEAN DEFAULT FALSE
-);
+    qdrant_indexed BOOLEAN DEFAULT FALSE,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+ALTER SEQUENCE chat_logs_id_seq OWNED BY chat_logs.id;
+
+-- Catches rows for months without a partition until create_chat_logs_partition moves them
+CREATE TABLE IF NOT EXISTS chat_logs_default PARTITION OF chat_logs DEFAULT;
 
--- Create index on session_id for faster queries
+-- Create the partition for the month containing a date (no-op if it exists)
+CREATE OR REPLACE FUNCTION create_chat_logs_partition(for_date DATE) RETURNS TEXT AS $$
+DECLARE
+    first_day DATE := date_trunc('month', for_date)::date;
+    next_day DATE := (date_trunc('month', for_date) + INTERVAL '1 month')::date;
+    partition_name TEXT := 'chat_logs_' || to_char(for_date, 'YYYY_MM');
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('chat_logs_partitions'));
+    IF to_regclass(partition_name) IS NULL THEN
+        -- Rows that already landed in the default partition move into the new one
+        EXECUTE format('CREATE TABLE %I (LIKE chat_logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+        EXECUTE format('WITH moved AS (DELETE FROM chat_logs_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+                       'INSERT INTO %I SELECT * FROM moved', first_day, next_day, partition_name);
+        EXECUTE format('ALTER TABLE chat_logs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       partition_name, first_day, next_day);
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Retention: drop monthly partitions that end on or before a date, and ratings left without a log
+CREATE OR REPLACE FUNCTION drop_chat_logs_partitions(older_than DATE) RETURNS INTEGER AS $$
+DECLARE
+    expired RECORD;
+    dropped INTEGER := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('chat_logs_partitions'));
+    FOR expired IN
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'chat_logs'::regclass AND child.relname ~ '^chat_logs_[0-9]{4}_[0-9]{2}$'
+    LOOP
+        IF to_date(substring(expired.relname FROM 11), 'YYYY_MM') + INTERVAL '1 month' <= older_than THEN
+            EXECUTE format('DROP TABLE %I', expired.relname);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    DELETE FROM ai_ratings WHERE timestamp < older_than
+        AND NOT EXISTS (SELECT 1 FROM chat_logs WHERE chat_logs.id = ai_ratings.chat_log_id);
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Copy rows from the pre-partitioning table, then drop it
+DO $$
+BEGIN
+    IF to_regclass('chat_logs_unpartitioned') IS NOT NULL THEN
+        PERFORM create_chat_logs_partition(month::date)
+        FROM (SELECT DISTINCT date_trunc('month', COALESCE(timestamp, NOW())) AS month FROM chat_logs_unpartitioned) months;
+        INSERT INTO chat_logs (id, session_id, user_prompt, ai_message, generated_schema, generated_data_sample,
+                               record_count, success, error_message, response_time_ms, timestamp, user_agent, qdrant_indexed)
+        SELECT id, session_id, user_prompt, ai_message, generated_schema, generated_data_sample,
+               record_count, success, error_message, response_time_ms, COALESCE(timestamp, NOW()), user_agent, qdrant_indexed
+        FROM chat_logs_unpartitioned;
+        PERFORM setval('chat_logs_id_seq', GREATEST((SELECT MAX(id) FROM chat_logs), 1));
+        DROP TABLE chat_logs_unpartitioned;
+    END IF;
+END $$;
+
+-- The current month and the next two always have a partition
+SELECT create_chat_logs_partition((date_trunc('month', NOW()) + n * INTERVAL '1 month')::date)
+FROM generate_series(0, 2) AS n;
+
+-- Indexes on the partitioned table are created on every partition
 CREATE INDEX IF NOT EXISTS idx_chat_logs_session ON chat_logs(session_id);
 CREATE INDEX IF NOT EXISTS idx_chat_logs_timestamp ON chat_logs(timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_chat_logs_qdrant_indexed ON chat_logs(qdrant_indexed) WHERE qdrant_indexed = FALSE;
 
 -- AI Ratings Table: Store user ratings for reinforcement learning
+-- chat_log_id has no foreign key: a key on a partitioned table would have to include timestamp.
+-- Ratings of dropped partitions are removed by drop_chat_logs_partitions.
 CREATE TABLE IF NOT EXISTS ai_ratings (
     id SERIAL PRIMARY KEY,
     session_id VARCHAR(255) NOT NULL,
-    chat_log_id INTEGER REFERENCES chat_logs(id) ON DELETE CASCADE,
+    chat_log_id BIGINT,
     rating VARCHAR(20) NOT NULL CHECK (rating IN ('thumbs_up', 'thumbs_down')),
     feedback_comment TEXT,
     timestamp TIMESTAMP DEFAULT NOW()
 );
 
+ALTER TABLE ai_ratings ALTER COLUMN chat_log_id TYPE BIGINT;
+
 -- Create index on chat_log_id for faster joins
 CREATE INDEX IF NOT EXISTS idx_ai_ratings_chat_log ON ai_ratings(chat_log_id);
 CREATE INDEX IF NOT EXISTS idx_ai_ratings_timestamp ON ai_ratings(timestamp DESC);
@@ -46,22 +137,86 @@ CREATE TABLE IF NOT EXISTS data_requests (
     requested_record_count INTEGER NOT NULL,
     schema_details TEXT,
     additional_notes TEXT,
-    status VARCHAR(50) DEFAULT 'pending' CHECK (status IN ('pending', 'in_progress', 'completed', 'rejected')),
+    status VARCHAR(50) DEFAULT 'pending' CHECK (status IN ('pending', 'in_progress', 'completed', 'rejected', 'failed')),
     admin_notes TEXT,
     created_at TIMESTAMP DEFAULT NOW(),
-    updated_at TIMESTAMP DEFAULT NOW()
+    updated_at TIMESTAMP DEFAULT NOW(),
+    output_format VARCHAR(20),
+    rows_generated INTEGER DEFAULT 0,
+    artifact_path TEXT,
+    error_message TEXT,
+    seed BIGINT,
+    workers INTEGER
 );
 
+-- Background generation job columns (for databases created before jobs were added)
+ALTER TABLE data_requests ADD COLUMN IF NOT EXISTS output_format VARCHAR(20);
+ALTER TABLE data_requests ADD COLUMN IF NOT EXISTS rows_generated INTEGER DEFAULT 0;
+ALTER TABLE data_requests ADD COLUMN IF NOT EXISTS artifact_path TEXT;
+ALTER TABLE data_requests ADD COLUMN IF NOT EXISTS error_message TEXT;
+ALTER TABLE data_requests ADD COLUMN IF NOT EXISTS seed BIGINT;
+ALTER TABLE data_requests ADD COLUMN IF NOT EXISTS workers INTEGER;
+ALTER TABLE data_requests DROP CONSTRAINT IF EXISTS data_requests_status_check;
+ALTER TABLE data_requests ADD CONSTRAINT data_requests_status_check
+    CHECK (status IN ('pending', 'in_progress', 'completed', 'rejected', 'failed'));
+
 -- Create index on email and status for faster queries
 CREATE INDEX IF NOT EXISTS idx_data_requests_email ON data_requests(email);
 CREATE INDEX IF NOT EXISTS idx_data_requests_status ON data_requests(status);
 CREATE INDEX IF NOT EXISTS idx_data_requests_created_at ON data_requests(created_at DESC);
 
+-- Saved Schemas Table (also created by the application on startup)
+CREATE TABLE IF NOT EXISTS data_schema (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    schema_data JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    user_request TEXT
+);
+
+-- Convert schemas stored as text before JSONB storage was introduced
+ALTER TABLE data_schema ALTER COLUMN schema_data TYPE JSONB USING schema_data::jsonb;
+
+-- Listing is paged by id (primary key); these support the date and name filters
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS ix_data_schema_created_at ON data_schema(created_at);
+CREATE INDEX IF NOT EXISTS idx_data_schema_name_trgm ON data_schema USING GIN (name gin_trgm_ops);
+
+-- Analytics Rollups: hourly and daily aggregates of chat_logs and ai_ratings for the admin
+-- dashboard (also created by the application). Maintained incrementally from rows newer than
+-- the watermark in analytics_rollup_state, and kept when old chat_logs partitions are dropped.
+CREATE TABLE IF NOT EXISTS analytics_rollups (
+    granularity VARCHAR(4) NOT NULL CHECK (granularity IN ('hour', 'day')),
+    bucket_start TIMESTAMP NOT NULL,
+    chats INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    thumbs_up INTEGER NOT NULL DEFAULT 0,
+    thumbs_down INTEGER NOT NULL DEFAULT 0,
+    response_time_count INTEGER NOT NULL DEFAULT 0,
+    response_time_sum BIGINT NOT NULL DEFAULT 0,
+    response_time_min INTEGER,
+    response_time_max INTEGER,
+    response_time_sketch JSONB,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (granularity, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS analytics_rollup_state (
+    name VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
 -- Comments for documentation
 COMMENT ON TABLE chat_logs IS 'Stores all A.I. Mode chat interactions for analytics and RL';
 COMMENT ON TABLE ai_ratings IS 'Stores user ratings (thumbs up/down) for AI responses';
+COMMENT ON TABLE data_schema IS 'Schemas saved from the generator UI and API';
+COMMENT ON TABLE analytics_rollups IS 'Hourly and daily chat and rating aggregates for the admin dashboard';
 COMMENT ON TABLE data_requests IS 'Stores user requests for large datasets exceeding 1000 records';
 COMMENT ON COLUMN chat_logs.generated_data_sample IS 'First 3 records of generated data for context';
 COMMENT ON COLUMN ai_ratings.rating IS 'User rating: thumbs_up or thumbs_down';
-COMMENT ON COLUMN data_requests.status IS 'Request status: pending, in_progress, completed, or rejected';
+COMMENT ON COLUMN analytics_rollups.response_time_sketch IS 'Mergeable response_time_ms quantile sketch (bins of relative width 2 * accuracy)';
+COMMENT ON COLUMN data_requests.status IS 'Request status: pending, in_progress, completed, rejected, or failed';
+COMMENT ON COLUMN data_requests.rows_generated IS 'Progress of the background generation job';
+COMMENT ON COLUMN data_requests.artifact_path IS 'Output file written by a completed generation job';
 
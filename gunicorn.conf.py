@@ -0,0 +1,21 @@
+"""
+Gunicorn Configuration
+Loads the application once in the master and warms shared state before workers are forked
+"""
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8080')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '300'))
+
+# Workers are forked from a master that has already imported the app, so they start serving
+# without importing Flask, SQLAlchemy or NumPy again
+preload_app = True
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before the first worker is forked"""
+    from app import warmup
+    warmup()
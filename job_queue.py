@@ -0,0 +1,163 @@
+"""
+Background Generation Jobs
+Runs large dataset requests in the background and writes each result to disk
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOB_OUTPUT_DIR = os.getenv('JOB_OUTPUT_DIR', 'job_artifacts')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+
+# Queued and running jobs are touched every JOB_HEARTBEAT_SECONDS; a job left untouched for
+# JOB_STALE_SECONDS lost its worker (restart or crash) and is taken over by another one
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', '30'))
+JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', '120'))
+
+# Output formats a job can write, with their file extensions
+JOB_FORMATS = {
+    'csv': 'csv',
+    'ndjson': 'ndjson',
+}
+
+
+@dataclass
+class GenerationJob:
+    id: int
+    schema: List[Dict]
+    num_rows: int
+    format: str = 'csv'
+    seed: Optional[int] = None
+    workers: int = 1
+
+
+class JobQueue:
+    """
+    Background runner for generation jobs
+
+    The queue only knows how to write chunks to a file; producing the chunks and
+    persisting status are supplied by the caller:
+
+        chunk_source(job) -> iterable of (text, row_count)
+        on_update(job_id, **fields) -> persists status/progress fields
+        touch(job_ids) -> marks jobs as still owned by this process
+        claim_stale(stale_seconds) -> takes over abandoned jobs, returning them as GenerationJobs
+
+    Each job is driven by a thread that only writes chunks and records progress; the chunk
+    source is expected to do the generation itself in worker processes. Once started, a
+    maintenance thread touches this process's jobs and requeues jobs abandoned by other ones.
+    """
+
+    def __init__(self, chunk_source: Callable[[GenerationJob], Iterable[Tuple[str, int]]],
+                 on_update: Callable[..., Any], output_dir: str = JOB_OUTPUT_DIR,
+                 max_workers: int = JOB_WORKERS,
+                 touch: Optional[Callable[[List[int]], Any]] = None,
+                 claim_stale: Optional[Callable[[float], List[GenerationJob]]] = None,
+                 heartbeat_seconds: float = JOB_HEARTBEAT_SECONDS, stale_seconds: float = JOB_STALE_SECONDS):
+        self.chunk_source = chunk_source
+        self.on_update = on_update
+        self.output_dir = output_dir
+        self.touch = touch
+        self.claim_stale = claim_stale
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='generation-job')
+        # Jobs queued or running in this process
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._maintenance_pid: Optional[int] = None
+
+    def artifact_path(self, job: GenerationJob) -> str:
+        """Location of a job's finished output file"""
+        return os.path.join(self.output_dir, f"job_{job.id}.{JOB_FORMATS[job.format]}")
+
+    def submit(self, job: GenerationJob):
+        """Queue a job; it runs as soon as a worker is free"""
+        if job.format not in JOB_FORMATS:
+            raise ValueError(f"Unsupported job format: {job.format}")
+        with self._lock:
+            self._active.add(job.id)
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued generation job {job.id} ({job.num_rows} rows, {job.format})")
+
+    def start(self):
+        """Start the maintenance thread of this process; the first pass recovers abandoned jobs"""
+        with self._lock:
+            if self._maintenance_pid == os.getpid() or (self.touch is None and self.claim_stale is None):
+                return
+            # Threads do not survive a fork, so each worker process starts its own
+            self._maintenance_pid = os.getpid()
+        threading.Thread(target=self._maintain, name='generation-job-maintenance', daemon=True).start()
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs and optionally wait for running ones"""
+        self._stop.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _maintain(self):
+        while not self._stop.is_set():
+            try:
+                self.heartbeat()
+                self.recover()
+            except Exception as e:
+                logger.error(f"Generation job maintenance failed: {e}")
+            self._stop.wait(self.heartbeat_seconds)
+
+    def heartbeat(self):
+        """Mark this process's queued and running jobs as alive"""
+        with self._lock:
+            job_ids = sorted(self._active)
+        if job_ids and self.touch is not None:
+            self.touch(job_ids)
+
+    def recover(self) -> List[GenerationJob]:
+        """Queue the jobs whose process stopped updating them"""
+        if self.claim_stale is None:
+            return []
+        jobs = self.claim_stale(self.stale_seconds)
+        for job in jobs:
+            with self._lock:
+                if job.id in self._active:
+                    continue
+            logger.warning(f"Requeuing abandoned generation job {job.id}")
+            self.submit(job)
+        return jobs
+
+    def _run(self, job: GenerationJob):
+        path = self.artifact_path(job)
+        partial_path = f"{path}.part"
+        rows_generated = 0
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self.on_update(job.id, status='in_progress', rows_generated=0)
+
+            with open(partial_path, 'w', encoding='utf-8', newline='') as output:
+                for text, row_count in self.chunk_source(job):
+                    output.write(text)
+                    rows_generated += row_count
+                    self.on_update(job.id, rows_generated=rows_generated)
+
+            # Only publish the artifact once it is complete
+            os.replace(partial_path, path)
+            self.on_update(job.id, status='completed', artifact_path=path)
+            logger.info(f"Generation job {job.id} completed: {rows_generated} rows written to {path}")
+
+        except Exception as e:
+            logger.error(f"Generation job {job.id} failed: {e}")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            try:
+                self.on_update(job.id, status='failed', error_message=str(e))
+            except Exception as update_error:
+                logger.error(f"Could not record failure of job {job.id}: {update_error}")
+        finally:
+            with self._lock:
+                self._active.discard(job.id)
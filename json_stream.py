@@ -0,0 +1,88 @@
+"""
+Incremental JSON Array Parsing
+Extracts the items of a JSON array from text that arrives in fragments, such as an LLM token stream
+"""
+
+import json
+import logging
+from typing import Any, List
+
+logger = logging.getLogger(__name__)
+
+_OPENERS = '[{'
+_CLOSERS = ']}'
+
+
+class JSONArrayParser:
+    """
+    Incremental parser for the first top-level JSON array in a text stream
+
+    Text before the opening '[' is ignored, as is anything after the matching ']'. Each item
+    is returned by feed() as soon as it closes: objects and arrays on their closing bracket,
+    scalars on the following ',' or ']'. Items that are not valid JSON are skipped.
+    """
+
+    def __init__(self):
+        self.complete = False
+        self.items_parsed = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._item: List[str] = []
+
+    def feed(self, text: str) -> List[Any]:
+        """Consume the next fragment and return the items it completed"""
+        items = []
+        for char in text:
+            if self.complete:
+                break
+
+            if not self._started:
+                if char == '[':
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._item.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if self._depth == 1 and char in ',]':
+                # Separator or end of the top-level array: flush a pending scalar item
+                self._flush(items)
+                if char == ']':
+                    self.complete = True
+                continue
+
+            if self._depth == 1 and not self._item and char.isspace():
+                continue
+
+            self._item.append(char)
+            if char == '"':
+                self._in_string = True
+            elif char in _OPENERS:
+                self._depth += 1
+            elif char in _CLOSERS:
+                # A stray closer cannot end the top-level array; only ']' at depth 1 does
+                self._depth = max(1, self._depth - 1)
+                if self._depth == 1:
+                    self._flush(items)
+        return items
+
+    def _flush(self, items: List[Any]):
+        text = ''.join(self._item).strip()
+        self._item = []
+        if not text:
+            return
+        try:
+            items.append(json.loads(text))
+            self.items_parsed += 1
+        except json.JSONDecodeError:
+            logger.debug(f"Skipping invalid JSON array item: {text[:80]}")
@@ -0,0 +1,202 @@
+"""
+LLM Response Cache
+Keeps parsed LLM responses in an in-memory LRU backed by a SQLite file that survives restarts
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Set LLM_CACHE_PATH to an empty string to keep the cache in memory only
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'llm_cache/responses.sqlite3')
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', '512'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case-fold and collapse whitespace so trivially different prompts share an entry"""
+    return ' '.join(prompt.casefold().split())
+
+
+def cache_key(prompt: str, model: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """Cache key for a prompt sent to a model with the given generation options"""
+    payload = json.dumps([normalize_prompt(prompt), model, options or {}], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier cache of JSON-serializable LLM results
+
+    Lookups go to the in-memory LRU first and fall back to the SQLite store, promoting disk hits
+    into memory. Entries expire after ttl seconds; when the store holds more than max_entries,
+    the least recently used entries are removed. The SQLite connection is opened on first use
+    in each process, since a connection must not be shared across a fork.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: int = LLM_CACHE_TTL,
+                 memory_entries: int = LLM_CACHE_MEMORY_ENTRIES, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self._memory: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """SQLite connection for this process, or None when the cache is memory-only"""
+        if not self.path or self._conn_pid == os.getpid():
+            return self._conn
+        self._conn_pid = os.getpid()
+        try:
+            self._conn = self._connect(self.path)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache store unavailable at {self.path}, using memory only: {e}")
+            self._conn = None
+        return self._conn
+
+    def _connect(self, path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)')
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value for key, or None on a miss or an expired entry"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    metrics.record_cache('llm', True)
+                    return value
+                del self._memory[key]
+
+            value = self._disk_get(key, now)
+            if value is None:
+                self.misses += 1
+                metrics.record_cache('llm', False)
+                return None
+
+            self.hits += 1
+            self.disk_hits += 1
+            metrics.record_cache('llm', True)
+            return value
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable value"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            conn = self._connection()
+            if conn is not None:
+                try:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                        (key, json.dumps(value), now, now)
+                    )
+                    self._evict(conn, now)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not write LLM cache entry: {e}")
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            conn = self._connection()
+            if conn is not None:
+                conn.execute('DELETE FROM llm_cache')
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and entry counts"""
+        with self._lock:
+            stored = None
+            conn = self._connection()
+            if conn is not None:
+                stored = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'stored_entries': stored,
+                'ttl_seconds': self.ttl
+            }
+
+    def _remember(self, key: str, created_at: float, value: Any):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Optional[Any]:
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                'SELECT value, created_at FROM llm_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl:
+                conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE llm_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read LLM cache entry: {e}")
+            return None
+
+        value = json.loads(row[0])
+        self._remember(key, row[1], value)
+        return value
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        conn.execute('DELETE FROM llm_cache WHERE created_at <= ?', (now - self.ttl,))
+        conn.execute(
+            'DELETE FROM llm_cache WHERE key IN ('
+            'SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+
+_default_cache: Optional[LLMCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> LLMCache:
+    """Process-wide LLM response cache"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+    return _default_cache
@@ -0,0 +1,697 @@
+"""
+Service Metrics
+Prometheus-format counters and histograms, per-request phase timing and an on-demand sampling profiler
+"""
+
+import atexit
+import bisect
+import contextvars
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as TallyCounter, OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+# Requests carrying "X-Profile: <token>" are sampled by the profiler; unset disables profiling
+METRICS_PROFILE_TOKEN = os.getenv('METRICS_PROFILE_TOKEN', '')
+METRICS_PROFILE_INTERVAL = float(os.getenv('METRICS_PROFILE_INTERVAL_MS', '5')) / 1000
+METRICS_PROFILE_KEEP = int(os.getenv('METRICS_PROFILE_KEEP', '20'))
+
+# Worker processes of one server write snapshots of their metrics and their profiles here, so
+# any worker can answer /metrics and /api/profiles for all of them. Set to an empty string to
+# keep metrics per process.
+METRICS_DIR = os.getenv('METRICS_DIR', 'metrics_data')
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv('METRICS_SNAPSHOT_INTERVAL', '5'))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(11))  # 256 B to 256 MiB
+
+LabelValues = Tuple[str, ...]
+
+
+class Metric:
+    """Base for a metric family with a fixed set of label names"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def _format_labels(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.label_names, values)) + ([extra] if extra else [])
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def render(self, values: Dict) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}'] + self.samples(values)
+
+    def snapshot(self) -> List:
+        """This process's values as JSON-serializable [labels, value] pairs"""
+        return [[list(key), value] for key, value in self.values().items()]
+
+    def merge(self, snapshots: Iterable[List]) -> Dict:
+        """Sum of the values in several processes' snapshots"""
+        merged: Dict[LabelValues, float] = {}
+        for snapshot in snapshots:
+            for labels, value in snapshot:
+                key = tuple(labels)
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def values(self) -> Dict:
+        raise NotImplementedError
+
+    def drain(self) -> List:
+        """Take this process's recorded values as a snapshot and reset them"""
+        return []
+
+    def add(self, snapshot: List):
+        """Add another process's drained values to this process's"""
+
+    def samples(self, values: Dict) -> List[str]:
+        return [f'{self.name}{self._format_labels(key)} {_number(value)}' for key, value in sorted(values.items())]
+
+
+class Counter(Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def drain(self) -> List:
+        with self._lock:
+            values, self._values = self._values, {}
+        return [[list(key), value] for key, value in values.items()]
+
+    def add(self, snapshot: List):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            for labels, value in snapshot:
+                key = tuple(labels)
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    """
+    Value computed when the metrics are scraped
+
+    A gauge with a source is derived from that metric's values merged over all processes.
+    Otherwise collect() reports this process's state, and the values of the live processes
+    are summed.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str],
+                 collect: Callable[..., Dict[LabelValues, float]], source: Optional[Metric] = None):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+        self.source = source
+
+    def values(self) -> Dict[LabelValues, float]:
+        return {} if self.source is not None else self.collect()
+
+
+class Histogram(Metric):
+    """Bucketed distribution of observed values per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def values(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        with self._lock:
+            return {key: ([*counts], total) for key, (counts, total) in self._values.items()}
+
+    def drain(self) -> List:
+        with self._lock:
+            values, self._values = self._values, {}
+        return [[list(key), entry] for key, entry in values.items()]
+
+    def add(self, snapshot: List):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            for labels, (counts, total) in snapshot:
+                entry = self._values.get(tuple(labels))
+                if entry is None:
+                    self._values[tuple(labels)] = [list(counts), total]
+                else:
+                    entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                    entry[1] += total
+
+    def merge(self, snapshots: Iterable[List]) -> Dict:
+        merged: Dict[LabelValues, Tuple[List[int], float]] = {}
+        for snapshot in snapshots:
+            for labels, (counts, total) in snapshot:
+                key = tuple(labels)
+                if key in merged:
+                    merged_counts, merged_total = merged[key]
+                    merged[key] = ([a + b for a, b in zip(merged_counts, counts)], merged_total + total)
+                else:
+                    merged[key] = (list(counts), total)
+        return merged
+
+    def samples(self, values: Dict) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f'{self.name}_bucket{self._format_labels(key, ("le", le))} {cumulative}')
+            lines.append(f'{self.name}_sum{self._format_labels(key)} {_number(total)}')
+            lines.append(f'{self.name}_count{self._format_labels(key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Metric families exposed by /metrics"""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> Dict[str, List]:
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def drain(self) -> Dict[str, List]:
+        """Counter and histogram values recorded since the last drain, reset to zero"""
+        deltas = {}
+        for metric in self._metrics:
+            values = metric.drain()
+            if values:
+                deltas[metric.name] = values
+        return deltas
+
+    def add(self, deltas: Dict[str, List]):
+        """Add values drained in another process"""
+        for metric in self._metrics:
+            if metric.name in deltas:
+                metric.add(deltas[metric.name])
+
+    def render(self) -> str:
+        """
+        Metrics of every process of this server, merged
+
+        Counters and histograms are summed over all snapshots, including those of exited
+        workers, so totals never drop when a worker is replaced. Process gauges are summed over
+        live workers only.
+        """
+        processes = [(os.getpid(), True, self.snapshot())]
+        if run_directory():
+            write_snapshot()
+            processes += _other_snapshots()
+
+        lines = [f'# Metrics merged from {sum(1 for _, live, _ in processes if live)} live processes '
+                 f'({len(processes)} snapshots)']
+        merged: Dict[str, Dict] = {}
+        for metric in self._metrics:
+            if isinstance(metric, Gauge) and metric.source is not None:
+                values = metric.collect(merged[metric.source.name])
+            else:
+                values = metric.merge(snapshot.get(metric.name, []) for _, live, snapshot in processes
+                                      if live or not isinstance(metric, Gauge))
+            merged[metric.name] = values
+            lines.extend(metric.render(values))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'sdg_http_requests_total', 'HTTP requests by endpoint, method and status', ('endpoint', 'method', 'status')))
+HTTP_DURATION = REGISTRY.register(Histogram(
+    'sdg_http_request_duration_seconds', 'Time from request start to the last byte of the response', ('endpoint',)))
+HTTP_REQUEST_BYTES = REGISTRY.register(Histogram(
+    'sdg_http_request_size_bytes', 'Request body size', ('endpoint',), SIZE_BUCKETS))
+HTTP_RESPONSE_BYTES = REGISTRY.register(Histogram(
+    'sdg_http_response_size_bytes', 'Response body size, counted as streamed', ('endpoint',), SIZE_BUCKETS))
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    'sdg_request_phase_seconds', 'Time per request spent in each phase (llm, parse, generate, serialize)',
+    ('endpoint', 'phase')))
+FIELD_SECONDS = REGISTRY.register(Histogram(
+    'sdg_field_generation_seconds', 'Time to generate one column batch, by field type', ('type',)))
+FIELD_VALUES = REGISTRY.register(Counter(
+    'sdg_field_values_generated_total', 'Values generated, by field type', ('type',)))
+OLLAMA_REQUESTS = REGISTRY.register(Counter(
+    'sdg_ollama_requests_total', 'Requests to Ollama by operation and outcome (ok, http_error, connection_error)',
+    ('operation', 'outcome')))
+OLLAMA_SECONDS = REGISTRY.register(Histogram(
+    'sdg_ollama_request_seconds', 'Ollama request latency; streamed requests are timed to the last fragment',
+    ('operation',)))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'sdg_cache_lookups_total', 'Cache lookups by cache and result (hit or miss)', ('cache', 'result')))
+CHAT_LOG_ROWS = REGISTRY.register(Counter(
+    'sdg_chat_log_rows_total', 'Rows handed to the chat log writer by table and outcome (written, dropped_full, dropped_error)',
+    ('table', 'outcome')))
+CHAT_LOG_FLUSH_SECONDS = REGISTRY.register(Histogram(
+    'sdg_chat_log_flush_seconds', 'Time to write one chat log batch, including retries'))
+CHAT_LOG_BATCH_ROWS = REGISTRY.register(Histogram(
+    'sdg_chat_log_batch_rows', 'Rows per chat log batch', (), (1, 10, 50, 100, 250, 500, 1000, 2500, 5000)))
+
+
+def _cache_hit_ratios(lookups: Dict[LabelValues, float]) -> Dict[LabelValues, float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in lookups.items():
+        counts = totals.setdefault(cache, [0, 0])
+        counts[0 if result == 'hit' else 1] += value
+    return {(cache,): hits / (hits + misses) for cache, (hits, misses) in totals.items() if hits + misses}
+
+
+REGISTRY.register(Gauge('sdg_cache_hit_ratio', 'Share of lookups answered by each cache since start',
+                        ('cache',), _cache_hit_ratios, source=CACHE_LOOKUPS))
+
+
+# Run directory, or '' when metrics stay per process; None until first use
+_run_dir: Optional[str] = None
+_run_dir_lock = threading.Lock()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def run_directory() -> str:
+    """
+    Directory shared by the processes of this server run, created on first use
+
+    The gunicorn master creates it from warmup(), so every worker forked from it inherits the
+    same directory, named after the master. Importing this module creates nothing, so pool
+    workers and scripts that only record metrics never touch the disk.
+    """
+    global _run_dir
+    if _run_dir is None:
+        with _run_dir_lock:
+            if _run_dir is None:
+                _run_dir = _create_run_directory()
+    return _run_dir
+
+
+def _create_run_directory() -> str:
+    if not METRICS_DIR:
+        return ''
+    try:
+        run_dir = os.path.join(METRICS_DIR, str(os.getpid()))
+        os.makedirs(os.path.join(run_dir, 'profiles'), exist_ok=True)
+        return run_dir
+    except OSError as e:
+        logger.warning(f"Metrics directory {METRICS_DIR} unavailable, keeping metrics per process: {e}")
+        return ''
+
+
+def remove_stale_runs():
+    """
+    Remove the run directories of servers that are no longer running
+
+    Only the gunicorn master calls this, before it forks any worker. Run directories are named
+    after the master, so a worker exiting never makes its server's snapshots look stale.
+    """
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return
+    for name in os.listdir(METRICS_DIR):
+        if name.isdigit() and int(name) != os.getpid() and not _alive(int(name)):
+            shutil.rmtree(os.path.join(METRICS_DIR, name), ignore_errors=True)
+
+
+_snapshot_pid: Optional[int] = None
+_snapshot_lock = threading.Lock()
+
+
+def write_snapshot():
+    """Write this process's metrics to the run directory"""
+    run_dir = run_directory()
+    if not run_dir:
+        return
+    path = os.path.join(run_dir, f'{os.getpid()}.json')
+    tmp_path = f'{path}.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(REGISTRY.snapshot(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics snapshot: {e}")
+
+
+def _other_snapshots() -> List[Tuple[int, bool, Dict[str, List]]]:
+    snapshots = []
+    run_dir = run_directory()
+    for name in os.listdir(run_dir):
+        if not name.endswith('.json') or name == f'{os.getpid()}.json':
+            continue
+        pid = int(name[:-5])
+        try:
+            with open(os.path.join(run_dir, name)) as f:
+                snapshots.append((pid, _alive(pid), json.load(f)))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping metrics snapshot {name}: {e}")
+    return snapshots
+
+
+def _snapshot_loop():
+    while True:
+        time.sleep(METRICS_SNAPSHOT_INTERVAL)
+        write_snapshot()
+
+
+def ensure_snapshots():
+    """Start writing this process's snapshots periodically and at exit, once per process"""
+    global _snapshot_pid
+    if _snapshot_pid == os.getpid() or not run_directory():
+        return
+    with _snapshot_lock:
+        if _snapshot_pid == os.getpid():
+            return
+        _snapshot_pid = os.getpid()
+        threading.Thread(target=_snapshot_loop, name='metrics-snapshot', daemon=True).start()
+        atexit.register(write_snapshot)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return REGISTRY.render()
+
+
+def drain_deltas() -> Dict[str, List]:
+    """
+    Counter and histogram values recorded in this process since the last call
+
+    Process-pool workers never serve /metrics or write snapshots. They return these deltas with
+    each result, and the parent adds them to its own registry with add_deltas().
+    """
+    return REGISTRY.drain()
+
+
+def add_deltas(deltas: Dict[str, List]):
+    REGISTRY.add(deltas)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def record_field(field_type: str, seconds: float, values: int):
+    FIELD_SECONDS.observe(seconds, type=field_type)
+    FIELD_VALUES.inc(values, type=field_type)
+
+
+def record_ollama(operation: str, outcome: str, seconds: Optional[float] = None):
+    OLLAMA_REQUESTS.inc(operation=operation, outcome=outcome)
+    if seconds is not None:
+        OLLAMA_SECONDS.observe(seconds, operation=operation)
+
+
+class RequestTimer:
+    """
+    Exclusive time per phase for one request
+
+    Phases nest: while an inner phase runs, the outer one is paused, so time spent generating
+    batches inside a serializer loop counts as generation, not serialization.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self._stack: List[List] = []
+
+    def enter(self, name: str):
+        now = time.perf_counter()
+        if self._stack:
+            self._credit(self._stack[-1], now)
+        self._stack.append([name, now])
+
+    def exit(self):
+        now = time.perf_counter()
+        self._credit(self._stack.pop(), now)
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def _credit(self, frame: List, now: float):
+        self.add(frame[0], now - frame[1])
+        frame[1] = now
+
+    def server_timing(self) -> str:
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.phases.items())
+
+    def finish(self):
+        for name, seconds in self.phases.items():
+            PHASE_SECONDS.observe(seconds, endpoint=self.endpoint, phase=name)
+
+
+_current_timer: contextvars.ContextVar[Optional[RequestTimer]] = contextvars.ContextVar('request_timer', default=None)
+
+
+def start_request(endpoint: str) -> RequestTimer:
+    """Start timing a request; phases recorded in this context are attributed to it"""
+    timer = RequestTimer(endpoint)
+    _current_timer.set(timer)
+    return timer
+
+
+def end_request(timer: RequestTimer, method: str, status: int, response_bytes: Optional[int]):
+    ensure_snapshots()
+    timer.finish()
+    HTTP_REQUESTS.inc(endpoint=timer.endpoint, method=method, status=str(status))
+    HTTP_DURATION.observe(time.perf_counter() - timer.started, endpoint=timer.endpoint)
+    if response_bytes is not None:
+        HTTP_RESPONSE_BYTES.observe(response_bytes, endpoint=timer.endpoint)
+    if _current_timer.get() is timer:
+        _current_timer.set(None)
+
+
+@contextmanager
+def phase(name: str):
+    """Attribute the enclosed time to a phase of the current request (no-op outside requests)"""
+    timer = _current_timer.get()
+    if timer is None or not METRICS_ENABLED:
+        yield
+        return
+    timer.enter(name)
+    try:
+        yield
+    finally:
+        timer.exit()
+
+
+def add_phase(name: str, seconds: float):
+    """Attribute already measured time to a phase of the current request"""
+    timer = _current_timer.get()
+    if timer is not None and METRICS_ENABLED:
+        timer.add(name, seconds)
+
+
+def timed_iter(iterable: Iterable, name: str) -> Iterator:
+    """Yield from iterable, attributing the time spent producing each item to a phase"""
+    iterator = iter(iterable)
+    try:
+        while True:
+            with phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+
+
+class CountedStream:
+    """
+    Response body passed through unchanged, calling on_close(size) once when it is closed
+
+    WSGI servers close the body after the last chunk or when the client goes away, including
+    when iteration never started, so the callback runs exactly once in every case.
+    """
+
+    def __init__(self, iterable: Iterable, on_close: Callable[[int], None]):
+        self.iterable = iterable
+        self.on_close = on_close
+        self.size = 0
+        self._closed = False
+
+    def __iter__(self) -> Iterator:
+        for chunk in self.iterable:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            close = getattr(self.iterable, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.on_close(self.size)
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's call stack at a fixed interval
+
+    Stacks are aggregated in the folded format ("outer;inner;leaf count" per line) that
+    flame graph tools read directly.
+    """
+
+    def __init__(self, thread_id: int, interval: float = METRICS_PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.id = uuid.uuid4().hex[:16]
+        self.samples: TallyCounter = TallyCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self) -> 'SamplingProfiler':
+        self._thread.start()
+        return self
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._thread.join()
+        return self.folded()
+
+    def folded(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+
+_profiles: 'OrderedDict[str, str]' = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def profiling_requested(header_value: Optional[str]) -> bool:
+    return bool(METRICS_PROFILE_TOKEN) and header_value == METRICS_PROFILE_TOKEN
+
+
+def start_profile() -> SamplingProfiler:
+    """Start sampling the calling thread"""
+    return SamplingProfiler(threading.get_ident()).start()
+
+
+def finish_profile(profiler: SamplingProfiler):
+    """Stop a profiler and keep its folded stacks for retrieval by any worker"""
+    folded = profiler.stop()
+    if run_directory():
+        _store_profile(profiler.id, folded)
+        return
+    with _profiles_lock:
+        _profiles[profiler.id] = folded
+        while len(_profiles) > METRICS_PROFILE_KEEP:
+            _profiles.popitem(last=False)
+
+
+def _store_profile(profile_id: str, folded: str):
+    directory = os.path.join(run_directory(), 'profiles')
+    path = os.path.join(directory, f'{profile_id}.folded')
+    try:
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(folded)
+        os.replace(f'{path}.tmp', path)
+
+        # Keep the newest METRICS_PROFILE_KEEP profiles of all workers
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.folded')]
+        for old_path in sorted(paths, key=os.path.getmtime)[:-METRICS_PROFILE_KEEP]:
+            os.remove(old_path)
+    except OSError as e:
+        logger.warning(f"Could not store profile {profile_id}: {e}")
+
+
+def get_profile(profile_id: str) -> Optional[str]:
+    run_dir = run_directory()
+    if run_dir:
+        # Ids are hex, so they cannot name a path outside the profiles directory
+        if not profile_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(run_dir, 'profiles', f'{profile_id}.folded')) as f:
+                return f.read()
+        except OSError:
+            return None
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
@@ -0,0 +1,171 @@
+"""
+Ollama Connection Management
+Shared keep-alive HTTP session and a background health monitor with a circuit breaker
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_POOL_SIZE = int(os.getenv('OLLAMA_POOL_SIZE', '10'))
+OLLAMA_HEALTH_INTERVAL = float(os.getenv('OLLAMA_HEALTH_INTERVAL', '15'))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv('OLLAMA_HEALTH_TIMEOUT', '2'))
+
+# Consecutive request failures that open the circuit, and how long it stays open before
+# a single trial request is let through
+OLLAMA_FAILURE_THRESHOLD = int(os.getenv('OLLAMA_FAILURE_THRESHOLD', '3'))
+OLLAMA_RESET_TIMEOUT = float(os.getenv('OLLAMA_RESET_TIMEOUT', '30'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_session: Optional[requests.Session] = None
+_monitors: Dict[str, 'HealthMonitor'] = {}
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide HTTP session; connections to Ollama are kept alive and reused"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=OLLAMA_POOL_SIZE, pool_maxsize=OLLAMA_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
+
+class HealthMonitor:
+    """
+    Cached availability of one Ollama host
+
+    A daemon thread probes /api/tags every interval seconds; it starts on first use in each
+    process, so a pre-fork server master never holds the thread or an open connection. Callers also report the outcome
+    of their own requests: after failure_threshold consecutive failures (or one failed probe)
+    the circuit opens and is_available() returns False without any network I/O. After
+    reset_timeout seconds one trial request is allowed; its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, host: str, session: Optional[requests.Session] = None,
+                 interval: float = OLLAMA_HEALTH_INTERVAL, failure_threshold: int = OLLAMA_FAILURE_THRESHOLD,
+                 reset_timeout: float = OLLAMA_RESET_TIMEOUT):
+        self.host = host
+        self.session = session or get_session()
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.models: Optional[List[str]] = None
+        self.last_checked: Optional[float] = None
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def start(self):
+        """Start the background probe thread if it is not running in this process"""
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='ollama-health', daemon=True)
+                self._thread.start()
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so a forked worker starts its own
+        if self._pid != os.getpid():
+            self.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_available(self) -> bool:
+        """Whether a request may be sent now; never blocks on the network"""
+        self._ensure_started()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Ollama at {self.host} is healthy again")
+            self.state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, trip: bool = False):
+        """Count a failed request; trip opens the circuit immediately"""
+        with self._lock:
+            self._failures += 1
+            if trip or self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Ollama at {self.host} is unavailable, circuit opened")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def check(self) -> bool:
+        """Probe the host once and update the circuit"""
+        try:
+            response = self.session.get(f"{self.host}/api/tags", timeout=OLLAMA_HEALTH_TIMEOUT)
+            healthy = response.status_code == 200
+            if healthy:
+                self.models = [model['name'] for model in response.json().get('models', [])]
+        except (requests.RequestException, ValueError) as e:
+            logger.debug(f"Ollama health probe failed: {e}")
+            healthy = False
+
+        self.last_checked = time.time()
+        if healthy:
+            self.record_success()
+        else:
+            self.record_failure(trip=True)
+        return healthy
+
+    def status(self) -> Dict:
+        self._ensure_started()
+        with self._lock:
+            return {
+                'host': self.host,
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'last_checked': self.last_checked,
+                'models': self.models
+            }
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.interval)
+
+
+def get_monitor(host: str) -> HealthMonitor:
+    """Shared health monitor for a host; its probe thread starts on first use"""
+    session = get_session()
+    with _lock:
+        monitor = _monitors.get(host)
+        if monitor is None:
+            monitor = HealthMonitor(host, session)
+            _monitors[host] = monitor
+    return monitor
@@ -3,15 +3,32 @@ Enhanced Ollama Integration Service
 Provides advanced AI-powered data generation capabilities
 """
 
+import asyncio
 import requests
 import json
+import os
+import queue
+import threading
 import time
 import logging
-from typing import List, Dict, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Any, Tuple
 from dataclasses import dataclass
 
+from columnar_engine import ColumnarEngine
+from json_stream import JSONArrayParser
+from sample_models import SampleModel, fit_sample_model
+from schema_index import SCHEMA_INDEX_FALLBACK_SCORE, SchemaIndex
+import metrics
+from llm_cache import LLMCache, cache_key, get_default_cache
+from ollama_client import get_monitor, get_session
+
 logger = logging.getLogger(__name__)
 
+# Default number of schema requests sent to Ollama at once by the batch methods
+OLLAMA_BATCH_CONCURRENCY = int(os.getenv('OLLAMA_BATCH_CONCURRENCY', '4'))
+
 @dataclass
 class FieldDefinition:
     name: str
@@ -21,31 +38,110 @@ class FieldDefinition:
     examples: Optional[List[str]] = None
 
 class OllamaService:
-    def __init__(self, host: str = "http://localhost:11434", model: str = "llama2"):
+    def __init__(self, host: str = "http://localhost:11434", model: str = "llama2",
+                 cache: Optional[LLMCache] = None, schema_index: Optional[SchemaIndex] = None):
         self.host = host
         self.model = model
-        self.available_models = []
-        self._load_available_models()
+        self.cache = cache or get_default_cache()
+        self.schema_index = schema_index
+        self.session = get_session()
+        self.health = get_monitor(host)
+        self._available_models: Optional[List[str]] = None
+        self._sample_engine = None
+    
+    @property
+    def available_models(self) -> List[str]:
+        """Models installed on the Ollama host, loaded on first use"""
+        if self._available_models is None:
+            self._load_available_models()
+        # Until the host has answered, only the configured model is known
+        return self._available_models or [self.model]
     
     def _load_available_models(self):
         """Load available Ollama models"""
+        # The health monitor already lists the models on every successful probe
+        if self.health.models is not None:
+            self._available_models = self.health.models
+            return
+        
+        if not self.is_available():
+            return
+        
         try:
-            response = requests.get(f"{self.host}/api/tags", timeout=10)
+            response = self.session.get(f"{self.host}/api/tags", timeout=10)
             if response.status_code == 200:
                 data = response.json()
-                self.available_models = [model['name'] for model in data.get('models', [])]
-                logger.info(f"Available models: {self.available_models}")
+                self._available_models = [model['name'] for model in data.get('models', [])]
+                logger.info(f"Available models: {self._available_models}")
         except Exception as e:
             logger.warning(f"Could not load available models: {e}")
-            self.available_models = [self.model]
     
     def is_available(self) -> bool:
-        """Check if Ollama service is available"""
+        """Cached availability from the health monitor; no network round-trip"""
+        return self.health.is_available()
+    
+    def _post_generate(self, payload: Dict[str, Any], timeout: int = 60, stream: bool = False) -> requests.Response:
+        """POST to /api/generate over the pooled session and report the outcome to the circuit breaker"""
+        operation = 'generate_stream' if stream else 'generate'
+        started = time.perf_counter()
         try:
-            response = requests.get(f"{self.host}/api/tags", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+            with metrics.phase('llm'):
+                response = self.session.post(f"{self.host}/api/generate", json=payload, timeout=timeout, stream=stream)
+        except requests.RequestException:
+            self.health.record_failure()
+            metrics.record_ollama(operation, 'connection_error')
+            raise
+        
+        if response.status_code >= 500:
+            self.health.record_failure()
+        else:
+            self.health.record_success()
+        # Streamed requests are timed by _stream_generate once the last fragment arrives
+        metrics.record_ollama(operation, 'ok' if response.status_code == 200 else 'http_error',
+                              None if stream else time.perf_counter() - started)
+        return response
+    
+    def _stream_generate(self, payload: Dict[str, Any], timeout: int = 60) -> Iterator[str]:
+        """
+        Yield response text fragments from a streaming /api/generate request
+        
+        Closing the generator closes the HTTP connection, which stops generation on the server.
+        """
+        started = time.perf_counter()
+        response = self._post_generate(dict(payload, stream=True), timeout=timeout, stream=True)
+        try:
+            if response.status_code != 200:
+                logger.error(f"Ollama returned HTTP {response.status_code}")
+                return
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('response'):
+                    yield chunk['response']
+                if chunk.get('done'):
+                    break
+        finally:
+            response.close()
+            metrics.OLLAMA_SECONDS.observe(time.perf_counter() - started, operation='generate_stream')
+    
+    def _stream_array(self, payload: Dict[str, Any], parser: JSONArrayParser, timeout: int = 60) -> Iterator[Any]:
+        """Yield items of the JSON array in a streamed response, stopping as soon as the array closes"""
+        # Waiting for fragments counts as LLM time, feeding them to the parser as parse time
+        fragments = metrics.timed_iter(self._stream_generate(payload, timeout), 'llm')
+        try:
+            for fragment in fragments:
+                with metrics.phase('parse'):
+                    items = parser.feed(fragment)
+                yield from items
+                if parser.complete:
+                    break
+        finally:
+            fragments.close()
+    
+    @staticmethod
+    def _is_field(field: Any) -> bool:
+        return isinstance(field, dict) and 'name' in field and 'type' in field and 'description' in field
     
     def generate_schema_from_request(self, user_request: str, context: Optional[str] = None) -> List[Dict]:
         """
@@ -58,41 +154,164 @@ class OllamaService:
         Returns:
             List of field definitions
         """
-        if not self.is_available():
-            logger.warning("Ollama not available, using fallback schema")
+        schema, _ = self._request_schema(user_request, context)
+        if schema is None:
             return self._generate_fallback_schema(user_request)
+        return schema
+    
+    def generate_schemas_batch(self, user_requests: List[str], context: Optional[str] = None,
+                               concurrency: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Generate schemas for many requests concurrently
         
-        prompt = self._build_schema_prompt(user_request, context)
+        Runs generate_schemas_async on its own event loop in a background thread, so it can be
+        consumed from synchronous code such as a streaming Flask response.
         
-        try:
-            response = requests.post(
-                f"{self.host}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "max_tokens": 2000
-                    }
-                },
-                timeout=60
-            )
+        Args:
+            user_requests: Descriptions of the desired data, one per schema
+            context: Additional context shared by all requests
+            concurrency: Maximum number of requests in flight at once
             
-            if response.status_code == 200:
-                result = response.json()
-                schema_text = result.get('response', '')
-                schema = self._parse_schema_response(schema_text)
-                
-                if schema:
-                    logger.info(f"Generated schema with {len(schema)} fields")
-                    return schema
+        Yields:
+            Results in completion order (see generate_schemas_async)
+        """
+        results: queue.Queue = queue.Queue()
+        
+        async def collect():
+            async for result in self.generate_schemas_async(user_requests, context, concurrency):
+                results.put(result)
+        
+        def run():
+            try:
+                asyncio.run(collect())
+            except Exception as e:
+                logger.error(f"Batch schema generation failed: {e}")
+            finally:
+                results.put(None)
+        
+        threading.Thread(target=run, name='ollama-batch', daemon=True).start()
+        while True:
+            result = results.get()
+            if result is None:
+                return
+            yield result
+    
+    async def generate_schemas_async(self, user_requests: List[str], context: Optional[str] = None,
+                                     concurrency: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate schemas for many requests concurrently
+        
+        Each request is sent over the pooled session from a worker thread, with at most
+        concurrency requests in flight. A request that fails or cannot be parsed falls back
+        to _generate_fallback_schema on its own without affecting the others.
+        
+        Yields:
+            Dicts with index, request, schema and source ("llm", "cache" or "fallback"),
+            in the order the requests finish
+        """
+        limit = max(1, concurrency or OLLAMA_BATCH_CONCURRENCY)
+        semaphore = asyncio.Semaphore(limit)
+        loop = asyncio.get_running_loop()
+        
+        with ThreadPoolExecutor(max_workers=limit, thread_name_prefix='ollama-request') as executor:
+            async def generate_one(index: int, user_request: str) -> Dict[str, Any]:
+                async with semaphore:
+                    try:
+                        schema, source = await loop.run_in_executor(
+                            executor, self._request_schema, user_request, context
+                        )
+                    except Exception as e:
+                        logger.error(f"Error generating schema {index} with Ollama: {e}")
+                        schema = None
+                if schema is None:
+                    schema, source = self._generate_fallback_schema(user_request), 'fallback'
+                return {'index': index, 'request': user_request, 'schema': schema, 'source': source}
             
+            tasks = [asyncio.create_task(generate_one(index, user_request))
+                     for index, user_request in enumerate(user_requests)]
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+    
+    def stream_schema_from_request(self, user_request: str, context: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Generate a schema, yielding each field as soon as the model has finished writing it
+        
+        The response is read from Ollama's token stream and the connection is closed as soon as
+        the top-level JSON array is complete, without waiting for any trailing text.
+        
+        Args:
+            user_request: User's description of desired data
+            context: Additional context about the data domain
+            
+        Yields:
+            Field definitions
+        """
+        produced = False
+        for field in self._iter_schema_fields(user_request, context, {}):
+            produced = True
+            yield field
+        
+        if not produced:
+            yield from self._generate_fallback_schema(user_request)
+    
+    def _request_schema(self, user_request: str,
+                        context: Optional[str] = None) -> Tuple[Optional[List[Dict]], str]:
+        """
+        Get a schema from the cache or from Ollama
+        
+        Returns:
+            (schema, source) where source is "cache" or "llm", or (None, "fallback") when
+            Ollama is unavailable or its response could not be used
+        """
+        outcome: Dict[str, str] = {}
+        fields = list(self._iter_schema_fields(user_request, context, outcome))
+        if 'source' not in outcome:
+            return None, 'fallback'
+        return fields, outcome['source']
+    
+    def _iter_schema_fields(self, user_request: str, context: Optional[str],
+                            outcome: Dict[str, str]) -> Iterator[Dict]:
+        """
+        Yield schema fields from the cache or from the Ollama token stream
+        
+        outcome["source"] is set to "cache" or "llm" once a complete schema has been produced;
+        it stays unset when Ollama is unavailable, fails, or returns no valid fields.
+        """
+        prompt = self._build_schema_prompt(user_request, context)
+        options = {
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "max_tokens": 2000
+        }
+        
+        # Repeated requests are answered from the cache without contacting Ollama
+        key = cache_key(prompt, self.model, options)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.info(f"Schema cache hit ({len(cached)} fields)")
+            yield from cached
+            outcome['source'] = 'cache'
+            return
+        
+        if not self.is_available():
+            logger.warning("Ollama not available, using fallback schema")
+            return
+        
+        parser = JSONArrayParser()
+        fields = []
+        try:
+            for field in self._stream_array({"model": self.model, "prompt": prompt, "options": options}, parser):
+                if self._is_field(field):
+                    fields.append(field)
+                    yield field
         except Exception as e:
             logger.error(f"Error generating schema with Ollama: {e}")
+            return
         
-        return self._generate_fallback_schema(user_request)
+        if parser.complete and fields:
+            logger.info(f"Generated schema with {len(fields)} fields")
+            self.cache.set(key, fields)
+            outcome['source'] = 'llm'
     
     def generate_data_samples(self, schema: List[Dict], num_samples: int = 5) -> List[Dict]:
         """
@@ -105,39 +324,64 @@ class OllamaService:
         Returns:
             List of sample records
         """
-        if not self.is_available():
-            return self._generate_fallback_samples(schema, num_samples)
+        return list(self.stream_data_samples(schema, num_samples))
+    
+    def stream_data_samples(self, schema: List[Dict], num_samples: int = 5) -> Iterator[Dict]:
+        """
+        Generate sample data, yielding each record as soon as the model has finished writing it
         
-        prompt = self._build_sample_data_prompt(schema, num_samples)
+        The connection is closed once num_samples records have arrived or the JSON array ends.
         
-        try:
-            response = requests.post(
-                f"{self.host}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.8,
-                        "top_p": 0.9
-                    }
-                },
-                timeout=60
-            )
+        Args:
+            schema: Field definitions
+            num_samples: Number of sample records to generate
             
-            if response.status_code == 200:
-                result = response.json()
-                samples_text = result.get('response', '')
-                samples = self._parse_samples_response(samples_text)
-                
-                if samples:
-                    logger.info(f"Generated {len(samples)} sample records")
-                    return samples
+        Yields:
+            Sample records
+        """
+        produced = 0
+        if self.is_available():
+            prompt = self._build_sample_data_prompt(schema, num_samples)
+            options = {
+                "temperature": 0.8,
+                "top_p": 0.9
+            }
+            
+            try:
+                for sample in self._stream_array({"model": self.model, "prompt": prompt, "options": options},
+                                                 JSONArrayParser()):
+                    if isinstance(sample, dict):
+                        produced += 1
+                        yield sample
+                        if produced >= num_samples:
+                            break
+            except Exception as e:
+                logger.error(f"Error generating samples with Ollama: {e}")
+        
+        if produced:
+            logger.info(f"Generated {produced} sample records")
+        else:
+            yield from self._generate_fallback_samples(schema, num_samples)
+    
+    def fit_sample_model(self, schema: List[Dict], num_samples: int = 20) -> SampleModel:
+        """
+        Fit per-column models from a small set of LLM-written samples
         
-        except Exception as e:
-            logger.error(f"Error generating samples with Ollama: {e}")
+        The model then generates any number of rows locally, with the value vocabularies,
+        numeric ranges and string shapes of the samples.
+        
+        Args:
+            schema: Field definitions
+            num_samples: Number of sample records to request from the model
+            
+        Returns:
+            Fitted SampleModel
+        """
+        if self._sample_engine is None:
+            self._sample_engine = ColumnarEngine()
         
-        return self._generate_fallback_samples(schema, num_samples)
+        samples = self.generate_data_samples(schema, num_samples)
+        return fit_sample_model(schema, samples, self._sample_engine)
     
     def validate_schema(self, schema: List[Dict]) -> Dict[str, Any]:
         """
@@ -155,9 +399,8 @@ class OllamaService:
         prompt = self._build_validation_prompt(schema)
         
         try:
-            response = requests.post(
-                f"{self.host}/api/generate",
-                json={
+            response = self._post_generate(
+                {
                     "model": self.model,
                     "prompt": prompt,
                     "stream": False,
@@ -172,7 +415,8 @@ class OllamaService:
             if response.status_code == 200:
                 result = response.json()
                 validation_text = result.get('response', '')
-                return self._parse_validation_response(validation_text)
+                with metrics.phase('parse'):
+                    return self._parse_validation_response(validation_text)
         
         except Exception as e:
             logger.error(f"Error validating schema with Ollama: {e}")
@@ -197,7 +441,7 @@ class OllamaService:
         prompt = f"""
 You are an expert data architect. Generate a comprehensive JSON schema for synthetic data generation based on the user's request.
 
-User Request: "{user_request}"{context_info}
+User Request: "{user_request.strip()}"{context_info}
 
 Available field types: {', '.join(available_types)}
 
@@ -287,51 +531,6 @@ Response Format (JSON):
 """
         return prompt
     
-    def _parse_schema_response(self, response_text: str) -> Optional[List[Dict]]:
-        """Parse schema from Ollama response"""
-        try:
-            # Find JSON array in response
-            start_idx = response_text.find('[')
-            end_idx = response_text.rfind(']') + 1
-            
-            if start_idx != -1 and end_idx > start_idx:
-                json_text = response_text[start_idx:end_idx]
-                schema = json.loads(json_text)
-                
-                # Validate schema structure
-                if isinstance(schema, list) and all(
-                    isinstance(field, dict) and 
-                    'name' in field and 
-                    'type' in field and 
-                    'description' in field
-                    for field in schema
-                ):
-                    return schema
-                    
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.error(f"Error parsing schema response: {e}")
-        
-        return None
-    
-    def _parse_samples_response(self, response_text: str) -> Optional[List[Dict]]:
-        """Parse sample data from Ollama response"""
-        try:
-            # Find JSON array in response
-            start_idx = response_text.find('[')
-            end_idx = response_text.rfind(']') + 1
-            
-            if start_idx != -1 and end_idx > start_idx:
-                json_text = response_text[start_idx:end_idx]
-                samples = json.loads(json_text)
-                
-                if isinstance(samples, list) and all(isinstance(sample, dict) for sample in samples):
-                    return samples
-                    
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.error(f"Error parsing samples response: {e}")
-        
-        return None
-    
     def _parse_validation_response(self, response_text: str) -> Dict[str, Any]:
         """Parse validation response from Ollama"""
         try:
@@ -353,6 +552,13 @@ Response Format (JSON):
     
     def _generate_fallback_schema(self, user_request: str) -> List[Dict]:
         """Generate basic schema when Ollama is not available"""
+        # The closest known-good schema beats the keyword rules below
+        if self.schema_index is not None:
+            match = self.schema_index.best_match(user_request, SCHEMA_INDEX_FALLBACK_SCORE)
+            if match:
+                logger.info(f"Using indexed schema '{match['prompt']}' as fallback (score {match['score']})")
+                return match['schema']
+        
         # Simple keyword-based schema generation
         keywords = user_request.lower()
         
@@ -406,35 +612,17 @@ Response Format (JSON):
     
     def _generate_fallback_samples(self, schema: List[Dict], num_samples: int) -> List[Dict]:
         """Generate basic sample data when Ollama is not available"""
-        from faker import Faker
-        import random
+        if self._sample_engine is None:
+            self._sample_engine = ColumnarEngine()
         
-        fake = Faker()
-        samples = []
+        # Shares compiled plans with the main data generator
+        fields = [{'name': field['name'], 'type': field.get('type', 'text')} for field in schema]
+        samples = self._sample_engine.generate_rows(fields, num_samples)
         
-        for _ in range(num_samples):
-            sample = {}
-            for field in schema:
-                field_type = field.get('type', 'text')
-                
-                if field_type == 'uuid':
-                    sample[field['name']] = str(uuid.uuid4())
-                elif field_type in ['first_name', 'last_name']:
-                    sample[field['name']] = getattr(fake, field_type)()
-                elif field_type == 'email':
-                    sample[field['name']] = fake.email()
-                elif field_type == 'decimal':
-                    sample[field['name']] = round(random.uniform(1.0, 1000.0), 2)
-                elif field_type == 'number':
-                    sample[field['name']] = random.randint(1, 1000)
-                elif field_type == 'boolean':
-                    sample[field['name']] = random.choice([True, False])
-                elif field_type == 'datetime':
-                    sample[field['name']] = fake.date_time().isoformat()
-                else:
-                    sample[field['name']] = f"sample_{field_type}_{random.randint(1, 100)}"
-            
-            samples.append(sample)
+        for sample in samples:
+            for name, value in sample.items():
+                if isinstance(value, datetime):
+                    sample[name] = value.isoformat()
         
         return samples
     
@@ -0,0 +1,178 @@
+"""
+Parallel Sharded Generation
+Splits large generation requests into shards and renders them in a process pool
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+import metrics
+from columnar_engine import SEEDED_REFERENCE_TIME, ColumnarEngine, column_to_list, compile_schema
+from serializers import iter_csv, iter_ndjson
+
+logger = logging.getLogger(__name__)
+
+# Default worker count for a request, and the most a single request may ask for
+DEFAULT_WORKERS = int(os.getenv('GENERATION_WORKERS', '1'))
+MAX_WORKERS = int(os.getenv('GENERATION_MAX_WORKERS', str(os.cpu_count() or 1)))
+
+# Requests smaller than this are generated in-process; sharding would only add overhead
+PARALLEL_MIN_ROWS = int(os.getenv('PARALLEL_MIN_ROWS', '100000'))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Value pools mapped (or built) inside a worker process, reused by every shard it runs
+_worker_pools: Dict[str, Any] = {}
+
+
+def resolve_workers(requested: Optional[int] = None) -> int:
+    """Clamp a per-request worker count to the deployment limit"""
+    workers = DEFAULT_WORKERS if requested is None else int(requested)
+    return max(1, min(workers, MAX_WORKERS))
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the shared process pool, starting it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn keeps workers independent of the threads running in the web server process
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f"Started generation process pool with {MAX_WORKERS} workers")
+        return _executor
+
+
+def shutdown_executor():
+    """Stop the shared process pool"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+
+
+def submit(executor: ProcessPoolExecutor, fn: Callable, *args: Any) -> Future:
+    """Run fn in the process pool; pass the future to collect() for its result"""
+    return executor.submit(_call_with_metrics, fn, *args)
+
+
+def collect(future: Future) -> Any:
+    """Result of a submitted call, adding the metrics the worker recorded for it to this process"""
+    result, deltas = future.result()
+    metrics.add_deltas(deltas)
+    return result
+
+
+def _call_with_metrics(fn: Callable, *args: Any) -> Tuple[Any, Dict[str, List]]:
+    result = fn(*args)
+    return result, metrics.drain_deltas()
+
+
+def plan_shards(num_rows: int, workers: int, shard_rows: Optional[int] = None) -> List[int]:
+    """Split num_rows into consecutive shard sizes"""
+    if num_rows <= 0:
+        return []
+    shard_rows = shard_rows or math.ceil(num_rows / workers)
+    full, remainder = divmod(num_rows, shard_rows)
+    return [shard_rows] * full + ([remainder] if remainder else [])
+
+
+def generate_shard(schema: List[Dict], num_rows: int, seed: Any, format_type: Union[str, Tuple[str, ...]],
+                   header: bool = False, offset: Optional[int] = None) -> Any:
+    """
+    Generate one shard in a worker process
+
+    Each shard gets its own Faker instance and NumPy generator, both seeded from the shard's seed.
+    Value pools are kept for the lifetime of the worker process so later shards skip the Faker cost.
+    When offset is given, seed is the dataset seed and the shard is rows [offset, offset + num_rows)
+    of that seeded dataset.
+
+    Returns:
+        CSV or NDJSON text for those formats, otherwise a mapping of field name to list of values.
+        A tuple of formats renders the same rows in each of them and returns a tuple.
+    """
+    if offset is not None:
+        engine = ColumnarEngine(pools=_worker_pools, reference_time=SEEDED_REFERENCE_TIME)
+        batches = engine.iter_range_batches(schema, seed, offset, num_rows)
+    else:
+        from faker import Faker
+        fake = Faker()
+        fake.seed_instance(int(seed.generate_state(1)[0]))
+        engine = ColumnarEngine(fake, np.random.default_rng(seed), pools=_worker_pools)
+        batches = engine.iter_batches(schema, num_rows)
+
+    if isinstance(format_type, tuple):
+        batches = list(batches)
+        return tuple(_render(batches, single, header) for single in format_type)
+    return _render(batches, format_type, header)
+
+
+def _render(batches, format_type: str, header: bool) -> Any:
+    if format_type == 'csv':
+        return ''.join(iter_csv(batches, header=header))
+    if format_type == 'ndjson':
+        return ''.join(iter_ndjson(batches))
+
+    columns: Dict[str, list] = {}
+    for batch in batches:
+        for name, column in batch.items():
+            columns.setdefault(name, []).extend(column_to_list(column))
+    return columns
+
+
+def iter_sharded(schema: List[Dict], num_rows: int, format_type: Union[str, Tuple[str, ...]], workers: int,
+                 shard_rows: Optional[int] = None, seed: Optional[int] = None,
+                 offset: int = 0, header: bool = True) -> Iterator[Any]:
+    """
+    Generate a dataset across the process pool
+
+    Shards are submitted with at most two per worker in flight and yielded in order. With a
+    seed, shards are row ranges of the seeded dataset starting at offset, so the output is
+    identical to generating the same range in a single process. Schemas with unique fields
+    always take the seeded path. Closing the generator early (a streaming client disconnecting)
+    cancels the shards that have not started and submits no more.
+    """
+    if seed is None and any(compile_schema(schema).unique):
+        # Unique columns are permutations over the whole dataset, which independent shards
+        # cannot share; a random dataset seed makes every shard a range of one dataset
+        seed = int(np.random.SeedSequence().generate_state(1)[0])
+    sizes = plan_shards(num_rows, workers, shard_rows)
+    seeds = np.random.SeedSequence().spawn(len(sizes)) if seed is None else [seed] * len(sizes)
+    executor = get_executor()
+    pending = deque()
+
+    try:
+        for index, (size, shard_seed) in enumerate(zip(sizes, seeds)):
+            if len(pending) >= 2 * workers:
+                yield collect(pending.popleft())
+            shard_offset = None if seed is None else offset
+            pending.append(submit(
+                executor, generate_shard, schema, size, shard_seed, format_type, header and index == 0, shard_offset
+            ))
+            offset += size
+
+        while pending:
+            yield collect(pending.popleft())
+    finally:
+        # Shards already running finish in their worker; their results are dropped
+        for future in pending:
+            future.cancel()
+
+
+def generate_columns_sharded(schema: List[Dict], num_rows: int, workers: int,
+                             seed: Optional[int] = None, offset: int = 0) -> Dict[str, list]:
+    """Generate a dataset across the process pool and concatenate the shard columns"""
+    columns: Dict[str, list] = {}
+    for shard in iter_sharded(schema, num_rows, 'columns', workers, seed=seed, offset=offset):
+        for name, values in shard.items():
+            columns.setdefault(name, []).extend(values)
+    return columns
@@ -0,0 +1,376 @@
+"""
+Relational Dataset Generation
+Generates linked tables in dependency order, filling foreign keys by sampling the parent key arrays
+"""
+
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from columnar_engine import DEFAULT_BATCH_ROWS, SEEDED_REFERENCE_TIME, ColumnarEngine, stable_seed
+from parallel_generation import collect, get_executor, submit
+from postgres_loader import sql_column_type
+from serializers import batch_rows, iter_csv, json_default
+
+logger = logging.getLogger(__name__)
+
+# Largest total row count, over all tables, that a relational request may produce
+RELATIONAL_MAX_ROWS = int(os.getenv('RELATIONAL_MAX_ROWS', '50000000'))
+
+RELATIONAL_FORMATS = ('ndjson', 'sql')
+
+# Children-per-parent distributions and the parameters they accept
+CARDINALITY_DISTRIBUTIONS = {
+    'fixed': ('count',),
+    'uniform': ('min', 'max'),
+    'poisson': ('mean', 'min', 'max'),
+    'zipf': ('a', 'min', 'max'),
+}
+
+# Heavy-tailed distributions are capped so a single parent cannot own an unbounded number of rows
+ZIPF_DEFAULT_MAX = 1000
+
+# Value pools built inside a worker process, reused by every slice it renders
+_worker_pools: Dict[str, Any] = {}
+
+
+@dataclass
+class ForeignKey:
+    """A column holding keys of a parent table"""
+    field: str
+    references: str
+    cardinality: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class TablePlan:
+    """One table of a relational schema"""
+    name: str
+    fields: List[Dict]
+    columns: List[str]
+    rows: Optional[int] = None
+    primary_key: Optional[str] = None
+    key_type: str = 'number'
+    foreign_keys: List[ForeignKey] = field(default_factory=list)
+
+
+@dataclass
+class RelationalPlan:
+    """Tables in dependency order, grouped into levels whose tables can be generated together"""
+    tables: List[TablePlan]
+    levels: List[List[str]]
+
+    def table(self, name: str) -> TablePlan:
+        return next(table for table in self.tables if table.name == name)
+
+
+def compile_relational(spec: Dict[str, Any]) -> RelationalPlan:
+    """
+    Validate a relational schema and order its tables
+
+    The spec is {"tables": [...]}, where each table has a name, fields, an optional primary_key
+    and optional foreign_keys of the form {"field", "references", "cardinality"}. A table either
+    sets rows or gets its row count from the one foreign key that declares a cardinality.
+
+    Raises:
+        ValueError: If the spec is malformed or its references form a cycle
+    """
+    tables = spec.get('tables') if isinstance(spec, dict) else None
+    if not tables:
+        raise ValueError('A relational schema needs a non-empty "tables" list')
+
+    plans: Dict[str, TablePlan] = {}
+    for table in tables:
+        plan = _compile_table(table)
+        if plan.name in plans:
+            raise ValueError(f'Duplicate table "{plan.name}"')
+        plans[plan.name] = plan
+
+    for plan in plans.values():
+        for foreign_key in plan.foreign_keys:
+            parent = plans.get(foreign_key.references)
+            if parent is None:
+                raise ValueError(f'{plan.name}.{foreign_key.field} references unknown table "{foreign_key.references}"')
+            if parent.primary_key is None:
+                raise ValueError(f'{plan.name}.{foreign_key.field} references "{parent.name}", which has no primary_key')
+
+    levels = _dependency_levels(plans)
+    ordered = [plans[name] for level in levels for name in level]
+    return RelationalPlan(ordered, levels)
+
+
+def _compile_table(table: Dict[str, Any]) -> TablePlan:
+    name = table.get('name')
+    if not name:
+        raise ValueError('Every table needs a name')
+    fields = list(table.get('fields', []))
+    declared = {item['name']: item.get('type', 'text') for item in fields}
+
+    primary_key = table.get('primary_key')
+    key_type = 'number'
+    if primary_key:
+        # uuid keys stay uuids; any other declared type becomes a 1-based integer sequence
+        key_type = 'uuid' if declared.get(primary_key) == 'uuid' else 'number'
+
+    foreign_keys = []
+    for spec in table.get('foreign_keys', []):
+        if not spec.get('field') or not spec.get('references'):
+            raise ValueError(f'Foreign keys of "{name}" need a field and the table they reference')
+        cardinality = spec.get('cardinality')
+        if cardinality is not None:
+            _check_cardinality(name, spec['field'], cardinality)
+        foreign_keys.append(ForeignKey(spec['field'], spec['references'], cardinality))
+
+    drivers = [foreign_key for foreign_key in foreign_keys if foreign_key.cardinality]
+    rows = table.get('rows')
+    if len(drivers) > 1:
+        raise ValueError(f'"{name}" can take its row count from only one foreign key cardinality')
+    if drivers and rows is not None:
+        raise ValueError(f'"{name}" gets its row count from {drivers[0].field}; remove "rows"')
+    if not drivers:
+        if rows is None:
+            raise ValueError(f'"{name}" needs "rows" or a foreign key with a cardinality')
+        rows = int(rows)
+        if rows < 0:
+            raise ValueError(f'"{name}" rows must not be negative')
+
+    # Key columns keep their declared position; undeclared ones come first
+    key_columns = ([primary_key] if primary_key else []) + [foreign_key.field for foreign_key in foreign_keys]
+    columns = [column for column in key_columns if column not in declared] + [item['name'] for item in fields]
+    value_fields = [item for item in fields if item['name'] not in key_columns]
+
+    return TablePlan(name, value_fields, columns, rows, primary_key, key_type, foreign_keys)
+
+
+def _check_cardinality(table: str, column: str, cardinality: Dict[str, Any]):
+    distribution = cardinality.get('distribution', 'uniform')
+    if distribution not in CARDINALITY_DISTRIBUTIONS:
+        raise ValueError(f'{table}.{column}: unknown cardinality distribution "{distribution}"; '
+                         f'use one of {", ".join(CARDINALITY_DISTRIBUTIONS)}')
+    required = {'fixed': 'count', 'poisson': 'mean', 'zipf': 'a'}.get(distribution)
+    if required and required not in cardinality:
+        raise ValueError(f'{table}.{column}: {distribution} cardinality needs "{required}"')
+    if distribution == 'zipf' and float(cardinality['a']) <= 1:
+        raise ValueError(f'{table}.{column}: zipf cardinality needs "a" greater than 1')
+
+
+def _dependency_levels(plans: Dict[str, TablePlan]) -> List[List[str]]:
+    """Group tables so that every table's parents are in an earlier level (Kahn's algorithm)"""
+    parents = {name: {foreign_key.references for foreign_key in plan.foreign_keys} for name, plan in plans.items()}
+    levels = []
+    done = set()
+    while len(done) < len(plans):
+        ready = [name for name in plans if name not in done and parents[name] <= done]
+        if not ready:
+            cycle = sorted(name for name in plans if name not in done)
+            raise ValueError(f'Foreign keys form a cycle between tables: {", ".join(cycle)}')
+        levels.append(ready)
+        done.update(ready)
+    return levels
+
+
+def sample_cardinality(cardinality: Dict[str, Any], parents: int, rng: np.random.Generator) -> np.ndarray:
+    """Number of child rows for each of parents parent rows"""
+    distribution = cardinality.get('distribution', 'uniform')
+    if distribution == 'fixed':
+        return np.full(parents, int(cardinality['count']), dtype=np.int64)
+    if distribution == 'uniform':
+        low = int(cardinality.get('min', 0))
+        high = int(cardinality.get('max', max(low, 1)))
+        return rng.integers(low, high + 1, size=parents)
+
+    if distribution == 'poisson':
+        counts = rng.poisson(float(cardinality['mean']), size=parents)
+        high = cardinality.get('max')
+    else:
+        counts = rng.zipf(float(cardinality['a']), size=parents)
+        high = cardinality.get('max', ZIPF_DEFAULT_MAX)
+    low = int(cardinality.get('min', 0))
+    return np.clip(counts, low, None if high is None else int(high)).astype(np.int64)
+
+
+@dataclass
+class TableKeys:
+    """Row count and key columns of a generated table"""
+    rows: int
+    columns: Dict[str, np.ndarray]
+    primary_key: Optional[str] = None
+
+    @property
+    def primary_keys(self) -> np.ndarray:
+        return self.columns[self.primary_key]
+
+
+def generate_keys(plan: RelationalPlan, seed: int, engine: Optional[ColumnarEngine] = None,
+                  max_rows: int = RELATIONAL_MAX_ROWS) -> Dict[str, TableKeys]:
+    """
+    Generate the primary and foreign key columns of every table
+
+    Levels are processed in order and the tables within a level concurrently. A child's row
+    count comes from its cardinality foreign key, whose column repeats each parent key by its
+    sampled child count; other foreign keys draw parent keys uniformly at random.
+
+    Raises:
+        ValueError: If the tables would hold more than max_rows rows in total
+    """
+    engine = engine or ColumnarEngine(reference_time=SEEDED_REFERENCE_TIME)
+    keys: Dict[str, TableKeys] = {}
+    total = 0
+
+    with ThreadPoolExecutor(max_workers=max(len(level) for level in plan.levels)) as executor:
+        for level in plan.levels:
+            tables = [plan.table(name) for name in level]
+            generated = executor.map(lambda table: _table_keys(table, keys, seed, engine, max_rows), tables)
+            for table, table_keys in zip(tables, generated):
+                keys[table.name] = table_keys
+                total += table_keys.rows
+            if total > max_rows:
+                raise ValueError(f'The relational dataset would have {total} rows; the limit is {max_rows}')
+
+    return keys
+
+
+def _table_keys(table: TablePlan, keys: Dict[str, TableKeys], seed: int, engine: ColumnarEngine,
+                max_rows: int) -> TableKeys:
+    rng = np.random.default_rng([seed, stable_seed(table.name)])
+    columns: Dict[str, np.ndarray] = {}
+    rows = table.rows
+
+    driver = next((foreign_key for foreign_key in table.foreign_keys if foreign_key.cardinality), None)
+    if driver is not None:
+        parent = keys[driver.references]
+        counts = sample_cardinality(driver.cardinality, parent.rows, rng)
+        rows = int(counts.sum())
+        if rows > max_rows:
+            raise ValueError(f'"{table.name}" would have {rows} rows; the limit is {max_rows}')
+        # Children are grouped by parent, the way rows arrive in a real system
+        columns[driver.field] = np.repeat(parent.primary_keys, counts)
+
+    engine.check_unique(table.fields, rows)
+    if table.primary_key:
+        if table.key_type == 'uuid':
+            columns[table.primary_key] = np.asarray(engine.generate_column('uuid', rows, rng))
+        else:
+            columns[table.primary_key] = np.arange(1, rows + 1, dtype=np.int64)
+
+    for foreign_key in table.foreign_keys:
+        if foreign_key is driver:
+            continue
+        parent = keys[foreign_key.references]
+        if parent.rows == 0 and rows:
+            raise ValueError(f'{table.name}.{foreign_key.field} references "{foreign_key.references}", which has no rows')
+        columns[foreign_key.field] = parent.primary_keys[rng.integers(0, parent.rows, size=rows)]
+
+    return TableKeys(rows, columns, table.primary_key)
+
+
+def render_slice(table: TablePlan, key_columns: Dict[str, np.ndarray], seed: int, offset: int,
+                 num_rows: int, format_type: str, engine: Optional[ColumnarEngine] = None) -> str:
+    """
+    Render rows [offset, offset + num_rows) of a table
+
+    Value fields are rows of the table's seeded dataset, so a slice renders identically in any
+    process; key_columns holds the matching slice of the key columns.
+    """
+    if engine is None:
+        engine = ColumnarEngine(pools=_worker_pools, reference_time=SEEDED_REFERENCE_TIME)
+    values = engine.generate_range(table.fields, stable_seed(f'{seed}:{table.name}'), offset, num_rows) if table.fields else {}
+    batch = {name: key_columns[name] if name in key_columns else values[name] for name in table.columns}
+
+    if format_type == 'sql':
+        return ''.join(iter_csv([batch], header=False))
+
+    encoder = json.JSONEncoder(default=json_default)
+    names = list(batch)
+    lines = [encoder.encode({'table': table.name, 'row': dict(zip(names, row))}) for row in batch_rows(batch)]
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def iter_relational(plan: RelationalPlan, keys: Dict[str, TableKeys], seed: int, format_type: str = 'ndjson',
+                    workers: int = 1, batch_rows: int = DEFAULT_BATCH_ROWS,
+                    engine: Optional[ColumnarEngine] = None) -> Iterator[str]:
+    """
+    Stream every table of a relational dataset, parents before children
+
+    ndjson yields one {"table", "row"} object per line. sql yields a psql script that creates
+    the tables with their primary and foreign keys and loads each one with COPY ... FROM stdin.
+    With several workers, slices of all tables are rendered in the generation process pool with
+    at most two per worker in flight, so the next table is already generating while the current
+    one streams.
+    """
+    if format_type not in RELATIONAL_FORMATS:
+        raise ValueError(f'Relational output supports {", ".join(RELATIONAL_FORMATS)}')
+
+    if format_type == 'sql':
+        yield 'BEGIN;\n\n' + ''.join(create_table_sql(table, plan) + '\n' for table in plan.tables) + '\n'
+
+    slices = []
+    for table in plan.tables:
+        rows = keys[table.name].rows
+        starts = list(range(0, rows, batch_rows))
+        for index, start in enumerate(starts):
+            slices.append((table, start, min(batch_rows, rows - start), index == 0, index == len(starts) - 1))
+
+    pending = deque()
+    executor = get_executor() if workers > 1 else None
+    for table, start, size, first, last in slices:
+        key_columns = {name: column[start:start + size] for name, column in keys[table.name].columns.items()}
+        if executor is None:
+            chunk = render_slice(table, key_columns, seed, start, size, format_type, engine)
+            yield from _framed(table, chunk, first, last, format_type)
+            continue
+        if len(pending) >= 2 * workers:
+            yield from _framed(*pending.popleft())
+        pending.append((table, submit(executor, render_slice, table, key_columns, seed, start, size, format_type),
+                        first, last, format_type))
+
+    while pending:
+        yield from _framed(*pending.popleft())
+
+    if format_type == 'sql':
+        yield 'COMMIT;\n'
+
+
+def _framed(table: TablePlan, chunk: Any, first: bool, last: bool, format_type: str) -> Iterator[str]:
+    """A rendered slice, wrapped in its table's COPY block for sql output"""
+    if not isinstance(chunk, str):
+        chunk = collect(chunk)
+    if format_type == 'sql' and first:
+        yield f'COPY {quote_identifier(table.name)} ({", ".join(map(quote_identifier, table.columns))}) FROM stdin WITH (FORMAT csv);\n'
+    yield chunk
+    if format_type == 'sql' and last:
+        yield '\\.\n\n'
+
+
+def quote_identifier(name: str) -> str:
+    """Double-quoted SQL identifier"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def key_sql_type(key_type: str) -> str:
+    return 'UUID' if key_type == 'uuid' else 'BIGINT'
+
+
+def create_table_sql(table: TablePlan, plan: RelationalPlan) -> str:
+    """CREATE TABLE statement with the table's primary key and foreign key constraints"""
+    types = {item['name']: sql_column_type(item.get('type', 'text')) for item in table.fields}
+    if table.primary_key:
+        types[table.primary_key] = key_sql_type(table.key_type)
+    for foreign_key in table.foreign_keys:
+        types[foreign_key.field] = key_sql_type(plan.table(foreign_key.references).key_type)
+
+    lines = [f'    {quote_identifier(name)} {types[name]}' for name in table.columns]
+    if table.primary_key:
+        lines.append(f'    PRIMARY KEY ({quote_identifier(table.primary_key)})')
+    for foreign_key in table.foreign_keys:
+        parent = plan.table(foreign_key.references)
+        lines.append(f'    FOREIGN KEY ({quote_identifier(foreign_key.field)}) '
+                     f'REFERENCES {quote_identifier(parent.name)} ({quote_identifier(parent.primary_key)})')
+    return f'CREATE TABLE {quote_identifier(table.name)} (\n' + ',\n'.join(lines) + '\n);\n'
@@ -0,0 +1,444 @@
+"""
+Analytics Rollups
+Hourly and daily chat_logs / ai_ratings aggregates with mergeable response-time sketches, maintained incrementally
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+# Relative error of response-time quantiles. Stored sketches keep the accuracy they were built
+# with; sketches of different accuracies cannot be merged.
+ROLLUP_SKETCH_ACCURACY = float(os.getenv('ROLLUP_SKETCH_ACCURACY', '0.01'))
+
+# Rows are rolled up once they are this old, so rows still in a writer queue or an open
+# transaction when the watermark passes their timestamp are not skipped
+ROLLUP_LAG_SECONDS = int(os.getenv('ROLLUP_LAG_SECONDS', '300'))
+
+# Reads start a background refresh when the last refresh in this process is older than this
+ROLLUP_REFRESH_SECONDS = int(os.getenv('ROLLUP_REFRESH_SECONDS', '60'))
+
+# History rolled up per transaction while catching up
+ROLLUP_STEP = timedelta(days=int(os.getenv('ROLLUP_STEP_DAYS', '7')))
+
+# Largest range one read may cover, in buckets
+ROLLUP_MAX_BUCKETS = int(os.getenv('ROLLUP_MAX_BUCKETS', '2000'))
+
+GRANULARITIES = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+# Range returned when a read gives no start
+DEFAULT_RANGES = {'hour': timedelta(days=1), 'day': timedelta(days=30)}
+
+ROLLUP_DDL = '''
+CREATE TABLE IF NOT EXISTS analytics_rollups (
+    granularity VARCHAR(4) NOT NULL CHECK (granularity IN ('hour', 'day')),
+    bucket_start TIMESTAMP NOT NULL,
+    chats INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    thumbs_up INTEGER NOT NULL DEFAULT 0,
+    thumbs_down INTEGER NOT NULL DEFAULT 0,
+    response_time_count INTEGER NOT NULL DEFAULT 0,
+    response_time_sum BIGINT NOT NULL DEFAULT 0,
+    response_time_min INTEGER,
+    response_time_max INTEGER,
+    response_time_sketch JSONB,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (granularity, bucket_start)
+);
+CREATE TABLE IF NOT EXISTS analytics_rollup_state (
+    name VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+'''
+
+
+class LatencySketch:
+    """
+    Mergeable quantile sketch with bounded relative error (DDSketch)
+
+    A value v > 0 is counted in bin ceil(log_gamma(v)) with gamma = (1 + a) / (1 - a), so every
+    value in a bin is within relative error a of the bin's representative value. Sketches merge
+    by adding bin counts: the quantiles of any set of buckets come from merging their sketches,
+    without the raw values.
+    """
+
+    def __init__(self, accuracy: float = ROLLUP_SKETCH_ACCURACY, bins: Optional[Dict[int, int]] = None,
+                 zero: int = 0):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.bins: Dict[int, int] = dict(bins or {})
+        # Values <= 0 have no logarithm and are counted separately
+        self.zero = zero
+
+    @property
+    def count(self) -> int:
+        return self.zero + sum(self.bins.values())
+
+    def index(self, value: float) -> int:
+        return math.ceil(math.log(value) / math.log(self.gamma))
+
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            self.zero += count
+        else:
+            self.add_bin(self.index(value), count)
+
+    def add_bin(self, index: int, count: int):
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def merge(self, other: 'LatencySketch'):
+        if other.accuracy != self.accuracy:
+            raise ValueError(f'Cannot merge sketches of accuracy {self.accuracy} and {other.accuracy}')
+        self.zero += other.zero
+        for index, count in other.bins.items():
+            self.add_bin(index, count)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q (0-1), or None for an empty sketch"""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        cumulative = self.zero
+        if rank < cumulative:
+            return 0.0
+        for index in sorted(self.bins):
+            cumulative += self.bins[index]
+            if cumulative > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'accuracy': self.accuracy, 'zero': self.zero, 'bins': {str(index): count for index, count in self.bins.items()}}
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]]) -> 'LatencySketch':
+        if not data:
+            return cls()
+        return cls(data['accuracy'], {int(index): count for index, count in data['bins'].items()}, data['zero'])
+
+
+@dataclass
+class RollupBucket:
+    """Aggregates of one hour or day; merging two buckets gives the aggregates of both"""
+    chats: int = 0
+    successes: int = 0
+    thumbs_up: int = 0
+    thumbs_down: int = 0
+    response_time_count: int = 0
+    response_time_sum: int = 0
+    response_time_min: Optional[int] = None
+    response_time_max: Optional[int] = None
+    sketch: LatencySketch = field(default_factory=LatencySketch)
+
+    def merge(self, other: 'RollupBucket'):
+        self.chats += other.chats
+        self.successes += other.successes
+        self.thumbs_up += other.thumbs_up
+        self.thumbs_down += other.thumbs_down
+        self.response_time_count += other.response_time_count
+        self.response_time_sum += other.response_time_sum
+        self.response_time_min = _optional(min, self.response_time_min, other.response_time_min)
+        self.response_time_max = _optional(max, self.response_time_max, other.response_time_max)
+        self.sketch.merge(other.sketch)
+
+    def to_dict(self) -> Dict[str, Any]:
+        ratings = self.thumbs_up + self.thumbs_down
+        return {
+            'chats': self.chats,
+            'successes': self.successes,
+            'success_rate': self.successes / self.chats if self.chats else None,
+            'thumbs_up': self.thumbs_up,
+            'thumbs_down': self.thumbs_down,
+            'thumbs_up_ratio': self.thumbs_up / ratings if ratings else None,
+            'response_time_ms': {
+                'count': self.response_time_count,
+                'mean': self.response_time_sum / self.response_time_count if self.response_time_count else None,
+                'min': self.response_time_min,
+                'max': self.response_time_max,
+                'p50': _rounded(self.sketch.quantile(0.5)),
+                'p95': _rounded(self.sketch.quantile(0.95))
+            }
+        }
+
+
+def _optional(function, a: Optional[int], b: Optional[int]) -> Optional[int]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return function(a, b)
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 1)
+
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    if granularity == 'day':
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _collect(cursor, start: datetime, end: datetime) -> Dict[datetime, RollupBucket]:
+    """Hourly aggregates of the chat_logs and ai_ratings rows with timestamps in [start, end)"""
+    hours: Dict[datetime, RollupBucket] = {}
+
+    cursor.execute(
+        """SELECT date_trunc('hour', timestamp), COUNT(*), COUNT(*) FILTER (WHERE success),
+                  COUNT(response_time_ms), COALESCE(SUM(response_time_ms), 0), MIN(response_time_ms), MAX(response_time_ms)
+           FROM chat_logs WHERE timestamp >= %s AND timestamp < %s GROUP BY 1""",
+        (start, end)
+    )
+    for hour, chats, successes, count, total, low, high in cursor.fetchall():
+        hours[hour] = RollupBucket(chats, successes, 0, 0, count, int(total), low, high)
+
+    # Sketch bins are computed by the database, so only (hour, bin, count) rows are transferred
+    gamma = LatencySketch().gamma
+    cursor.execute(
+        """SELECT date_trunc('hour', timestamp),
+                  CASE WHEN response_time_ms > 0 THEN CEIL(LN(response_time_ms) / LN(%s))::int END, COUNT(*)
+           FROM chat_logs WHERE timestamp >= %s AND timestamp < %s AND response_time_ms IS NOT NULL GROUP BY 1, 2""",
+        (gamma, start, end)
+    )
+    for hour, index, count in cursor.fetchall():
+        if index is None:
+            hours[hour].sketch.zero += count
+        else:
+            hours[hour].sketch.add_bin(index, count)
+
+    cursor.execute(
+        """SELECT date_trunc('hour', timestamp), COUNT(*) FILTER (WHERE rating = 'thumbs_up'),
+                  COUNT(*) FILTER (WHERE rating = 'thumbs_down')
+           FROM ai_ratings WHERE timestamp >= %s AND timestamp < %s GROUP BY 1""",
+        (start, end)
+    )
+    for hour, thumbs_up, thumbs_down in cursor.fetchall():
+        bucket = hours.setdefault(hour, RollupBucket())
+        bucket.thumbs_up += thumbs_up
+        bucket.thumbs_down += thumbs_down
+    return hours
+
+
+def _apply(cursor, hours: Dict[datetime, RollupBucket]):
+    """Merge hourly deltas into the stored hour and day buckets"""
+    deltas: Dict[Tuple[str, datetime], RollupBucket] = {}
+    for hour, delta in hours.items():
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(hour, granularity))
+            deltas.setdefault(key, RollupBucket()).merge(delta)
+    if not deltas:
+        return
+
+    stored = {}
+    cursor.execute('SELECT * FROM analytics_rollups WHERE (granularity, bucket_start) IN %s FOR UPDATE',
+                   (tuple(deltas),))
+    for row in cursor.fetchall():
+        stored[(row[0], row[1])] = _from_row(row)
+
+    values = []
+    for key, delta in deltas.items():
+        bucket = stored.get(key, RollupBucket())
+        bucket.merge(delta)
+        values.append(key + (bucket.chats, bucket.successes, bucket.thumbs_up, bucket.thumbs_down,
+                             bucket.response_time_count, bucket.response_time_sum, bucket.response_time_min,
+                             bucket.response_time_max, json.dumps(bucket.sketch.to_json())))
+    execute_values(
+        cursor,
+        """INSERT INTO analytics_rollups (granularity, bucket_start, chats, successes, thumbs_up, thumbs_down,
+               response_time_count, response_time_sum, response_time_min, response_time_max, response_time_sketch)
+           VALUES %s
+           ON CONFLICT (granularity, bucket_start) DO UPDATE SET
+               chats = EXCLUDED.chats, successes = EXCLUDED.successes, thumbs_up = EXCLUDED.thumbs_up,
+               thumbs_down = EXCLUDED.thumbs_down, response_time_count = EXCLUDED.response_time_count,
+               response_time_sum = EXCLUDED.response_time_sum, response_time_min = EXCLUDED.response_time_min,
+               response_time_max = EXCLUDED.response_time_max, response_time_sketch = EXCLUDED.response_time_sketch,
+               updated_at = NOW()""",
+        values
+    )
+
+
+def _from_row(row: Tuple) -> RollupBucket:
+    sketch = row[10]
+    if isinstance(sketch, str):
+        sketch = json.loads(sketch)
+    return RollupBucket(row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9], LatencySketch.from_json(sketch))
+
+
+def refresh_rollups(dsn: str, now: Optional[datetime] = None, rebuild: bool = False) -> Dict[str, Any]:
+    """
+    Roll up rows added since the watermark
+
+    Each step covers at most ROLLUP_STEP of history in one transaction: it aggregates the rows
+    in [watermark, step end) by hour, merges them into the stored hour and day buckets and
+    advances the watermark, so every row is counted exactly once. Only one process refreshes at
+    a time; the others return immediately with skipped set.
+
+    Rows inserted with a timestamp already behind the watermark (backfills) are not counted;
+    rebuild drops the stored rollups and rolls up the whole history again. Buckets of
+    chat_logs partitions dropped by retention are lost on rebuild.
+
+    Returns:
+        The new watermark, the number of steps taken and whether the refresh was skipped
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=ROLLUP_LAG_SECONDS)
+    steps = 0
+    ensure_tables(dsn)
+    conn = psycopg2.connect(dsn)
+    try:
+        while True:
+            with conn:
+                with conn.cursor() as cursor:
+                    cursor.execute('SELECT pg_try_advisory_xact_lock(hashtext(%s))', ('analytics_rollups',))
+                    if not cursor.fetchone()[0]:
+                        return {'watermark': None, 'steps': steps, 'skipped': True}
+                    if rebuild:
+                        cursor.execute('DELETE FROM analytics_rollups')
+                        cursor.execute('DELETE FROM analytics_rollup_state')
+                        rebuild = False
+
+                    cursor.execute("SELECT watermark FROM analytics_rollup_state WHERE name = 'chat_logs'")
+                    row = cursor.fetchone()
+                    if row is None:
+                        # First run starts at the oldest row of either table
+                        cursor.execute('SELECT LEAST((SELECT MIN(timestamp) FROM chat_logs), '
+                                       '(SELECT MIN(timestamp) FROM ai_ratings))')
+                        earliest = cursor.fetchone()[0]
+                        start = cutoff if earliest is None else bucket_start(earliest, 'hour')
+                    else:
+                        start = row[0]
+                    end = min(cutoff, start + ROLLUP_STEP)
+
+                    if end > start:
+                        _apply(cursor, _collect(cursor, start, end))
+                        steps += 1
+                    else:
+                        end = start
+                    cursor.execute(
+                        """INSERT INTO analytics_rollup_state (name, watermark) VALUES ('chat_logs', %s)
+                           ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = NOW()""",
+                        (end,)
+                    )
+            if end >= cutoff:
+                return {'watermark': end.isoformat(), 'steps': steps, 'skipped': False}
+    finally:
+        conn.close()
+
+
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+
+def ensure_tables(dsn: str):
+    """Create the rollup tables once per process when database/schema.sql has not"""
+    global _tables_ready
+    if _tables_ready:
+        return
+    with _tables_lock:
+        if _tables_ready:
+            return
+        conn = psycopg2.connect(dsn)
+        try:
+            with conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(ROLLUP_DDL)
+        finally:
+            conn.close()
+        _tables_ready = True
+
+
+_last_refresh = 0.0
+_refresh_thread: Optional[threading.Thread] = None
+_refresh_lock = threading.Lock()
+
+
+def refresh_in_background(dsn: str) -> bool:
+    """
+    Start a refresh in a background thread unless this process started one within ROLLUP_REFRESH_SECONDS
+
+    Reads never wait for the catch-up after a gap; they serve the stored buckets up to the
+    watermark while the refresh runs.
+
+    Returns:
+        Whether a refresh is running in this process
+    """
+    global _last_refresh, _refresh_thread
+    with _refresh_lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return True
+        if time.monotonic() - _last_refresh < ROLLUP_REFRESH_SECONDS:
+            return False
+        _last_refresh = time.monotonic()
+        _refresh_thread = threading.Thread(target=_refresh_logged, args=(dsn,), name='rollup-refresh', daemon=True)
+        _refresh_thread.start()
+        return True
+
+
+def _refresh_logged(dsn: str):
+    try:
+        result = refresh_rollups(dsn)
+        logger.info(f"Rollup refresh took {result['steps']} steps, watermark {result['watermark']}")
+    except psycopg2.Error as e:
+        logger.warning(f"Rollup refresh failed: {e}")
+
+
+def load_rollups(dsn: str, granularity: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    """
+    Stored buckets in [start, end) and their merged summary
+
+    Cost is proportional to the number of buckets in the range, not to the rows behind them.
+    Buckets without any chats or ratings are omitted. stale is set when the watermark is more
+    than ROLLUP_REFRESH_SECONDS behind what a refresh would roll up now.
+
+    Raises:
+        ValueError: For an unknown granularity or a range of more than ROLLUP_MAX_BUCKETS buckets
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of {", ".join(GRANULARITIES)}')
+    if end <= start:
+        raise ValueError('end must be after start')
+    if (end - start) / GRANULARITIES[granularity] > ROLLUP_MAX_BUCKETS:
+        raise ValueError(f'At most {ROLLUP_MAX_BUCKETS} buckets per request')
+
+    ensure_tables(dsn)
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT * FROM analytics_rollups WHERE granularity = %s AND bucket_start >= %s '
+                               'AND bucket_start < %s ORDER BY bucket_start', (granularity, start, end))
+                rows = cursor.fetchall()
+                cursor.execute("SELECT watermark FROM analytics_rollup_state WHERE name = 'chat_logs'")
+                state = cursor.fetchone()
+    finally:
+        conn.close()
+
+    summary = RollupBucket()
+    buckets: List[Dict[str, Any]] = []
+    for row in rows:
+        bucket = _from_row(row)
+        summary.merge(bucket)
+        buckets.append({'bucket_start': row[1].isoformat(), **bucket.to_dict()})
+    watermark = state[0] if state else None
+    behind = datetime.utcnow() - timedelta(seconds=ROLLUP_LAG_SECONDS + ROLLUP_REFRESH_SECONDS)
+    return {
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'watermark': watermark.isoformat() if watermark else None,
+        'stale': watermark is None or watermark < behind,
+        'buckets': buckets,
+        'summary': summary.to_dict()
+    }
@@ -0,0 +1,291 @@
+"""
+Sample-Fitted Column Models
+Learns lightweight per-column models from a few example records and samples them at local-generator speed
+"""
+
+import logging
+import re
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from columnar_engine import FAKER_PROVIDERS, NATIVE_GENERATORS, ColumnarEngine
+
+logger = logging.getLogger(__name__)
+
+# A string column is treated as categorical when at most this share of its values are distinct
+CATEGORICAL_MAX_DISTINCT_RATIO = 0.6
+
+# Types whose values carry no domain meaning worth learning; they use the engine's generators
+ENGINE_TYPES = {'uuid', 'ip_address', 'mac_address'}
+
+_TOKEN = re.compile(r'[A-Za-z]+|[0-9]+|[^A-Za-z0-9]+')
+_DIGITS = np.array(list('0123456789'))
+
+
+class CategoricalModel:
+    """Observed values resampled with their observed frequencies"""
+
+    kind = 'categorical'
+
+    def __init__(self, values: List[Any]):
+        counts = Counter(values)
+        self.values = np.empty(len(counts), dtype=object)
+        self.values[:] = list(counts)
+        weights = np.array(list(counts.values()), dtype=float)
+        self.weights = weights / weights.sum()
+
+    def sample(self, rng: np.random.Generator, num_rows: int) -> np.ndarray:
+        return self.values[rng.choice(len(self.values), size=num_rows, p=self.weights)]
+
+    def describe(self) -> Dict[str, Any]:
+        return {'kind': self.kind, 'values': len(self.values)}
+
+
+class NumericModel:
+    """Normal distribution fitted to the samples, clipped to the observed range"""
+
+    kind = 'numeric'
+
+    def __init__(self, values: List[float]):
+        data = np.asarray(values, dtype=float)
+        self.low = float(data.min())
+        self.high = float(data.max())
+        self.mean = float(data.mean())
+        self.std = float(data.std())
+        self.integer = all(isinstance(value, int) for value in values)
+        self.decimals = max((_decimal_places(value) for value in values), default=0)
+
+    def sample(self, rng: np.random.Generator, num_rows: int) -> np.ndarray:
+        if self.std > 0:
+            values = np.clip(rng.normal(self.mean, self.std, size=num_rows), self.low, self.high)
+        else:
+            values = np.full(num_rows, self.mean)
+        if self.integer:
+            return np.rint(values).astype(np.int64)
+        return np.round(values, self.decimals)
+
+    def describe(self) -> Dict[str, Any]:
+        return {'kind': self.kind, 'min': self.low, 'max': self.high, 'mean': round(self.mean, 4),
+                'std': round(self.std, 4), 'integer': self.integer}
+
+
+class TemporalModel:
+    """Dates or timestamps drawn uniformly from the observed range"""
+
+    kind = 'temporal'
+
+    def __init__(self, values: np.ndarray, unit: str):
+        self.unit = unit
+        self.low = values.min()
+        self.high = values.max()
+
+    def sample(self, rng: np.random.Generator, num_rows: int) -> np.ndarray:
+        span = int((self.high - self.low).astype(np.int64))
+        values = self.low + rng.integers(0, span + 1, size=num_rows).astype(f'timedelta64[{self.unit}]')
+        return values.astype(str) if self.unit == 'D' else values.astype('datetime64[us]')
+
+    def describe(self) -> Dict[str, Any]:
+        return {'kind': self.kind, 'min': str(self.low), 'max': str(self.high)}
+
+
+class TemplateModel:
+    """
+    Strings that share a token structure, such as "ORD-2024-00017" or "Jane Smith"
+
+    Tokens that are the same in every sample are kept as literals, digit runs are filled with
+    random digits of an observed length, and other tokens are drawn from the values observed at
+    that position, so samples recombine into new but plausible strings.
+    """
+
+    kind = 'template'
+
+    def __init__(self, tokenized: List[List[str]]):
+        self.parts = []
+        for position in zip(*tokenized):
+            distinct = set(position)
+            if len(distinct) == 1:
+                self.parts.append(('literal', position[0]))
+            elif all(token.isdigit() for token in position):
+                self.parts.append(('digits', sorted({len(token) for token in position})))
+            else:
+                self.parts.append(('choice', CategoricalModel(list(position))))
+
+    @staticmethod
+    def fits(tokenized: List[List[str]]) -> bool:
+        """Whether every sample has the same token structure"""
+        shapes = {tuple(_token_class(token) for token in tokens) for tokens in tokenized}
+        return len(shapes) == 1
+
+    def sample(self, rng: np.random.Generator, num_rows: int) -> List[str]:
+        columns = []
+        for kind, part in self.parts:
+            if kind == 'literal':
+                columns.append([part] * num_rows)
+            elif kind == 'digits':
+                columns.append(_random_digits(rng, num_rows, part))
+            else:
+                columns.append(part.sample(rng, num_rows).tolist())
+        return [''.join(row) for row in zip(*columns)]
+
+    def describe(self) -> Dict[str, Any]:
+        template = ''.join(part if kind == 'literal' else ('{digits}' if kind == 'digits' else '{choice}')
+                           for kind, part in self.parts)
+        return {'kind': self.kind, 'template': template}
+
+
+class EngineModel:
+    """Values from the columnar engine's generator for the field type"""
+
+    kind = 'engine'
+
+    def __init__(self, field_type: str, engine: ColumnarEngine):
+        self.field_type = field_type
+        self.engine = engine
+
+    def sample(self, rng: np.random.Generator, num_rows: int):
+        return self.engine.generate_column(self.field_type, num_rows, rng)
+
+    def describe(self) -> Dict[str, Any]:
+        return {'kind': self.kind, 'type': self.field_type}
+
+
+class SampleModel:
+    """
+    Per-column models fitted from example records
+
+    Columns are sampled independently; a column that was null in some samples is null in about
+    the same share of generated rows.
+    """
+
+    def __init__(self, names: List[str], columns: Dict[str, Any], null_rates: Dict[str, float],
+                 sample_count: int):
+        self.names = names
+        self.columns = columns
+        self.null_rates = null_rates
+        self.sample_count = sample_count
+
+    def generate_columns(self, num_rows: int, rng: np.random.Generator) -> Dict[str, Any]:
+        """Generate num_rows rows as a mapping of field name to column"""
+        columns = {}
+        for name in self.names:
+            column = self.columns[name].sample(rng, num_rows)
+            null_rate = self.null_rates[name]
+            if null_rate > 0:
+                column = np.array(column, dtype=object)
+                column[rng.random(num_rows) < null_rate] = None
+            columns[name] = column
+        return columns
+
+    def iter_batches(self, num_rows: int, batch_rows: int, rng: np.random.Generator) -> Iterator[Dict[str, Any]]:
+        """Generate num_rows rows as consecutive column batches"""
+        for start in range(0, num_rows, batch_rows):
+            yield self.generate_columns(min(batch_rows, num_rows - start), rng)
+
+    def describe(self) -> Dict[str, Any]:
+        """Summary of the fitted column models"""
+        summary = {}
+        for name in self.names:
+            summary[name] = self.columns[name].describe()
+            summary[name]['null_rate'] = round(self.null_rates[name], 4)
+        return summary
+
+
+def fit_sample_model(schema: List[Dict], samples: List[Dict], engine: Optional[ColumnarEngine] = None) -> SampleModel:
+    """
+    Fit a model for every schema field from example records
+
+    Args:
+        schema: Field definitions (name and type)
+        samples: Example records, typically written by the LLM
+        engine: Engine used for fields without usable sample values
+
+    Returns:
+        SampleModel that generates rows shaped like the samples
+    """
+    engine = engine or ColumnarEngine()
+    names = []
+    columns = {}
+    null_rates = {}
+
+    for field in schema:
+        name = field['name']
+        field_type = field.get('type', 'text')
+        values = [sample.get(name) for sample in samples if isinstance(sample, dict)]
+        present = [value for value in values if value is not None and value != '']
+
+        names.append(name)
+        null_rates[name] = 1 - len(present) / len(values) if values else 0.0
+        columns[name] = fit_column(field_type, present, engine)
+        logger.debug(f"Fitted {columns[name].kind} model for {name} from {len(present)} values")
+
+    return SampleModel(names, columns, null_rates, len(samples))
+
+
+def fit_column(field_type: str, values: List[Any], engine: ColumnarEngine):
+    """Choose and fit the model for one column"""
+    if not values or field_type in ENGINE_TYPES:
+        return EngineModel(field_type, engine)
+
+    if all(isinstance(value, bool) for value in values):
+        return CategoricalModel(values)
+
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+        return NumericModel(values)
+
+    if any(not isinstance(value, str) for value in values):
+        # Nested or mixed values are resampled as they are
+        return CategoricalModel([str(value) for value in values])
+
+    if field_type in ('date', 'datetime') or all(_looks_temporal(value) for value in values):
+        temporal = _fit_temporal(values)
+        if temporal is not None:
+            return temporal
+
+    if len(set(values)) <= CATEGORICAL_MAX_DISTINCT_RATIO * len(values):
+        return CategoricalModel(values)
+
+    tokenized = [_TOKEN.findall(value) for value in values]
+    if len(values) > 1 and TemplateModel.fits(tokenized):
+        return TemplateModel(tokenized)
+
+    if field_type in FAKER_PROVIDERS or field_type in NATIVE_GENERATORS:
+        return EngineModel(field_type, engine)
+    return CategoricalModel(values)
+
+
+def _fit_temporal(values: List[str]) -> Optional[TemporalModel]:
+    try:
+        parsed = np.array([np.datetime64(value.replace('Z', '')) for value in values])
+    except ValueError:
+        return None
+    unit = 'D' if all(len(value) == 10 for value in values) else 's'
+    return TemporalModel(parsed.astype(f'datetime64[{unit}]'), unit)
+
+
+def _looks_temporal(value: str) -> bool:
+    return len(value) >= 10 and value[4] == '-' and value[7] == '-' and value[:4].isdigit()
+
+
+def _token_class(token: str) -> str:
+    if token.isdigit():
+        return '9'
+    if token.isalpha():
+        return 'a'
+    return token
+
+
+def _random_digits(rng: np.random.Generator, num_rows: int, lengths: List[int]) -> List[str]:
+    width = max(lengths)
+    digits = _DIGITS[rng.integers(0, 10, size=(num_rows, width))]
+    sizes = np.asarray(lengths)[rng.integers(0, len(lengths), size=num_rows)]
+    return [''.join(row[:size]) for row, size in zip(digits.tolist(), sizes.tolist())]
+
+
+def _decimal_places(value: Any) -> int:
+    if isinstance(value, float):
+        text = repr(value)
+        if 'e' not in text and '.' in text:
+            return len(text.split('.')[1].rstrip('0'))
+    return 0
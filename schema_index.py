@@ -0,0 +1,397 @@
+"""
+Schema Similarity Index
+In-process hashed TF-IDF index over known-good and saved schemas, stored in a memory-mapped file
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from array import array
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from columnar_engine import FAKER_PROVIDERS, NATIVE_GENERATORS
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_INDEX_DIR = os.getenv('SCHEMA_INDEX_DIR', 'schema_index')
+SCHEMA_INDEX_DIM = int(os.getenv('SCHEMA_INDEX_DIM', '2048'))
+SEED_SCHEMAS_PATH = os.getenv('SEED_SCHEMAS_PATH', 'seed-quality-schemas.json')
+
+# Similarity needed to answer a schema request from the index without calling the LLM, and
+# to prefer an indexed schema over the keyword fallback when the LLM is unavailable
+SCHEMA_INDEX_MATCH_SCORE = float(os.getenv('SCHEMA_INDEX_MATCH_SCORE', '0.8'))
+SCHEMA_INDEX_FALLBACK_SCORE = float(os.getenv('SCHEMA_INDEX_FALLBACK_SCORE', '0.5'))
+
+# Field types the generator can produce; schemas using any other type are never returned
+SUPPORTED_FIELD_TYPES = frozenset(NATIVE_GENERATORS) | frozenset(FAKER_PROVIDERS)
+
+# Weight of a schema's field names relative to its prompt and name
+FIELD_WEIGHT = 0.25
+
+# Rows allocated at a time in the vector file
+_GROWTH_ROWS = 1024
+
+_WORD = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|[0-9]+')
+
+# Source of a saved schema loaded from the application database: (id, name, user_request, schema)
+SavedSchema = Tuple[int, str, Optional[str], List[Dict]]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words, with snake_case and camelCase identifiers split into their parts"""
+    return [word.lower() for word in _WORD.findall(text)]
+
+
+def generatable(schema: List[Dict], field_types: Iterable[str] = SUPPORTED_FIELD_TYPES) -> bool:
+    """Whether every field of a schema has a type the generator supports"""
+    field_types = field_types if isinstance(field_types, (set, frozenset)) else set(field_types)
+    return bool(schema) and all(isinstance(field, dict) and field.get('type') in field_types for field in schema)
+
+
+def field_text(schema: List[Dict]) -> str:
+    """Field names and types of a schema as text"""
+    return ' '.join(f"{field.get('name', '')} {field.get('type', '')}" for field in schema)
+
+
+class SchemaIndex:
+    """
+    Nearest-schema lookup by text similarity
+
+    Each document is hashed into a fixed-size vector of sublinear term frequencies over words
+    and character trigrams. Vectors live in a memory-mapped float32 file with the metadata in a
+    JSON-lines file next to it, so the index survives restarts and grows by appending. IDF
+    weights are derived from the stored vectors, so adding a document never rewrites others.
+
+    The index loads lazily: on first use it reads the files, then adds the seed schemas and any
+    saved schemas returned by saved_loader(after_id) that are not indexed yet. Only schemas whose
+    field types are all in field_types are indexed or returned.
+
+    Each feature bucket also keeps a postings list of the documents using it with their values,
+    so a search only touches the query's buckets instead of every stored vector.
+
+    Several worker processes can share the files. Adds hold an exclusive lock on a lock file
+    while they write: the vector goes to the row numbered by the entries file's line count and
+    is flushed before its entry line is appended. Every process reads entries appended by the
+    others before it adds or searches.
+    """
+
+    def __init__(self, directory: str = SCHEMA_INDEX_DIR, dim: int = SCHEMA_INDEX_DIM,
+                 seed_path: Optional[str] = SEED_SCHEMAS_PATH,
+                 saved_loader: Optional[Callable[[int], Iterable[SavedSchema]]] = None,
+                 field_types: Iterable[str] = SUPPORTED_FIELD_TYPES):
+        self.directory = directory
+        self.dim = dim
+        self.seed_path = seed_path
+        self.saved_loader = saved_loader
+        self.field_types = frozenset(field_types)
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._vectors: Optional[np.memmap] = None
+        self._entries: List[Dict[str, Any]] = []
+        # Bytes of the entries file read into _entries
+        self._offset = 0
+        self._doc_freq = np.zeros(dim, dtype=np.float64)
+        self._keys = set()
+        # Document positions and values per feature bucket, and whether each document may be returned
+        self._postings = [array('I') for _ in range(dim)]
+        self._posting_values = [array('f') for _ in range(dim)]
+        self._usable = np.zeros(0, dtype=bool)
+        # IDF weights, the document norms under them, and the document count they were computed at
+        self._weight_cache: Optional[Tuple[np.ndarray, np.ndarray, int]] = None
+
+    @property
+    def _vector_path(self) -> str:
+        return os.path.join(self.directory, f'vectors.{self.dim}.f32')
+
+    @property
+    def _entries_path(self) -> str:
+        return os.path.join(self.directory, f'entries.{self.dim}.jsonl')
+
+    @property
+    def _lock_path(self) -> str:
+        return os.path.join(self.directory, f'index.{self.dim}.lock')
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock between processes writing the index files"""
+        # Opened per use: a lock on a descriptor inherited across fork would be shared
+        with open(self._lock_path, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._entries)
+
+    def vectorize(self, text: str, extra_text: str = '', extra_weight: float = 1.0) -> np.ndarray:
+        """Hashed sublinear term-frequency vector for a text, with extra_text counted at extra_weight"""
+        counts: Dict[int, float] = {}
+        for source, weight in ((text, 1.0), (extra_text, extra_weight)):
+            for word in tokenize(source):
+                features = [word] + [f'#{gram}' for gram in _trigrams(word)]
+                for feature in features:
+                    bucket = zlib.crc32(feature.encode('utf-8')) % self.dim
+                    counts[bucket] = counts.get(bucket, 0) + weight
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if counts:
+            buckets = np.fromiter(counts.keys(), dtype=np.int64)
+            vector[buckets] = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32))
+        return vector
+
+    def add(self, prompt: str, schema: List[Dict], source: str, ref_id: Any = None, name: str = '') -> bool:
+        """
+        Index a schema
+
+        Returns:
+            False if the (source, ref_id) pair is already indexed or the schema uses a field
+            type the generator does not support
+        """
+        self._ensure_loaded()
+        return self._add(prompt, schema, source, ref_id, name)
+
+    def search(self, prompt: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """
+        Schemas most similar to a prompt
+
+        Returns:
+            Up to limit entries (source, id, name, prompt, schema) with a cosine "score", best first
+        """
+        self._ensure_loaded()
+        query = self.vectorize(prompt)
+        with self._lock:
+            self._sync()
+            count = len(self._entries)
+            if count == 0 or not query.any():
+                return []
+
+            weights, doc_norms = self._weights()
+            dots = np.zeros(count, dtype=np.float32)
+            weighted = query * weights
+            for bucket in np.flatnonzero(query).tolist():
+                # A document appears at most once per bucket, so indexed addition is exact
+                positions = np.frombuffer(self._postings[bucket], dtype=np.uint32)
+                dots[positions] += np.frombuffer(self._posting_values[bucket], dtype=np.float32) * weighted[bucket]
+
+            norms = doc_norms * np.sqrt((query * query) @ weights)
+            scores = np.divide(dots, norms, out=np.zeros(count, dtype=np.float32),
+                               where=(norms > 0) & self._usable[:count])
+
+            best = np.argsort(-scores)[:limit] if count <= limit else np.argpartition(-scores, limit)[:limit]
+            best = best[np.argsort(-scores[best], kind='stable')]
+            return [dict(self._entries[i], score=round(float(scores[i]), 4)) for i in best.tolist() if scores[i] > 0]
+
+    def _weights(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Squared IDF weights and IDF-weighted document norms
+
+        Both are recomputed once the index has grown by more than 1% since they were last
+        computed; documents added in between get their norms under the current weights.
+        """
+        count = len(self._entries)
+        if self._weight_cache is None or count > self._weight_cache[2] * 1.01:
+            idf = np.log((1 + count) / (1 + self._doc_freq)) + 1
+            weights = (idf * idf).astype(np.float32)
+            self._weight_cache = (weights, self._norms(0, count, weights), count)
+        elif count > len(self._weight_cache[1]):
+            weights, norms, computed_at = self._weight_cache
+            self._weight_cache = (weights, np.concatenate([norms, self._norms(len(norms), count, weights)]), computed_at)
+        return self._weight_cache[0], self._weight_cache[1]
+
+    def _norms(self, start: int, end: int, weights: np.ndarray) -> np.ndarray:
+        norms = np.empty(end - start, dtype=np.float32)
+        # In blocks, so a large index is never copied into memory at once
+        for block in range(start, end, 4096):
+            vectors = self._vectors[block:min(block + 4096, end)]
+            norms[block - start:block - start + len(vectors)] = np.sqrt((vectors * vectors) @ weights)
+        return norms
+
+    def best_match(self, prompt: str, min_score: float) -> Optional[Dict[str, Any]]:
+        """Most similar schema if its score reaches min_score"""
+        matches = self.search(prompt, limit=1)
+        if matches and matches[0]['score'] >= min_score:
+            return matches[0]
+        return None
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._load_files()
+            self._loaded = True
+            self._index_seed_schemas()
+            self._index_saved_schemas()
+            logger.info(f"Schema index ready with {len(self._entries)} schemas")
+
+    def _load_files(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._file_lock():
+            self._repair()
+            self._sync()
+
+    def _repair(self):
+        """Cut the entries file back to the complete entries the vector file can back"""
+        if not os.path.exists(self._entries_path):
+            return
+        with open(self._entries_path, 'rb') as f:
+            data = f.read()
+
+        entries = []
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError
+                entries.append(json.loads(line))
+            except ValueError:
+                # Only the last line can be cut short by a crash during an append
+                logger.warning("Ignoring incomplete last schema index entry")
+                break
+
+        # A missing or short vector file drops the entries it cannot back; the seed and saved
+        # schemas are then indexed again
+        entries = entries[:self._file_capacity()]
+        if len(entries) < data.count(b'\n') or not data.endswith(b'\n'):
+            tmp_path = f'{self._entries_path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + '\n')
+            os.replace(tmp_path, self._entries_path)
+
+    def _sync(self):
+        """
+        Read entries appended since the last read, by this or another process
+
+        Appends end with a newline and their vectors are flushed first, so complete lines can be
+        read without the lock and always have their vector.
+        """
+        try:
+            size = os.path.getsize(self._entries_path)
+        except FileNotFoundError:
+            return
+        if size <= self._offset:
+            return
+        with open(self._entries_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        data = data[:data.rfind(b'\n') + 1]
+        if not data:
+            return
+
+        new_entries = [json.loads(line) for line in data.splitlines()]
+        start = len(self._entries)
+        self._map()
+        self._offset += len(data)
+        self._entries.extend(new_entries)
+        self._keys.update((entry['source'], entry['id']) for entry in new_entries)
+        # Entries written before unsupported types were skipped stay in the files but are never returned
+        usable = [generatable(entry['schema'], self.field_types) for entry in new_entries]
+        self._usable = np.concatenate([self._usable, np.array(usable, dtype=bool)])
+
+        vectors = self._vectors[start:len(self._entries)]
+        rows, buckets = np.nonzero(vectors)
+        values = vectors[rows, buckets]
+        self._doc_freq += np.bincount(buckets, minlength=self.dim)
+        order = np.argsort(buckets, kind='stable')
+        bucket_ids, first = np.unique(buckets[order], return_index=True)
+        positions = (rows[order] + start).astype(np.uint32)
+        values = values[order].astype(np.float32)
+        for bucket, begin, end in zip(bucket_ids.tolist(), first.tolist(), first[1:].tolist() + [len(order)]):
+            self._postings[bucket].frombytes(positions[begin:end].tobytes())
+            self._posting_values[bucket].frombytes(values[begin:end].tobytes())
+
+    def _index_seed_schemas(self):
+        if not self.seed_path or not os.path.exists(self.seed_path):
+            return
+        try:
+            with open(self.seed_path, encoding='utf-8') as f:
+                seeds = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read seed schemas from {self.seed_path}: {e}")
+            return
+
+        for position, seed in enumerate(seeds):
+            if seed.get('schema') and seed.get('rating', 'thumbs_up') == 'thumbs_up':
+                prompt = seed.get('user_prompt', '')
+                self._add(prompt, seed['schema'], 'seed', position, seed.get('name') or prompt)
+
+    def _index_saved_schemas(self):
+        if self.saved_loader is None:
+            return
+        indexed = [entry['id'] for entry in self._entries if entry['source'] == 'saved']
+        try:
+            for ref_id, name, user_request, schema in self.saved_loader(max(indexed, default=0)):
+                self._add(user_request or name, schema, 'saved', ref_id, name)
+        except Exception as e:
+            logger.warning(f"Could not index saved schemas: {e}")
+
+    def _add(self, prompt: str, schema: List[Dict], source: str, ref_id: Any, name: str = '') -> bool:
+        with self._lock, self._file_lock():
+            self._sync()
+            if (source, ref_id) in self._keys:
+                return False
+            if not generatable(schema, self.field_types):
+                logger.debug(f"Not indexing {source} schema {ref_id}: it uses unsupported field types")
+                return False
+
+            # Field names help recall but should not outweigh the request the schema was made for
+            vector = self.vectorize(f"{prompt} {name}", field_text(schema), FIELD_WEIGHT)
+            # After the sync, every line of the entries file is in _entries: the new entry is
+            # the next line whatever the other processes have added
+            position = len(self._entries)
+            self._reserve(position + 1)
+            self._vectors[position] = vector
+            self._vectors.flush()
+
+            entry = {'source': source, 'id': ref_id, 'name': name, 'prompt': prompt, 'schema': schema}
+            with open(self._entries_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            self._sync()
+            return True
+
+    def _file_capacity(self) -> int:
+        """Vectors the vector file has room for"""
+        try:
+            return os.path.getsize(self._vector_path) // (4 * self.dim)
+        except FileNotFoundError:
+            return 0
+
+    def _map(self):
+        """Map the whole vector file, after another process may have grown it"""
+        capacity = self._file_capacity()
+        if self._vectors is not None and self._vectors.shape[0] >= capacity:
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        self._vectors = np.memmap(self._vector_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+    def _reserve(self, rows: int):
+        """Grow the vector file to hold at least rows vectors; called with the file lock held"""
+        capacity = self._file_capacity()
+        if rows > capacity:
+            with open(self._vector_path, 'ab') as f:
+                f.truncate(max(rows, capacity + _GROWTH_ROWS) * self.dim * 4)
+        self._map()
+
+
+def _trigrams(word: str) -> List[str]:
+    padded = f'<{word}>'
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
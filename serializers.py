@@ -0,0 +1,53 @@
+"""
+Streaming Serializers
+Render column batches from the columnar engine as CSV or newline-delimited JSON text chunks
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List
+
+from columnar_engine import column_to_list
+
+
+def json_default(value: Any) -> Any:
+    """JSON encoder fallback for values produced by the generators"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def batch_rows(batch: Dict[str, Any]) -> Iterator[tuple]:
+    """Iterate over the rows of a column batch as tuples of native values"""
+    return zip(*[column_to_list(column) for column in batch.values()])
+
+
+def iter_csv(batches: Iterable[Dict[str, Any]], header: bool = True) -> Iterator[str]:
+    """
+    Render column batches as CSV
+
+    Yields:
+        The header line first, then one CSV text chunk per batch
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for batch in batches:
+        if header:
+            writer.writerow(list(batch))
+            header = False
+        writer.writerows(batch_rows(batch))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+def iter_ndjson(batches: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Render column batches as newline-delimited JSON, one text chunk per batch"""
+    encoder = json.JSONEncoder(default=json_default)
+    for batch in batches:
+        names = list(batch)
+        lines: List[str] = [encoder.encode(dict(zip(names, row))) for row in batch_rows(batch)]
+        lines.append('')
+        yield '\n'.join(lines)
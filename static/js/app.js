@@ -254,21 +254,22 @@ class SyntheticDataGenerator {
         window.URL.revokeObjectURL(url);
     }
 
-    async loadSchemas() {
+    async loadSchemas(cursor = null) {
         try {
-            const response = await fetch('/api/schemas');
+            // The list is paged; X-Next-Cursor is only sent while more schemas remain
+            const response = await fetch(cursor ? `/api/schemas?cursor=${encodeURIComponent(cursor)}` : '/api/schemas');
             const schemas = await response.json();
-            this.renderSavedSchemas(schemas);
+            this.renderSavedSchemas(schemas, cursor !== null, response.headers.get('X-Next-Cursor'));
         } catch (error) {
             console.error('Error loading schemas:', error);
             this.showNotification('Error loading saved schemas', 'danger');
         }
     }
 
-    renderSavedSchemas(schemas) {
+    renderSavedSchemas(schemas, append = false, nextCursor = null) {
         const container = document.getElementById('savedSchemas');
         
-        if (schemas.length === 0) {
+        if (schemas.length === 0 && !append) {
             container.innerHTML = `
                 <div class="text-center text-muted py-4">
                     <i class="fas fa-inbox fa-3x mb-3"></i>
@@ -278,7 +279,14 @@ class SyntheticDataGenerator {
             return;
         }
 
-        container.innerHTML = '';
+        if (append) {
+            const loadMore = document.getElementById('loadMoreSchemas');
+            if (loadMore) {
+                loadMore.remove();
+            }
+        } else {
+            container.innerHTML = '';
+        }
 
         schemas.forEach((schema, index) => {
             const schemaElement = document.createElement('div');
@@ -309,14 +317,26 @@ class SyntheticDataGenerator {
             `;
             container.appendChild(schemaElement);
         });
+
+        if (nextCursor) {
+            const loadMore = document.createElement('div');
+            loadMore.id = 'loadMoreSchemas';
+            loadMore.className = 'text-center mt-3';
+            loadMore.innerHTML = `
+                <button class="btn btn-sm btn-outline-primary">
+                    <i class="fas fa-chevron-down me-1"></i>Load more
+                </button>
+            `;
+            loadMore.querySelector('button').addEventListener('click', () => this.loadSchemas(nextCursor));
+            container.appendChild(loadMore);
+        }
     }
 
     loadSchema(schemaId) {
-        // Find schema by ID and load it
-        fetch('/api/schemas')
-            .then(response => response.json())
-            .then(schemas => {
-                const schema = schemas.find(s => s.id === schemaId);
+        // Fetch the schema by ID and load it
+        fetch(`/api/schemas/${schemaId}`)
+            .then(response => response.ok ? response.json() : null)
+            .then(schema => {
                 if (schema) {
                     this.currentSchema = schema.schema_data;
                     this.currentUserRequest = schema.user_request;
@@ -0,0 +1,49 @@
+"""
+Tests for the PostgreSQL bulk loader
+Set POSTGRES_TEST_DSN to a scratch database to run the load tests
+"""
+
+import os
+import uuid
+
+import pytest
+
+from postgres_loader import copy_batches, table_columns
+
+POSTGRES_TEST_DSN = os.getenv('POSTGRES_TEST_DSN')
+
+SCHEMA_WITH_ID = [
+    {'name': 'id', 'type': 'number'},
+    {'name': 'name', 'type': 'name'},
+    {'name': 'active', 'type': 'boolean'},
+]
+
+
+def test_table_columns_adds_surrogate_key():
+    assert table_columns([{'name': 'name', 'type': 'name'}]) == [('id', 'SERIAL PRIMARY KEY'), ('name', 'TEXT')]
+
+
+def test_table_columns_keeps_schema_id():
+    assert table_columns(SCHEMA_WITH_ID) == [('id', 'NUMERIC'), ('name', 'TEXT'), ('active', 'BOOLEAN')]
+
+
+@pytest.mark.skipif(not POSTGRES_TEST_DSN, reason='POSTGRES_TEST_DSN not set')
+def test_load_schema_with_id():
+    import psycopg2
+
+    table = f'load_test_{uuid.uuid4().hex[:8]}'
+    batch = {'id': [1, 2], 'name': ['Ada', 'Grace'], 'active': [True, False]}
+    try:
+        stats = copy_batches(POSTGRES_TEST_DSN, table, SCHEMA_WITH_ID, [batch])
+        assert stats['rows_loaded'] == 2
+
+        conn = psycopg2.connect(POSTGRES_TEST_DSN)
+        with conn, conn.cursor() as cursor:
+            cursor.execute(f'SELECT id, name, active FROM {table} ORDER BY id')
+            assert cursor.fetchall() == [(1, 'Ada', True), (2, 'Grace', False)]
+        conn.close()
+    finally:
+        conn = psycopg2.connect(POSTGRES_TEST_DSN)
+        with conn, conn.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        conn.close()
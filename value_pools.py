@@ -0,0 +1,212 @@
+"""
+Shared Value Pools
+Pre-generated Faker values stored in memory-mapped files shared by every worker process
+"""
+
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Set VALUE_POOL_DIR to an empty string to keep pools in process memory instead
+VALUE_POOL_DIR = os.getenv('VALUE_POOL_DIR', 'value_pools')
+VALUE_POOL_MAX_BYTES = int(os.getenv('VALUE_POOL_MAX_BYTES', str(256 * 1024 * 1024)))
+# Decoded copies of the most used pools kept by each process; 0 always samples from the mapping
+VALUE_POOL_DECODED_BYTES = int(os.getenv('VALUE_POOL_DECODED_BYTES', str(32 * 1024 * 1024)))
+
+# File layout: magic, value count, characters per value, then the values as fixed-width UTF-32
+# (NumPy's unicode dtype), so the mapping can be indexed directly without decoding
+_MAGIC = b'SDGPOOL2'
+_HEADER = struct.Struct('<8sQQ')
+# Approximate size of a decoded str beyond its characters, plus its slot in the object array
+_DECODED_OVERHEAD = 57
+
+
+class DecodedCache:
+    """
+    Least recently used decoded pools of one process, bounded by max_bytes
+
+    Sampling from a mapping converts only the sampled values to Python strings; a pool that fits
+    the cache is decoded once instead, which makes repeated sampling plain object indexing.
+    """
+
+    def __init__(self, max_bytes: int = VALUE_POOL_DECODED_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: 'OrderedDict[str, Tuple[np.ndarray, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, values: np.ndarray, size: int):
+        """Keep a decoded pool, evicting the least recently used ones to stay within max_bytes"""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            while self._entries and self.total_bytes + size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+            self._entries[key] = (values, size)
+            self.total_bytes += size
+
+    def discard(self, key: str):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+
+class SharedPool:
+    """
+    Pool file mapped read-only
+
+    Building a pool (the slow Faker part) happens once per machine. Every process indexes the same
+    mapped pages, and only the decoded cache, when given, holds a private copy of a pool.
+    """
+
+    def __init__(self, path: str, cache: Optional[DecodedCache] = None):
+        self.path = path
+        self.cache = cache
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, width = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Not a value pool file: {path}")
+        self._count = count
+        self._strings = np.frombuffer(self._map, dtype=f'<U{width}', count=count, offset=_HEADER.size)
+        self._decoded_size = count * (_DECODED_OVERHEAD + width)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def take(self, indices: np.ndarray) -> np.ndarray:
+        """Look up values by index"""
+        if self.cache is None:
+            return self._strings[indices].astype(object)
+        values = self.cache.get(self.path)
+        if values is None:
+            if self._decoded_size > self.cache.max_bytes:
+                return self._strings[indices].astype(object)
+            values = self._strings.astype(object)
+            self.cache.put(self.path, values, self._decoded_size)
+        return values[indices]
+
+
+class PoolStore:
+    """
+    Directory of pool files keyed by field type, locale and size
+
+    Pools are filled lazily on first use and written atomically, so concurrent workers can only
+    ever map complete files. When the directory grows beyond max_bytes, the least recently used
+    pool files are removed.
+    """
+
+    def __init__(self, directory: str = VALUE_POOL_DIR, max_bytes: int = VALUE_POOL_MAX_BYTES,
+                 decoded_bytes: int = VALUE_POOL_DECODED_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.decoded = DecodedCache(decoded_bytes) if decoded_bytes > 0 else None
+        # Pools mapped by this process, shared by all of its engines
+        self._mapped: Dict[str, SharedPool] = {}
+
+    def path_for(self, field_type: str, locale: str, size: int) -> str:
+        return os.path.join(self.directory, f"{field_type}.{locale}.{size}.pool")
+
+    def get(self, field_type: str, locale: str, size: int, build: Callable[[], List[str]]) -> SharedPool:
+        """Map the pool for a type, building and writing it first if it does not exist"""
+        path = self.path_for(field_type, locale, size)
+        with self._lock:
+            pool = self._mapped.get(path)
+            if pool is not None and os.path.exists(path):
+                os.utime(path)  # Mark as recently used for eviction
+                return pool
+
+            if os.path.exists(path):
+                os.utime(path)
+                try:
+                    pool = SharedPool(path, self.decoded)
+                except ValueError:
+                    # Written in an older layout; replaced below
+                    pool = None
+            if pool is None:
+                self._write(path, build())
+                self.evict(keep=path)
+                pool = SharedPool(path, self.decoded)
+            self._mapped[path] = pool
+        return pool
+
+    def _write(self, path: str, values: List[str]):
+        os.makedirs(self.directory, exist_ok=True)
+        strings = np.array([str(value) for value in values], dtype=str)
+        if strings.itemsize == 0:
+            strings = strings.astype('<U1')
+        width = strings.itemsize // 4
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, len(strings), width))
+                f.write(strings.astype(f'<U{width}').tobytes())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.info(f"Wrote value pool {path} ({len(strings)} values of up to {width} characters)")
+
+    def evict(self, keep: Optional[str] = None):
+        """Remove least recently used pool files until the directory fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pool'):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                # Processes that already mapped the file keep a valid mapping
+                os.remove(path)
+                total -= size
+                logger.info(f"Evicted value pool {path}")
+            except OSError as e:
+                logger.warning(f"Could not evict value pool {path}: {e}")
+                continue
+            # This process stops handing out the pool and frees its decoded copy
+            self._mapped.pop(path, None)
+            if self.decoded is not None:
+                self.decoded.discard(path)
+
+
+_default_store: Optional[PoolStore] = None
+
+
+def get_default_store() -> Optional[PoolStore]:
+    """Process-wide pool store, or None when shared pools are disabled"""
+    global _default_store
+    if _default_store is None and VALUE_POOL_DIR:
+        _default_store = PoolStore()
+    return _default_store